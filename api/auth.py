@@ -0,0 +1,87 @@
+"""API-key authentication with an in-process identity cache.
+
+Agents.api_key holds the SHA-256 of the key, never the key itself; the
+plaintext is shown once at registration or rotation. verify_api_key hashes
+the presented key and resolves it through an LRU of hash -> Identity with a
+short TTL, so a heartbeat costs no authentication query on a hit. Claim
+changes and key rotation invalidate the agent's entry in this process;
+other worker processes pick them up when the TTL runs out.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from database import Agent
+
+AUTH_CACHE_SIZE = 10000
+AUTH_CACHE_TTL = 60  # seconds
+
+# What handlers get from verify_api_key; load the Agent row to mutate it
+Identity = namedtuple("Identity", "id name claim_status")
+
+
+def hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def hash_stored_keys(db: Session) -> int:
+    """One-time conversion of plaintext keys (from before hashing) to hashes."""
+    plaintext = db.query(Agent).filter(Agent.api_key.like("moltchess\\_%", escape="\\")).all()
+    for agent in plaintext:
+        agent.api_key = hash_api_key(agent.api_key)
+    if plaintext:
+        db.commit()
+    return len(plaintext)
+
+
+class ApiKeyCache:
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._identities = OrderedDict()
+        self._hashes_by_agent: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key_hash: str) -> Optional[Identity]:
+        with self._lock:
+            entry = self._identities.get(key_hash)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._identities.move_to_end(key_hash)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key_hash: str, identity: Identity):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._identities[key_hash] = (time.monotonic() + self.ttl, identity)
+            self._identities.move_to_end(key_hash)
+            self._hashes_by_agent[identity.id] = key_hash
+            while len(self._identities) > self.maxsize:
+                _, (_, evicted) = self._identities.popitem(last=False)
+                self._hashes_by_agent.pop(evicted.id, None)
+
+    def invalidate_agent(self, agent_id: int):
+        with self._lock:
+            key_hash = self._hashes_by_agent.pop(agent_id, None)
+            if key_hash is not None:
+                self._identities.pop(key_hash, None)
+
+    def clear(self):
+        with self._lock:
+            self._identities.clear()
+            self._hashes_by_agent.clear()
+
+    def __len__(self):
+        return len(self._identities)
+
+
+api_key_cache = ApiKeyCache()
@@ -0,0 +1,61 @@
+"""Benchmark: DB round trips and latency saved by the API-key cache.
+
+Replays a heartbeat-style mix (status, active games, challenges) from a
+pool of agents, once with the auth cache disabled and once with it on,
+counting SQL statements per request and timing each one.
+
+    cd api && python bench/bench_auth.py
+"""
+import random
+import time
+
+from sqlalchemy import event
+
+from common import SessionLocal, api_key_for, seed_agents, agent_ids, seed_games, percentiles, make_client
+from database import engine
+from auth import AUTH_CACHE_SIZE
+import main
+
+AGENTS = 1000
+REQUESTS = 3000
+ENDPOINTS = ["/api/agents/status", "/api/games/active", "/api/challenges"]
+
+statements = []
+event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+
+def replay(client, requests) -> tuple:
+    samples = []
+    statements.clear()
+    for url, key in requests:
+        t0 = time.perf_counter()
+        response = client.get(url, headers={"X-API-Key": key})
+        samples.append(time.perf_counter() - t0)
+        assert response.status_code == 200, response.text
+    return len(statements) / len(requests), percentiles(samples)
+
+
+def run():
+    client = make_client()
+    db = SessionLocal()
+    seed_agents(db, 0, AGENTS)
+    ids = agent_ids(db, 0, AGENTS)
+    seed_games(db, [(ids[i], ids[i + 1]) for i in range(0, AGENTS - 1, 2)])
+    main.leaderboard.load(db)
+    db.close()
+
+    rng = random.Random(1)
+    requests = [(rng.choice(ENDPOINTS), api_key_for(rng.randrange(AGENTS))) for _ in range(REQUESTS)]
+    cache = main.api_key_cache
+    print(f"{REQUESTS} requests from {AGENTS} agents over {', '.join(ENDPOINTS)}")
+    print(f"{'auth cache':<11} {'queries/req':>11} {'p50':>8} {'p95':>8}")
+    for label, size in (("off", 0), ("on", AUTH_CACHE_SIZE)):
+        cache.clear()
+        cache.maxsize = size
+        replay(client, requests[:200])  # warm up (and fill the cache when on)
+        per_request, stats = replay(client, requests)
+        print(f"{label:<11} {per_request:>11.2f} {stats['p50']:>6.2f}ms {stats['p95']:>6.2f}ms")
+
+
+if __name__ == "__main__":
+    run()
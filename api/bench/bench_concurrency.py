@@ -0,0 +1,146 @@
+"""Stress test: racing moves and resignations against multiple workers.
+
+Starts the API under uvicorn with several worker processes sharing one
+database, then for every game fires duplicate submissions of the same move
+(a retrying agent) alongside a resignation from the opponent. Afterwards it
+checks that each race had exactly one winner and that every agent's
+counters match the completed games in the database.
+
+    cd api && python bench/bench_concurrency.py
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+from common import API_DIR, SessionLocal, init_db, percentiles
+
+import httpx
+from sqlalchemy import func
+
+from database import Agent, Game, Move
+
+PORT = 18765
+WORKERS = 4
+GAMES = 100
+ROUNDS = 6
+DUPLICATES = 3
+IN_FLIGHT_GAMES = 10  # games racing at once; each race is DUPLICATES + 1 requests
+RESIGN_CHANCE = 0.15
+OPENING = ["e4", "e5", "Nf3", "Nc6", "Bc4", "Bc5"]
+
+
+def start_server() -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--workers", str(WORKERS), "--log-level", "warning"],
+        cwd=API_DIR, env=dict(os.environ),
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def setup_games(client) -> list:
+    games = []
+    for i in range(GAMES):
+        keys = []
+        for color in ("w", "b"):
+            r = await client.post("/api/register", json={"name": f"race-{i}-{color}"})
+            keys.append({"X-API-Key": r.json()["agent"]["api_key"]})
+        game_id = (await client.post("/api/challenge", json={"opponent": f"race-{i}-b"}, headers=keys[0])).json()["game_id"]
+        await client.post(f"/api/challenges/{game_id}/accept", headers=keys[1])
+        games.append({"id": game_id, "keys": keys, "ply": 0, "over": False})
+    return games
+
+
+async def race(client, game, stats, limit) -> None:
+    """Duplicate submissions of the next move, maybe plus a resignation by the opponent."""
+    async with limit:
+        await _race(client, game, stats)
+
+
+async def _race(client, game, stats) -> None:
+    mover = game["keys"][game["ply"] % 2]
+    other = game["keys"][(game["ply"] + 1) % 2]
+    move = OPENING[game["ply"]]
+    requests = [client.post(f"/api/games/{game['id']}/move", json={"move": move}, headers=mover) for _ in range(DUPLICATES)]
+    resigning = random.random() < RESIGN_CHANCE
+    if resigning:
+        requests.append(client.post(f"/api/games/{game['id']}/resign", headers=other))
+    t0 = time.perf_counter()
+    responses = await asyncio.gather(*requests)
+    stats["latency"].append(time.perf_counter() - t0)
+    codes = [r.status_code for r in responses]
+    for code in codes:
+        stats["codes"][code] = stats["codes"].get(code, 0) + 1
+    move_wins = codes[:DUPLICATES].count(200)
+    resign_won = resigning and codes[-1] == 200
+    if move_wins > 1 or any(code >= 500 for code in codes):
+        stats["violations"].append((game["id"], codes))
+    if resign_won:
+        game["over"] = True
+    if move_wins:
+        game["ply"] += 1
+
+
+def check_counters() -> list:
+    db = SessionLocal()
+    problems = []
+    completed = {}
+    for white_id, black_id, result in db.query(Game.white_id, Game.black_id, Game.result).filter(Game.status == "completed"):
+        for agent_id, score in ((white_id, result), (black_id, {"1-0": "0-1", "0-1": "1-0"}.get(result, result))):
+            tally = completed.setdefault(agent_id, {"1-0": 0, "0-1": 0, "1/2-1/2": 0})
+            tally[score] += 1
+    for agent in db.query(Agent):
+        tally = completed.get(agent.id, {"1-0": 0, "0-1": 0, "1/2-1/2": 0})
+        if (agent.wins, agent.losses, agent.draws, agent.games_played) != (tally["1-0"], tally["0-1"], tally["1/2-1/2"], sum(tally.values())):
+            problems.append(f"{agent.name}: counters {agent.wins}/{agent.losses}/{agent.draws} vs games {tally}")
+    move_counts = dict(db.query(Move.game_id, func.count(Move.id)).group_by(Move.game_id))
+    for game in db.query(Game):
+        if move_counts.get(game.id, 0) != game.ply_count:
+            problems.append(f"game {game.id}: ply_count {game.ply_count} but {move_counts.get(game.id, 0)} moves")
+    db.close()
+    return problems
+
+
+async def stress() -> dict:
+    stats = {"latency": [], "codes": {}, "violations": []}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60) as client:
+        games = await setup_games(client)
+        limit = asyncio.Semaphore(IN_FLIGHT_GAMES)
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            await asyncio.gather(*(race(client, g, stats, limit) for g in games if not g["over"]))
+        stats["elapsed"] = time.perf_counter() - t0
+    return stats
+
+
+def run() -> int:
+    init_db()
+    server = start_server()
+    try:
+        stats = asyncio.run(stress())
+    finally:
+        server.terminate()
+        server.wait()
+    requests = sum(stats["codes"].values())
+    lat = percentiles(stats["latency"])
+    print(f"{requests} racing requests in {stats['elapsed']:.2f}s ({requests / stats['elapsed']:.0f} req/s) "
+          f"across {WORKERS} workers; race p50={lat['p50']:.1f}ms p99={lat['p99']:.1f}ms")
+    print(f"status codes: {dict(sorted(stats['codes'].items()))}")
+    problems = [f"game {gid}: more than one winner {codes}" for gid, codes in stats["violations"]] + check_counters()
+    for problem in problems[:20]:
+        print("  " + problem)
+    print("consistent" if not problems else f"{len(problems)} inconsistencies")
+    return len(problems)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run() else 0)
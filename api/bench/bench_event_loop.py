@@ -0,0 +1,130 @@
+"""Benchmark: event-loop responsiveness under concurrent database load.
+
+Starts the API under uvicorn with a single worker and drives it with
+concurrent agents cycling through status, active games, the archive and
+game state, while the maintenance sweep runs every second. Alongside, a probe requests GET / (no database) every 20 ms:
+its latency is how long the event loop takes to get to a ready request,
+which is what long-polls, streams and webhook sends see too.
+
+SQLite answers from local memory, so queries are almost pure CPU. To see
+what a networked database does, the server is also run with a fixed delay
+before every statement, standing in for a round trip to Postgres.
+
+    cd api && python bench/bench_event_loop.py
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from common import API_DIR, SessionLocal, init_db, seed_agents, agent_ids, seed_games, api_key_for, percentiles
+
+import httpx
+
+PORT = 18767
+AGENTS = 2000
+MAINTENANCE_INTERVAL = 1  # seconds; sweeps run during the measurement too
+CONCURRENCY = 12
+DURATION = 10.0  # seconds
+PROBE_INTERVAL = 0.02
+ROUND_TRIPS = (0.0, 0.002)  # simulated seconds per statement
+
+# uvicorn with a sleep before each statement; time.sleep releases the GIL
+# like a socket wait would
+SERVER = """
+import sys, time
+import uvicorn
+from sqlalchemy import event
+from database import engine
+import main
+
+main.MAINTENANCE_INTERVAL = float(sys.argv[3])
+delay = float(sys.argv[2])
+if delay:
+    event.listen(engine, "before_cursor_execute", lambda *args: time.sleep(delay))
+uvicorn.run(main.app, port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def start_server(round_trip: float) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER, str(PORT), str(round_trip), str(MAINTENANCE_INTERVAL)],
+        cwd=API_DIR, env=dict(os.environ), stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def load(client, worker: int, deadline: float, samples: list, statuses: Counter):
+    i = worker
+    while time.monotonic() < deadline:
+        agent = i % AGENTS
+        headers = {"X-API-Key": api_key_for(agent)}
+        url = ("/api/agents/status", "/api/games/active", "/api/games/archive?limit=50", f"/api/games/{agent // 2 + 1}")[i % 4]
+        t0 = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        samples.append(time.perf_counter() - t0)
+        statuses[response.status_code] += 1
+        i += CONCURRENCY
+
+
+async def probe(client, deadline: float, samples: list):
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        await client.get("/")
+        samples.append(time.perf_counter() - t0)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def measure() -> tuple:
+    limits = httpx.Limits(max_connections=CONCURRENCY)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client, \
+            httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60) as probe_client:
+        deadline = time.monotonic() + DURATION
+        load_samples, probe_samples, statuses = [], [], Counter()
+        await asyncio.gather(
+            probe(probe_client, deadline, probe_samples),
+            *[load(client, worker, deadline, load_samples, statuses) for worker in range(CONCURRENCY)],
+        )
+    return load_samples, probe_samples, statuses
+
+
+def run():
+    init_db()
+    db = SessionLocal()
+    seed_agents(db, 0, AGENTS)
+    ids = agent_ids(db, 0, AGENTS)
+    seed_games(db, [(ids[i], ids[i + 1]) for i in range(0, AGENTS - 1, 2)])
+    seed_games(db, [(ids[i], ids[(i + 7) % AGENTS]) for i in range(AGENTS)], status="completed")
+    db.close()
+
+    print(f"{CONCURRENCY} concurrent agents for {DURATION:.0f}s on one worker")
+    print(f"{'round trip':<11} {'':<6} {'req/s':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for round_trip in ROUND_TRIPS:
+        server = start_server(round_trip)
+        try:
+            load_samples, probe_samples, statuses = asyncio.run(measure())
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        assert set(statuses) == {200}, statuses
+        for label, samples in (("load", load_samples), ("probe", probe_samples)):
+            stats = percentiles(samples)
+            rate = f"{len(samples) / DURATION:.0f}" if label == "load" else ""
+            print(f"{round_trip * 1000:>8.0f}ms {label:<6} {rate:>6} {stats['p50']:>6.1f}ms {stats['p95']:>6.1f}ms "
+                  f"{stats['p99']:>6.1f}ms {max(samples) * 1000:>6.1f}ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,172 @@
+"""Multi-process test: one maintenance sweeper across workers and nodes.
+
+Starts two "nodes" (uvicorn on two ports, several workers each) sharing one
+database, with a one-second maintenance interval and a short lease, and
+keeps adding idle claimed agents for auto-matching to pair, while ending
+games by resigning them through both nodes. Halfway through it kills the
+node whose worker holds the lease. It checks that:
+
+- exactly one process held the lease before the kill, and one after it
+- the lease moved to the surviving node within the TTL
+- no agent was ever put into two active games, and every idle agent got a
+  new game
+
+    cd api && python bench/bench_leader.py
+"""
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import API_DIR, SessionLocal, init_db, seed_agents, api_key_for
+
+import httpx
+from sqlalchemy import func, select, union_all
+
+from database import Agent, Game, Lease
+
+PORTS = (18768, 18769)
+WORKERS = 3
+LEASE_TTL = 3
+MAINTENANCE_INTERVAL = 1
+PHASE = 8.0  # seconds before and after the kill
+BATCH = 20  # agents added per tick
+RESIGNS = 10  # games resigned per tick, alternating nodes
+TICK = 0.5
+
+
+def start_node(port: int, log) -> subprocess.Popen:
+    env = dict(os.environ, LEASE_TTL=str(LEASE_TTL), MAINTENANCE_INTERVAL=str(MAINTENANCE_INTERVAL))
+    node = subprocess.Popen(
+        [sys.executable, "-u", "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(WORKERS), "--log-level", "warning"],
+        cwd=API_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        start_new_session=True,  # so killing the node takes its workers with it
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/")
+            return node
+        except httpx.TransportError:
+            time.sleep(0.1)
+    node.kill()
+    raise RuntimeError("node did not start")
+
+
+def parent_pid(pid: int) -> int:
+    with open(f"/proc/{pid}/stat") as f:
+        return int(f.read().rsplit(")", 1)[1].split()[1])
+
+
+def holder_node(holder: str, nodes: list) -> int:
+    """Index of the node whose worker process is the lease holder."""
+    pid = int(holder.split(":")[1])
+    ancestors = {pid}
+    while pid > 1:
+        pid = parent_pid(pid)
+        ancestors.add(pid)
+    return next(i for i, node in enumerate(nodes) if node.pid in ancestors)
+
+
+def resign_games(db, ports: list):
+    """Resign RESIGNS active games through the API, spread over the live nodes."""
+    rows = db.execute(select(Game.id, Agent.name).join(Agent, Agent.id == Game.white_id).where(
+        Game.status == "active").order_by(func.random()).limit(RESIGNS)).all()
+    db.commit()
+    # All at once, so games end concurrently on several workers
+    def resign(i, game_id, name):
+        key = api_key_for(int(name.split("-")[1]))
+        httpx.post(f"http://127.0.0.1:{ports[i % len(ports)]}/api/games/{game_id}/resign", headers={"X-API-Key": key}, timeout=30)
+    threads = [threading.Thread(target=resign, args=(i, *row)) for i, row in enumerate(rows)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_phase(db, seeded: int, seconds: float, holders: list, ports: list) -> int:
+    """Keep adding agents and ending games; sample the lease row. Returns the number of agents seeded."""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        seed_agents(db, seeded, BATCH)
+        seeded += BATCH
+        resign_games(db, ports)
+        row = db.execute(select(Lease.holder, Lease.expires_at).where(Lease.name == "maintenance")).first()
+        db.commit()
+        if row and (not holders or holders[-1][1] != row.holder):
+            holders.append((time.monotonic(), row.holder))
+        time.sleep(TICK)
+    return seeded
+
+
+def idle_agents(db) -> int:
+    """Agents in no active game."""
+    playing = union_all(
+        select(Game.white_id.label("agent_id")).where(Game.status == "active"),
+        select(Game.black_id.label("agent_id")).where(Game.status == "active"),
+    ).subquery()
+    return db.query(func.count(Agent.id)).filter(Agent.id.not_in(select(playing.c.agent_id))).scalar()
+
+
+def double_booked(db) -> int:
+    """Agents in more than one active game."""
+    sides = union_all(
+        select(Game.white_id.label("agent_id")).where(Game.status == "active"),
+        select(Game.black_id.label("agent_id")).where(Game.status == "active"),
+    ).subquery()
+    return db.execute(select(func.count()).select_from(
+        select(sides.c.agent_id).group_by(sides.c.agent_id).having(func.count() > 1).subquery()
+    )).scalar()
+
+
+def run() -> int:
+    init_db()
+    db = SessionLocal()
+    logs = [tempfile.TemporaryFile(mode="w+") for _ in PORTS]
+    nodes = [start_node(port, log) for port, log in zip(PORTS, logs)]
+    holders = []
+    try:
+        seeded = run_phase(db, 0, PHASE, holders, list(PORTS))
+        leader = holder_node(holders[-1][1], nodes)
+        killed_at = time.monotonic()
+        os.killpg(nodes[leader].pid, signal.SIGKILL)
+        seeded = run_phase(db, seeded, PHASE, holders, [PORTS[1 - leader]])
+        time.sleep(MAINTENANCE_INTERVAL * 2)  # let the last batch get matched
+        new_leader = holder_node(holders[-1][1], nodes)
+    finally:
+        for node in nodes:
+            if node.poll() is None:
+                os.killpg(node.pid, signal.SIGTERM)
+        for node in nodes:
+            node.wait()
+
+    acquisitions = []
+    for log in logs:
+        log.seek(0)
+        acquisitions += re.findall(r"\[LEADER\] (\S+) acquired", log.read())
+    games = db.query(func.count(Game.id)).scalar()
+    resigned = db.query(func.count(Game.id)).filter(Game.status == "completed").scalar()
+    unmatched = idle_agents(db)
+    booked_twice = double_booked(db)
+    db.close()
+
+    takeover = next(t for t, _ in holders if t > killed_at) - killed_at
+    print(f"2 nodes x {WORKERS} workers, lease TTL {LEASE_TTL}s, sweep every {MAINTENANCE_INTERVAL}s, "
+          f"{seeded} agents added over {2 * PHASE:.0f}s")
+    print(f"lease holders seen:    {[holder for _, holder in holders]}")
+    print(f"acquisitions logged:   {len(acquisitions)}")
+    print(f"killed node {leader}; lease moved to node {new_leader} in {takeover:.1f}s")
+    print(f"games created:         {games} ({resigned} resigned)")
+    print(f"agents without a game: {unmatched}")
+    print(f"agents double-booked:  {booked_twice}")
+    ok = len(holders) == 2 and len(acquisitions) == 2 and new_leader != leader \
+        and takeover <= LEASE_TTL + 2 * TICK and booked_twice == 0 and unmatched <= 1
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run())
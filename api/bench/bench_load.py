@@ -0,0 +1,210 @@
+"""Load test: a population of simulated agents playing through the real API.
+
+Starts the API under uvicorn and drives it the way agents do. Every agent
+registers, is marked claimed directly in the database (standing in for the
+tweet verification), then heartbeats /api/agents/status. When a game is
+waiting on it, the agent fetches the game and plays a random legal move;
+every few heartbeats it also lists its active games. Auto-matching pairs
+the agents into games, so there is always something to play.
+
+Reports throughput, p50/p95/p99 latency and errors per endpoint, the games
+and moves played, and the database size at the end; exits non-zero if more
+than MAX_ERROR_RATE of requests failed. Uses a throwaway SQLite
+database unless DATABASE_URL is set (e.g. a local Postgres); nothing leaves
+the machine.
+
+    cd api && python bench/bench_load.py 1k
+    cd api && python bench/bench_load.py 10k --workers 4 --duration 300
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+from common import API_DIR, SessionLocal, init_db, percentiles
+
+import chess
+import httpx
+from sqlalchemy import func, text, update
+
+from database import Agent, Game, IS_POSTGRES, DATABASE_URL
+
+PORT = 18771
+# Maintenance pairs idle agents and forfeits abandoned games; sped up so
+# agents finishing a game get a new one within the run
+MAINTENANCE_INTERVAL = 5
+
+# agents, seconds measured, seconds between an agent's heartbeats,
+# requests in flight, uvicorn workers
+Scenario = namedtuple("Scenario", "agents duration heartbeat connections workers")
+SCENARIOS = {
+    "100": Scenario(100, 30, 2.0, 16, 1),
+    "1k": Scenario(1000, 60, 5.0, 32, 2),
+    "10k": Scenario(10000, 120, 20.0, 64, 4),
+}
+ACTIVE_EVERY = 5  # heartbeats between active-game listings
+MAX_ERROR_RATE = 0.01  # exit non-zero above this, so a deploy script can gate on it
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.moves = 0
+
+    async def call(self, client, gate: asyncio.Semaphore, label: str, method: str, url: str, **kwargs):
+        """One request, timed once it has a connection slot. Returns the response, or None if it failed."""
+        async with gate:
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                response = None
+            self.samples[label].append(time.perf_counter() - t0)
+        if response is None or response.status_code >= 400:
+            self.errors[label] += 1
+            return None
+        return response
+
+
+def start_server(scenario: Scenario) -> subprocess.Popen:
+    env = dict(os.environ, MAINTENANCE_INTERVAL=str(MAINTENANCE_INTERVAL))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--workers", str(scenario.workers), "--log-level", "warning"],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def register(client, gate, recorder: Recorder, name: str):
+    response = await recorder.call(client, gate, "POST /api/register", "POST", "/api/register", json={"name": name})
+    return response.json()["agent"]["api_key"] if response else None
+
+
+async def play(client, gate, recorder: Recorder, headers: dict, game_id: int):
+    response = await recorder.call(client, gate, "GET /api/games/{id}", "GET", f"/api/games/{game_id}")
+    if response is None:
+        return
+    state = response.json()
+    if state["status"] != "active":
+        return
+    board = chess.Board(state["fen"])
+    move = random.choice(list(board.legal_moves))
+    played = await recorder.call(client, gate, "POST /api/games/{id}/move", "POST", f"/api/games/{game_id}/move",
+                                 json={"move": board.san(move)}, headers=headers)
+    if played is not None:
+        recorder.moves += 1
+
+
+async def agent(client, gate, recorder: Recorder, api_key: str, scenario: Scenario, deadline: float):
+    headers = {"X-API-Key": api_key}
+    # Spread heartbeats across the interval, as independent agents would be
+    await asyncio.sleep(random.random() * scenario.heartbeat)
+    beats = 0
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        response = await recorder.call(client, gate, "GET /api/agents/status", "GET", "/api/agents/status", headers=headers)
+        if response is not None:
+            for note in response.json()["notifications"]:
+                if note["type"] == "your_turn":
+                    await play(client, gate, recorder, headers, note["game_id"])
+        beats += 1
+        if beats % ACTIVE_EVERY == 0:
+            await recorder.call(client, gate, "GET /api/games/active", "GET", "/api/games/active", headers=headers)
+        await asyncio.sleep(max(0.0, scenario.heartbeat - (time.monotonic() - started)))
+
+
+async def simulate(scenario: Scenario, prefix: str) -> tuple:
+    limits = httpx.Limits(max_connections=scenario.connections)
+    timeout = httpx.Timeout(60, pool=None)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=timeout) as client:
+        gate = asyncio.Semaphore(scenario.connections)
+        recorder = Recorder()
+        t0 = time.perf_counter()
+        keys = await asyncio.gather(*[register(client, gate, recorder, f"{prefix}-{i}") for i in range(scenario.agents)])
+        registration = time.perf_counter() - t0
+
+        db = SessionLocal()
+        db.execute(update(Agent).where(Agent.name.like(f"{prefix}-%")).values(claim_status="claimed"))
+        db.commit()
+        db.close()
+
+        deadline = time.monotonic() + scenario.duration
+        registered = recorder.samples.copy()
+        recorder.samples = defaultdict(list)
+        await asyncio.gather(*[agent(client, gate, recorder, key, scenario, deadline) for key in keys if key])
+    return registered, registration, recorder
+
+
+def database_size(db) -> int:
+    if IS_POSTGRES:
+        return db.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    return os.path.getsize(DATABASE_URL.split("sqlite:///", 1)[1])
+
+
+def report(label: str, samples: list, errors: int, seconds: float):
+    stats = percentiles(samples)
+    print(f"{label:<28} {len(samples):>7} {len(samples) / seconds:>7.1f} {stats['p50']:>7.1f} {stats['p95']:>7.1f} "
+          f"{stats['p99']:>7.1f} {errors:>6} {errors / len(samples):>6.1%}")
+
+
+def run() -> int:
+    parser = argparse.ArgumentParser(description="Drive the API with simulated agents.")
+    parser.add_argument("scenario", choices=SCENARIOS, nargs="?", default="100")
+    parser.add_argument("--workers", type=int, help="uvicorn workers (default: the scenario's)")
+    parser.add_argument("--duration", type=float, help="seconds to measure (default: the scenario's)")
+    args = parser.parse_args()
+    scenario = SCENARIOS[args.scenario]
+    scenario = scenario._replace(workers=args.workers or scenario.workers, duration=args.duration or scenario.duration)
+
+    init_db()
+    prefix = f"load-{int(time.time())}"  # a reused Postgres database may hold earlier runs
+    server = start_server(scenario)
+    try:
+        registered, registration, recorder = asyncio.run(simulate(scenario, prefix))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    db = SessionLocal()
+    ids = [agent_id for agent_id, in db.query(Agent.id).filter(Agent.name.like(f"{prefix}-%"))]
+    games = db.query(func.count(Game.id)).filter(Game.white_id.in_(ids)).scalar() if ids else 0
+    size = database_size(db)
+    db.close()
+
+    backend = "Postgres" if IS_POSTGRES else "SQLite"
+    print(f"scenario {args.scenario}: {scenario.agents} agents on {scenario.workers} workers ({backend}), heartbeat every "
+          f"{scenario.heartbeat:.0f}s, {scenario.connections} requests in flight, {scenario.duration:.0f}s measured")
+    print(f"{'endpoint':<28} {'count':>7} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'errors':>6} {'rate':>6}")
+    report("POST /api/register", registered["POST /api/register"], recorder.errors.pop("POST /api/register", 0), registration)
+    total = total_errors = 0
+    for label, samples in sorted(recorder.samples.items()):
+        report(label, samples, recorder.errors[label], scenario.duration)
+        total += len(samples)
+        total_errors += recorder.errors[label]
+    print(f"{'all (after registration)':<28} {total:>7} {total / scenario.duration:>7.1f} {'':>23} {total_errors:>6} "
+          f"{total_errors / max(1, total):>6.1%}")
+    print(f"games started: {games}, moves played: {recorder.moves}, database size: {size / 2 ** 20:.1f} MiB")
+    ok = total and total_errors / total <= MAX_ERROR_RATE
+    print("OK" if ok else f"FAILED: error rate above {MAX_ERROR_RATE:.0%}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,88 @@
+"""Benchmark: auto_match_agents on large idle populations.
+
+Seeds idle claimed agents with spread-out ratings and times one pairing
+pass at each size, reporting games created, SQL statements issued and the
+mean rating gap between paired opponents. Between sizes, every game is
+finished so the next pass also exercises rematch avoidance. The previous
+implementation (shuffle, one commit per game) is timed on the smaller
+sizes for comparison.
+
+    cd api && python bench/bench_matchmaking.py
+"""
+import random
+import time
+from datetime import datetime
+
+import chess
+from sqlalchemy import event, update
+
+from common import SessionLocal, seed_agents, make_client
+from database import engine, Agent, Game
+
+import main
+
+SIZES = [1000, 10000, 50000]
+LEGACY_MAX = 1000
+
+statements = []
+event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+
+def legacy_auto_match(db):
+    """The pre-rewrite pairing: exclusion set in Python, shuffle, commit per game."""
+    busy = set()
+    for game in db.query(Game).filter(Game.status == "active").all():
+        busy.add(game.white_id)
+        busy.add(game.black_id)
+    idle = db.query(Agent).filter(Agent.claim_status == "claimed", ~Agent.id.in_(busy) if busy else True).all()
+    random.shuffle(idle)
+    created = 0
+    while len(idle) >= 2:
+        white, black = idle.pop(), idle.pop()
+        game = Game(white_id=white.id, black_id=black.id, fen=chess.STARTING_FEN, pgn="", status="active",
+                    started_at=datetime.utcnow(), turn="white", ply_count=0)
+        db.add(game)
+        db.commit()
+        db.refresh(game)
+        created += 1
+    return created
+
+
+def finish_all(db):
+    db.execute(update(Game).where(Game.status == "active").values(status="completed", result="1/2-1/2", ended_at=datetime.utcnow()))
+    db.commit()
+
+
+def elo_gap(db, game_ids) -> float:
+    rows = db.query(Game).options(*main.WITH_PLAYERS).filter(Game.id.in_(game_ids)).all()
+    return sum(abs(g.white.elo - g.black.elo) for g in rows) / max(1, len(rows))
+
+
+def timed(fn, db):
+    statements.clear()
+    t0 = time.perf_counter()
+    result = fn(db)
+    return result, time.perf_counter() - t0, len(statements)
+
+
+def run():
+    make_client()
+    db = SessionLocal()
+    seeded = 0
+    print(f"{'agents':>7} {'impl':>7} {'games':>6} {'time':>9} {'queries':>8} {'mean elo gap':>13}")
+    for size in SIZES:
+        seed_agents(db, seeded, size - seeded)
+        seeded = size
+        if size <= LEGACY_MAX:
+            created, elapsed, queries = timed(legacy_auto_match, db)
+            print(f"{size:>7} {'legacy':>7} {created:>6} {elapsed * 1000:>7.0f}ms {queries:>8} {'':>13}")
+            finish_all(db)
+        games, elapsed, queries = timed(main.auto_match_agents, db)
+        gap = elo_gap(db, [g["game_id"] for g in games])
+        print(f"{size:>7} {'rated':>7} {len(games):>6} {elapsed * 1000:>7.0f}ms {queries:>8} {gap:>13.1f}")
+        finish_all(db)
+    db.close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,128 @@
+"""Benchmark: Move rows vs packed move blobs on a synthetic archive.
+
+Seeds completed games (random legal games, reused round-robin) with their
+Move rows, measures the space the rows take, converts every game with
+migrate_moves.py and measures the space the blobs take. Then times loading
+a whole game both ways: selecting its Move rows and replaying SAN, versus
+reading Game.packed_moves and replaying the blob (plus deriving SAN/PGN
+from it).
+
+    cd api && python bench/bench_move_storage.py [--games 100000]
+"""
+import argparse
+import random
+from datetime import datetime
+
+import chess
+from sqlalchemy import insert, text, update
+
+from common import SessionLocal, seed_agents, agent_ids, percentiles, time_calls, make_client
+from database import IS_POSTGRES, Game, Move
+
+import move_codec
+import migrate_moves
+
+DISTINCT_GAMES = 500
+MAX_PLIES = 120
+INSERT_BATCH = 2000
+SAMPLE = 1000
+
+
+def random_game(rng) -> tuple:
+    """(sans, fen after each ply) for one random legal game."""
+    board = chess.Board()
+    sans, fens = [], []
+    while not board.is_game_over() and len(sans) < MAX_PLIES:
+        sans.append(board.san_and_push(rng.choice(list(board.legal_moves))))
+        fens.append(board.fen())
+    return sans, fens
+
+
+def db_bytes(db) -> int:
+    if IS_POSTGRES:
+        return db.execute(text("SELECT pg_total_relation_size('games') + pg_total_relation_size('moves')")).scalar()
+    page_size = db.execute(text("PRAGMA page_size")).scalar()
+    return db.execute(text("PRAGMA page_count")).scalar() * page_size
+
+
+def seed_archive(db, count: int, white_id: int, black_id: int):
+    rng = random.Random(11)
+    templates = [random_game(rng) for _ in range(DISTINCT_GAMES)]
+    now = datetime.utcnow()
+    for start in range(0, count, INSERT_BATCH):
+        rows = []
+        for i in range(start, min(count, start + INSERT_BATCH)):
+            sans, fens = templates[i % DISTINCT_GAMES]
+            rows.append({
+                "white_id": white_id, "black_id": black_id, "status": "completed", "result": "1/2-1/2",
+                "fen": fens[-1], "pgn": " ".join(sans), "turn": "white" if len(sans) % 2 == 0 else "black",
+                "ply_count": len(sans), "started_at": now, "ended_at": now,
+            })
+        db.execute(insert(Game), rows)
+    # As if created before packed storage existed
+    db.execute(update(Game).values(packed_moves=None))
+    db.commit()
+    size_games = db_bytes(db)
+
+    games = db.query(Game.id).order_by(Game.id).yield_per(INSERT_BATCH)
+    batch = []
+    for n, (game_id,) in enumerate(games):
+        sans, fens = templates[n % DISTINCT_GAMES]
+        batch.extend({"game_id": game_id, "move_number": ply // 2 + 1, "move": san, "fen_after": fen, "timestamp": now}
+                     for ply, (san, fen) in enumerate(zip(sans, fens)))
+        if len(batch) >= INSERT_BATCH * 20:
+            db.execute(insert(Move), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Move), batch)
+    db.commit()
+    return size_games, db_bytes(db)
+
+
+def load_from_rows(db, game_id: int) -> chess.Board:
+    board = chess.Board()
+    for (san,) in db.query(Move.move).filter(Move.game_id == game_id).order_by(Move.id):
+        board.push_san(san)
+    return board
+
+
+def load_from_blob(db, game_id: int) -> chess.Board:
+    return move_codec.replay(db.query(Game.packed_moves).filter(Game.id == game_id).scalar())
+
+
+def pgn_from_blob(db, game_id: int) -> str:
+    return move_codec.pgn_text(db.query(Game.packed_moves).filter(Game.id == game_id).scalar())
+
+
+def run(count: int):
+    make_client()
+    db = SessionLocal()
+    seed_agents(db, 0, 2)
+    white_id, black_id = agent_ids(db, 0, 2)
+    print(f"Seeding {count} games with Move rows...")
+    size_games, size_rows = seed_archive(db, count, white_id, black_id)
+    plies = db.query(Move).count()
+    print("Converting with migrate_moves...")
+    stats = migrate_moves.migrate(batch=2000, delete_rows=False)
+    size_blobs = db_bytes(db)
+    assert stats["converted"] == count and not stats["failed"], stats
+
+    rows_bytes = size_rows - size_games
+    blob_bytes = size_blobs - size_rows
+    print(f"\n{count} games, {plies} half-moves")
+    print(f"  Move rows:    {rows_bytes / 1e6:>8.1f} MB  ({rows_bytes / plies:.1f} B/ply incl. index)")
+    print(f"  packed blobs: {blob_bytes / 1e6:>8.1f} MB  ({blob_bytes / plies:.1f} B/ply)")
+
+    sample = [(db, game_id) for (game_id,) in db.query(Game.id).order_by(Game.id).limit(SAMPLE)]
+    random.Random(3).shuffle(sample)
+    print(f"\nWhole-game load over {len(sample)} games (ms)")
+    for label, fn in (("Move rows + push_san", load_from_rows), ("blob replay", load_from_blob), ("blob -> PGN text", pgn_from_blob)):
+        p = percentiles(time_calls(fn, sample))
+        print(f"  {label:<22} p50 {p['p50']:.3f}  p95 {p['p95']:.3f}  p99 {p['p99']:.3f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=100000)
+    run(parser.parse_args().games)
@@ -0,0 +1,90 @@
+"""Benchmark: move processing with cached boards vs FEN reparsing.
+
+Replays random legal games through the board-handling part of make_move
+twice: the old way (parse the FEN, validate, push, re-check legality) and
+with BoardCache (push onto the cached board that keeps its history). Then
+plays a knight-shuffle game through the API to show threefold repetition
+now ends the game as a draw.
+
+    cd api && python bench/bench_moves.py
+"""
+import random
+import time
+
+import chess
+
+from common import make_client, percentiles
+from board_cache import BoardCache
+
+GAMES = 200
+MAX_PLIES = 120
+SHUFFLE = ["Nf3", "Nf6", "Ng1", "Ng8"] * 3
+
+
+def random_game(rng) -> list:
+    board = chess.Board()
+    sans = []
+    while not board.is_game_over() and len(sans) < MAX_PLIES:
+        move = rng.choice(list(board.legal_moves))
+        sans.append(board.san_and_push(move))
+    return sans
+
+
+def old_path(fen: str, san: str) -> str:
+    board = chess.Board(fen)
+    move = board.parse_san(san)
+    assert move in board.legal_moves
+    san = board.san(move)
+    board.push(move)
+    board.is_checkmate() or board.is_stalemate() or board.is_insufficient_material() or board.can_claim_draw()
+    return board.fen()
+
+
+def new_path(cache: BoardCache, game_id: int, san: str) -> str:
+    board = cache._boards.pop(game_id)
+    san = board.san_and_push(board.parse_san(san))
+    board.is_checkmate() or board.is_stalemate() or board.is_insufficient_material() or board.is_repetition(3) or board.is_fifty_moves()
+    fen = board.fen()
+    cache.put(game_id, board)
+    return fen
+
+
+def processing_latency():
+    rng = random.Random(7)
+    games = [random_game(rng) for _ in range(GAMES)]
+    old, new = [], []
+    cache = BoardCache()
+    for game_id, sans in enumerate(games):
+        fen = chess.STARTING_FEN
+        cache.put(game_id, chess.Board())
+        for san in sans:
+            t0 = time.perf_counter()
+            fen = old_path(fen, san)
+            old.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            assert new_path(cache, game_id, san) == fen
+            new.append(time.perf_counter() - t0)
+    for label, samples in (("fen reparse", old), ("board cache", new)):
+        stats = percentiles(samples)
+        print(f"{label:<12} {len(samples)} moves: p50={stats['p50'] * 1000:.0f}us "
+              f"p99={stats['p99'] * 1000:.0f}us mean={stats['mean'] * 1000:.0f}us")
+
+
+def repetition_draw():
+    client = make_client()
+    keys = []
+    for name in ("shuffle-white", "shuffle-black"):
+        keys.append({"X-API-Key": client.post("/api/register", json={"name": name}).json()["agent"]["api_key"]})
+    game_id = client.post("/api/challenge", json={"opponent": "shuffle-black"}, headers=keys[0]).json()["game_id"]
+    client.post(f"/api/challenges/{game_id}/accept", headers=keys[1])
+    for ply, san in enumerate(SHUFFLE):
+        r = client.post(f"/api/games/{game_id}/move", json={"move": san}, headers=keys[ply % 2]).json()
+        if r.get("result"):
+            print(f"knight shuffle: game ended {r['result']} after {ply + 1} plies (threefold repetition)")
+            return
+    print("knight shuffle: no repetition draw detected")
+
+
+if __name__ == "__main__":
+    processing_latency()
+    repetition_draw()
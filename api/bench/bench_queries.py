@@ -0,0 +1,142 @@
+"""Query budget check for the API and the maintenance sweep.
+
+Counts SQL statements per request, and per maintenance call, at two sizes
+(page size, or rows for the sweep to handle). Each is held to a declared
+budget: listings and moves to a fixed number of statements, the sweep to a
+fixed number plus a per-row allowance for the writes it has to make per
+game. A count over budget prints the statement shapes that repeated, which
+is where an N+1 shows up; the script exits non-zero if anything is over.
+
+Requests are profiled through the PROFILE_QUERIES middleware's headers,
+maintenance calls with profiler.profile_queries().
+
+    cd api && python bench/bench_queries.py
+"""
+import contextlib
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+
+from common import SessionLocal, api_key_for, seed_agents, agent_ids, seed_games, make_client
+
+os.environ["PROFILE_QUERIES"] = "1"
+
+from database import Game, MatchmakingQueue
+from profiler import profile_queries
+import main
+
+# endpoint -> max statements per request (auth lookup included: the auth
+# cache is cleared before each request, so these are the cold-cache counts)
+BUDGETS = {
+    ("GET", "/api/agents/status"): 3,
+    ("GET", "/api/games/active"): 2,
+    ("GET", "/api/games/live?limit={n}"): 1,
+    ("GET", "/api/games/archive?limit={n}"): 1,
+    # agent lookup plus one keyset seek per colour
+    ("GET", "/api/games/archive?limit={n}&agent_name=bench-0"): 3,
+    ("GET", "/api/challenges"): 2,
+    ("GET", "/api/games/{game_id}"): 1,
+    # auth, game with both players, guarded update, move row
+    ("POST", "/api/games/{game_id}/move"): 4,
+}
+
+# maintenance function -> (fixed statements, statements per game handled)
+MAINTENANCE_BUDGETS = {
+    # idle agents, recent pairings, one batched INSERT
+    "auto_match_agents": (3, 0),
+    # guarded UPDATE ... RETURNING, players, batched Elo snapshots, batched
+    # player increments; nothing per game (these games have no moves, so no
+    # explorer upsert)
+    "check_game_timeouts": (4, 0),
+    # queue load; per pair: players, game INSERT, row claim
+    "run_queue_pass": (1, 3),
+}
+SIZES = [5, 50]
+
+
+def seed(db, opponents: int) -> list:
+    """bench-0 plays, and is challenged by, every other agent. Returns the ids of its games."""
+    seed_agents(db, 0, opponents + 1)
+    ids = agent_ids(db, 0, opponents + 1)
+    hero, others = ids[0], ids[1:]
+    seed_games(db, [(hero, o) for o in others])
+    seed_games(db, [(o, hero) for o in others], status="completed")
+    seed_games(db, [(o, hero) for o in others], status="waiting")
+    return [game_id for game_id, in db.query(Game.id).filter(Game.white_id == hero, Game.status == "active")]
+
+
+def request_profile(client, method: str, url: str, body: dict) -> tuple:
+    """(statements, repeated shapes log) for one request with a cold auth cache."""
+    main.api_key_cache.clear()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        response = client.request(method, url, json=body, headers={"X-API-Key": api_key_for(0)})
+    assert response.status_code == 200, (url, response.status_code, response.text)
+    return int(response.headers["x-query-count"]), log.getvalue()
+
+
+def seed_maintenance(db, task: str, n: int, first: int):
+    """Give task n games' worth of work, using agents numbered from first."""
+    if task == "auto_match_agents":
+        seed_agents(db, first, 2 * n)
+    elif task == "check_game_timeouts":
+        seed_agents(db, first, 2 * n)
+        ids = agent_ids(db, first, 2 * n)
+        seed_games(db, list(zip(ids[::2], ids[1::2])))
+        db.query(Game).filter(Game.white_id.in_(ids[::2])).update(
+            {Game.deadline: datetime.utcnow() - timedelta(minutes=1)}, synchronize_session=False)
+    else:
+        # Unclaimed, so auto-matching leaves them alone, and long enough in the queue to pair
+        seed_agents(db, first, 2 * n, claimed=False)
+        joined = datetime.utcnow() - timedelta(minutes=5)
+        db.add_all(MatchmakingQueue(agent_id=agent_id, joined_at=joined) for agent_id in agent_ids(db, first, 2 * n))
+    db.commit()
+
+
+def maintenance_profile(db, task: str) -> tuple:
+    """(statements, games handled, repeated shapes log) for one call."""
+    with profile_queries() as profile:
+        done = main.run_queue_pass() if task == "run_queue_pass" else getattr(main, task)(db)
+    db.commit()
+    return profile.count, len(done), profile.summary()
+
+
+def run() -> int:
+    client = make_client()
+    db = SessionLocal()
+    game_ids = seed(db, max(SIZES))
+    main.leaderboard.load(db)
+
+    failures = 0
+    print(f"{'endpoint':<58} {'budget':>6} " + " ".join(f"{'n=' + str(n):>6}" for n in SIZES))
+    for (method, template), budget in BUDGETS.items():
+        profiles = [request_profile(client, method, template.format(n=n, game_id=game_ids[i]), {"move": "e4"} if method == "POST" else None)
+                    for i, n in enumerate(SIZES)]
+        counts = [count for count, _ in profiles]
+        ok = max(counts) <= budget and len(set(counts)) == 1
+        failures += not ok
+        print(f"{method + ' ' + template:<58} {budget:>6} " + " ".join(f"{c:>6}" for c in counts) + ("" if ok else "  OVER BUDGET"))
+        if not ok:
+            print("".join(log for _, log in profiles))
+
+    print(f"\n{'maintenance':<58} {'budget':>6} " + " ".join(f"{'n=' + str(n):>6}" for n in SIZES))
+    first = max(SIZES) + 1
+    for task, (fixed, per_game) in MAINTENANCE_BUDGETS.items():
+        results = []
+        for n in SIZES:
+            seed_maintenance(db, task, n, first)
+            first += 2 * n
+            results.append(maintenance_profile(db, task))
+        ok = all(done > 0 and count <= fixed + per_game * done for count, done, _ in results)
+        failures += not ok
+        budget = f"{fixed}+{per_game}/game" if per_game else str(fixed)
+        print(f"{task:<58} {budget:>6} " + " ".join(f"{count:>6}" for count, _, _ in results) + ("" if ok else "  OVER BUDGET"))
+        if not ok:
+            print("\n".join(f"{done} games: {summary}" for _, done, summary in results))
+    db.close()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run() else 0)
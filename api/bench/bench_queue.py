@@ -0,0 +1,168 @@
+"""Simulation: thousands of agents joining and leaving the matchmaking queue.
+
+Starts the API under uvicorn with several workers sharing one database and
+sends agents through /api/queue/join in concurrent waves; some leave again
+after a moment and rejoin later. Agents left waiting are paired by the
+maintenance leader's queue pass. Afterwards it checks that:
+
+- no agent was ever put into two active games
+- every game's rating gap was inside the band one of its players had reached
+- the queue table holds exactly the agents that never got a game
+
+and reports join latency, how agents were matched, rating gaps and waits.
+
+    cd api && python bench/bench_queue.py
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from common import API_DIR, SessionLocal, init_db, seed_agents, agent_ids, api_key_for, percentiles
+
+import httpx
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import aliased
+
+from database import Agent, Game, MatchmakingQueue
+from match_queue import band
+
+PORT = 18770
+WORKERS = 2
+AGENTS = 3000
+CONCURRENCY = 32
+LEAVE_CHANCE = 0.2  # of agents left waiting, how many leave and rejoin later
+SETTLE = 5.0  # seconds for queue passes to pair the stragglers
+
+
+def start_server() -> subprocess.Popen:
+    # Agents are seeded unclaimed, so maintenance auto-matching leaves them alone
+    env = dict(os.environ, LEASE_TTL="3")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--workers", str(WORKERS), "--log-level", "warning"],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def agent(client, i: int, gate: asyncio.Semaphore, joined: dict, samples: list, outcomes: Counter):
+    headers = {"X-API-Key": api_key_for(i)}
+    # Arrivals spread over a few seconds, as a real queue fills
+    await asyncio.sleep(random.random() * 3)
+    async with gate:
+        joined[i] = datetime.utcnow()
+        t0 = time.perf_counter()
+        response = await client.post("/api/queue/join", headers=headers)
+        samples.append(time.perf_counter() - t0)
+    body = response.json()
+    if response.status_code != 200:
+        outcomes[f"error {response.status_code}"] += 1
+        return
+    if body["matched"]:
+        outcomes["matched on join"] += 1
+        return
+    outcomes["queued"] += 1
+    if random.random() >= LEAVE_CHANCE:
+        return
+    left = (await client.delete("/api/queue/leave", headers=headers)).json()
+    if left["message"] != "Left queue":
+        outcomes["matched before leaving"] += 1
+        return
+    outcomes["left"] += 1
+    await asyncio.sleep(random.random() * 2)
+    async with gate:
+        joined[i] = datetime.utcnow()
+        t0 = time.perf_counter()
+        response = await client.post("/api/queue/join", headers=headers)
+        samples.append(time.perf_counter() - t0)
+    outcomes["matched on rejoin" if response.json()["matched"] else "requeued"] += 1
+
+
+async def simulate() -> tuple:
+    limits = httpx.Limits(max_connections=CONCURRENCY)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+        gate = asyncio.Semaphore(CONCURRENCY)
+        joined, samples, outcomes = {}, [], Counter()
+        await asyncio.gather(*[agent(client, i, gate, joined, samples, outcomes) for i in range(AGENTS)])
+    return joined, samples, outcomes
+
+
+def double_booked(db) -> int:
+    sides = union_all(
+        select(Game.white_id.label("agent_id")).where(Game.status == "active"),
+        select(Game.black_id.label("agent_id")).where(Game.status == "active"),
+    ).subquery()
+    return db.execute(select(func.count()).select_from(
+        select(sides.c.agent_id).group_by(sides.c.agent_id).having(func.count() > 1).subquery()
+    )).scalar()
+
+
+def run():
+    init_db()
+    db = SessionLocal()
+    seed_agents(db, 0, AGENTS, claimed=False)
+    ids = agent_ids(db, 0, AGENTS)
+
+    server = start_server()
+    try:
+        t0 = time.perf_counter()
+        joined, samples, outcomes = asyncio.run(simulate())
+        elapsed = time.perf_counter() - t0
+        time.sleep(SETTLE)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    White, Black = aliased(Agent), aliased(Agent)
+    games = db.query(Game.white_id, Game.black_id, Game.started_at, White.elo, Black.elo).join(
+        White, White.id == Game.white_id
+    ).join(Black, Black.id == Game.black_id).all()
+    index = {agent_id: i for i, agent_id in enumerate(ids)}
+    gaps, waits, out_of_band = [], [], 0
+    for white_id, black_id, started_at, white_elo, black_elo in games:
+        gap = abs(white_elo - black_elo)
+        waited = [(started_at - joined[index[agent_id]]).total_seconds() for agent_id in (white_id, black_id)]
+        gaps.append(gap)
+        waits += [max(0.0, w) for w in waited]
+        if gap > band(max(waited)) + 1:  # +1 for clock granularity between processes
+            out_of_band += 1
+    in_game = {agent_id for game in games for agent_id in game[:2]}
+    queued = {agent_id for agent_id, in db.query(MatchmakingQueue.agent_id)}
+    booked_twice = double_booked(db)
+    db.close()
+
+    stats = percentiles(samples)
+    print(f"{AGENTS} agents on {WORKERS} workers, {CONCURRENCY} requests in flight, {elapsed:.1f}s + {SETTLE:.0f}s to settle")
+    print(f"outcomes:             {dict(outcomes)}")
+    print(f"join latency:         p50 {stats['p50']:.1f}ms  p95 {stats['p95']:.1f}ms  p99 {stats['p99']:.1f}ms  ({len(samples)} joins)")
+    print(f"games created:        {len(games)}  (matched by queue pass: {len(games) - outcomes['matched on join'] - outcomes['matched on rejoin']})")
+    if games:
+        gap_stats = percentiles([gap / 1000 for gap in gaps])  # percentiles() reports x1000
+        wait_stats = percentiles(waits)
+        print(f"rating gap:           p50 {gap_stats['p50']:.0f}  p95 {gap_stats['p95']:.0f}  max {max(gaps)}")
+        print(f"wait before game:     p50 {wait_stats['p50'] / 1000:.2f}s  p95 {wait_stats['p95'] / 1000:.2f}s  max {max(waits):.2f}s")
+    print(f"games outside band:   {out_of_band}")
+    print(f"agents double-booked: {booked_twice}")
+    print(f"still queued:         {len(queued)}  (agents without a game: {AGENTS - len(in_game)})")
+    ok = booked_twice == 0 and out_of_band == 0 and not any(outcome.startswith("error") for outcome in outcomes) \
+        and not queued & in_game and len(queued) == AGENTS - len(in_game)
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,123 @@
+"""Overload test: honest agents polling beside one abusive client.
+
+Starts the API under uvicorn with a single worker, then runs honest agents
+polling /api/agents/status about once a second while one client hammers the
+same endpoint with its key from many connections, and another sends every
+request with a freshly made-up key. Each client comes from its own address
+(via Fly-Client-IP). Runs once with rate limiting off and once with it on,
+reporting the honest agents' latency and how the abusive clients' requests
+were answered.
+
+    cd api && python bench/bench_ratelimit.py
+"""
+import asyncio
+import os
+import random
+import secrets
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from common import API_DIR, SessionLocal, init_db, seed_agents, api_key_for, percentiles
+
+import httpx
+
+PORT = 18766
+HONEST = 50
+HONEST_CONNECTIONS = 4
+ABUSIVE_CONNECTIONS = 32
+RANDOM_KEY_CONNECTIONS = 8
+DURATION = 10.0  # seconds
+POLL_INTERVAL = 1.0
+
+
+def start_server(limits_enabled: bool) -> subprocess.Popen:
+    env = dict(os.environ, RATE_LIMITS_ENABLED="1" if limits_enabled else "0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--workers", "1", "--log-level", "warning"],
+        cwd=API_DIR, env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+# Per client, as Fly's proxy would report them
+HONEST_IP, ABUSIVE_IP, RANDOM_KEY_IP = "198.51.100.1", "203.0.113.1", "203.0.113.2"
+
+
+async def honest(client, key, deadline, samples, statuses):
+    # Stagger the agents across the interval, as real heartbeats would be
+    await asyncio.sleep(random.random() * POLL_INTERVAL)
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        response = await client.get("/api/agents/status", headers={"X-API-Key": key, "Fly-Client-IP": HONEST_IP})
+        samples.append(time.perf_counter() - t0)
+        statuses[response.status_code] += 1
+        await asyncio.sleep(max(0.0, POLL_INTERVAL - (time.perf_counter() - t0)))
+
+
+async def abusive(client, key, deadline, statuses):
+    while time.monotonic() < deadline:
+        response = await client.get("/api/agents/status", headers={"X-API-Key": key, "Fly-Client-IP": ABUSIVE_IP})
+        statuses[response.status_code] += 1
+
+
+async def random_keys(client, deadline, statuses):
+    # A key nobody registered: without limits each one costs an auth lookup
+    while time.monotonic() < deadline:
+        key = f"moltchess_{secrets.token_urlsafe(24)}"
+        response = await client.get("/api/agents/status", headers={"X-API-Key": key, "Fly-Client-IP": RANDOM_KEY_IP})
+        statuses[response.status_code] += 1
+
+
+def make_client(connections: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=connections)
+    return httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=30)
+
+
+async def overload() -> tuple:
+    async with make_client(HONEST_CONNECTIONS) as honest_client, make_client(ABUSIVE_CONNECTIONS) as abusive_client, \
+            make_client(RANDOM_KEY_CONNECTIONS) as random_key_client:
+        deadline = time.monotonic() + DURATION
+        samples, honest_statuses, abusive_statuses, random_key_statuses = [], Counter(), Counter(), Counter()
+        await asyncio.gather(
+            *[honest(honest_client, api_key_for(i), deadline, samples, honest_statuses) for i in range(HONEST)],
+            *[abusive(abusive_client, api_key_for(HONEST), deadline, abusive_statuses) for _ in range(ABUSIVE_CONNECTIONS)],
+            *[random_keys(random_key_client, deadline, random_key_statuses) for _ in range(RANDOM_KEY_CONNECTIONS)],
+        )
+    return percentiles(samples), honest_statuses, abusive_statuses, random_key_statuses
+
+
+def run():
+    init_db()
+    db = SessionLocal()
+    seed_agents(db, 0, HONEST + 1)
+    db.close()
+
+    print(f"{HONEST} honest agents polling every {POLL_INTERVAL:.0f}s, 1 client on {ABUSIVE_CONNECTIONS} connections, "
+          f"1 random-key client on {RANDOM_KEY_CONNECTIONS}, {DURATION:.0f}s")
+    print(f"{'limits':<7} {'honest p50':>10} {'p99':>9} {'honest codes':<22} {'abusive codes':<22} {'random-key codes'}")
+    for enabled in (False, True):
+        server = start_server(enabled)
+        try:
+            stats, honest_statuses, abusive_statuses, random_key_statuses = asyncio.run(overload())
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        codes = lambda counts: " ".join(f"{code}:{n}" for code, n in sorted(counts.items()))
+        print(f"{'on' if enabled else 'off':<7} {stats['p50']:>8.1f}ms {stats['p99']:>7.1f}ms "
+              f"{codes(honest_statuses):<22} {codes(abusive_statuses):<22} {codes(random_key_statuses)}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,78 @@
+"""Benchmark: full rating recomputation with the NumPy engines.
+
+Builds a synthetic archive (no database) of 1M games between 5k agents
+spread over a year, with results drawn from hidden true strengths, and
+times EloEngine and Glicko2Engine on it. EloEngine is checked against a
+sequential calculate_elo replay on the first 50k games, and Glicko2Engine
+against the worked example in Glickman's Glicko-2 paper.
+
+    cd api && python bench/bench_ratings.py
+"""
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (sets up sys.path and a throwaway DATABASE_URL)
+from rating_engine import Archive, Ratings, EloEngine, Glicko2Engine
+from main import calculate_elo
+
+GAMES = 1_000_000
+AGENTS = 5000
+CHECK_GAMES = 50_000
+
+
+def synthetic_archive(games: int, agents: int, seed: int = 5) -> Archive:
+    rng = np.random.default_rng(seed)
+    strength = rng.normal(1200, 250, agents)
+    white = rng.integers(0, agents, games)
+    black = (white + rng.integers(1, agents, games)) % agents
+    p_white = 1 / (1 + 10 ** ((strength[black] - strength[white]) / 400))
+    draw = rng.random(games) < 0.1
+    score = np.where(draw, 0.5, (rng.random(games) < p_white).astype(float))
+    ended_at = np.sort(rng.uniform(0, 365 * 86400, games))
+    return Archive(np.arange(agents), white, black, score, ended_at)
+
+
+def sequential_elo(archive: Archive, games: int) -> np.ndarray:
+    rating = [1200] * len(archive.agent_ids)
+    for w, b, s in zip(archive.white[:games].tolist(), archive.black[:games].tolist(), archive.score[:games].tolist()):
+        if s == 1:
+            rating[w], rating[b] = calculate_elo(rating[w], rating[b])
+        elif s == 0:
+            rating[b], rating[w] = calculate_elo(rating[b], rating[w])
+        else:
+            rating[w], rating[b] = calculate_elo(rating[w], rating[b], draw=True)
+    return np.array(rating)
+
+
+def check_glicko2_paper_example():
+    """Player 1500/200 beats 1400/30, loses to 1550/100 and 1700/300 -> 1464.06 / 151.52."""
+    archive = Archive(np.arange(4), np.array([0, 0, 0]), np.array([1, 2, 3]), np.array([1.0, 0.0, 0.0]), np.zeros(3))
+    start = Ratings(np.array([1500.0, 1400, 1550, 1700]), np.array([200.0, 30, 100, 300]))
+    ratings = Glicko2Engine().run(archive, start)
+    print(f"Glicko-2 paper example: {ratings.rating[0]:.2f} / {ratings.deviation[0]:.2f} (expected 1464.06 / 151.52)")
+    assert abs(ratings.rating[0] - 1464.06) < 0.1 and abs(ratings.deviation[0] - 151.52) < 0.1
+
+
+def run():
+    check_glicko2_paper_example()
+    archive = synthetic_archive(GAMES, AGENTS)
+
+    t0 = time.perf_counter()
+    expected = sequential_elo(archive, CHECK_GAMES)
+    sequential = time.perf_counter() - t0
+    head = Archive(archive.agent_ids, archive.white[:CHECK_GAMES], archive.black[:CHECK_GAMES], archive.score[:CHECK_GAMES], archive.ended_at[:CHECK_GAMES])
+    mismatched = np.count_nonzero(EloEngine().run(head).rating != expected)
+    print(f"Elo vs sequential calculate_elo on {CHECK_GAMES} games: {mismatched} agents differ (sequential took {sequential:.2f}s)")
+
+    print(f"\n{GAMES} games, {AGENTS} agents")
+    for engine in (EloEngine(), Glicko2Engine(period_days=1), Glicko2Engine(period_days=7)):
+        t0 = time.perf_counter()
+        ratings = engine.run(archive)
+        elapsed = time.perf_counter() - t0
+        label = engine.name if engine.name == "elo" else f"{engine.name} ({engine.period / 86400:.0f}d)"
+        print(f"  {label:<16} {elapsed:>6.2f}s  rating range {ratings.rating.min():.0f}..{ratings.rating.max():.0f}")
+
+
+if __name__ == "__main__":
+    run()
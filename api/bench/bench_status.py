@@ -0,0 +1,53 @@
+"""Benchmark: /api/agents/status latency as the league grows.
+
+Status is a per-agent read, so its latency should stay flat while the
+number of agents and games grows by two orders of magnitude. For
+comparison, the league-wide maintenance pass each heartbeat used to run
+inline is timed at every size too.
+
+    cd api && python bench/bench_status.py
+"""
+import random
+
+from common import (
+    SessionLocal, api_key_for, seed_agents, agent_ids, seed_games, count_games,
+    percentiles, time_calls, make_client,
+)
+import main
+
+SIZES = [100, 1000, 10000]
+COMPLETED_PER_AGENT = 5
+SAMPLES = 300
+
+
+def grow_league(db, start: int, count: int) -> None:
+    """Add `count` claimed agents, each in one active game and a few finished ones."""
+    seed_agents(db, start, count)
+    ids = agent_ids(db, start, count)
+    seed_games(db, [(ids[i], ids[i + 1]) for i in range(0, len(ids) - 1, 2)])
+    completed = [(random.choice(ids), random.choice(ids)) for _ in range(count * COMPLETED_PER_AGENT // 2)]
+    seed_games(db, completed, status="completed")
+
+
+def run():
+    client = make_client()
+    db = SessionLocal()
+    seeded = 0
+    print(f"{'agents':>8} {'games':>8} {'status p50':>11} {'p95':>8} {'p99':>8} {'maintenance':>12}")
+    for size in SIZES:
+        grow_league(db, seeded, size - seeded)
+        seeded = size
+        keys = [api_key_for(random.randrange(seeded)) for _ in range(SAMPLES)]
+        samples = time_calls(
+            lambda key: client.get("/api/agents/status", headers={"X-API-Key": key}),
+            [(k,) for k in keys],
+        )
+        stats = percentiles(samples)
+        maintenance = time_calls(lambda: (main.check_game_timeouts(db), main.auto_match_agents(db)), [()])[0]
+        print(f"{seeded:>8} {count_games(db):>8} {stats['p50']:>9.2f}ms {stats['p95']:>6.2f}ms "
+              f"{stats['p99']:>6.2f}ms {maintenance * 1000:>10.1f}ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    run()
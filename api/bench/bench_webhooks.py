@@ -0,0 +1,139 @@
+"""Benchmark: webhook delivery throughput and move latency with slow callbacks.
+
+Starts stand-in callback servers on local ports (one "host" each), some
+slow and some flaky, then:
+
+1. pushes a burst of notifications through the dispatcher and reports
+   deliveries/s, retries and dead letters;
+2. sends a few deliveries to a host that takes SLOW_HOST_SECONDS to answer,
+   more than its per-host limit, then one to a fast host, and reports how
+   long the fast one took (it should not wait for the slow host);
+3. plays moves through the API while every callback takes a second to
+   answer, showing make_move no longer waits on the opponent's webhook.
+
+    cd api && python bench/bench_webhooks.py
+"""
+import asyncio
+import random
+import threading
+import time
+
+from common import init_db, percentiles
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+import main
+from webhooks import WebhookDispatcher
+
+PORTS = [18701, 18702, 18703, 18704]
+NOTIFICATIONS = 5000
+FAILURE_RATE = 0.05
+SLOW_CALLBACK_SECONDS = 1.0
+SLOW_HOST_SECONDS = 2.0
+MOVES = ["e4", "e5", "Nf3", "Nc6", "Bc4", "Bc5", "c3", "Nf6", "d4", "exd4"]
+
+
+class CallbackServer:
+    """Counts POSTs; optionally delays or fails a fraction of them."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.received = 0
+        self.delay = 0.0
+        self.failure_rate = 0.0
+        app = FastAPI()
+
+        @app.post("/hook")
+        async def hook(request: Request):
+            await request.body()
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if random.random() < self.failure_rate:
+                return Response(status_code=503)
+            self.received += 1
+            return {"ok": True}
+
+        self.server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", lifespan="off"))
+        threading.Thread(target=self.server.run, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/hook"
+
+
+async def burst(servers) -> None:
+    dispatcher = WebhookDispatcher(backoff_base=0.05)
+    await dispatcher.start()
+    for server in servers:
+        server.failure_rate = FAILURE_RATE
+    t0 = time.perf_counter()
+    for i in range(NOTIFICATIONS):
+        dispatcher.enqueue(servers[i % len(servers)].url, {"type": "your_turn", "game_id": i})
+    while dispatcher.delivered + dispatcher.dead_letters + dispatcher.dropped < NOTIFICATIONS:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    await dispatcher.stop()
+    print(f"burst: {NOTIFICATIONS} notifications to {len(servers)} hosts in {elapsed:.2f}s "
+          f"({NOTIFICATIONS / elapsed:.0f}/s); delivered={dispatcher.delivered} retried={dispatcher.retried} "
+          f"dead_letters={dispatcher.dead_letters} dropped={dispatcher.dropped}")
+    for server in servers:
+        server.failure_rate = 0.0
+
+
+async def slow_host(slow, fast) -> None:
+    dispatcher = WebhookDispatcher(workers=4, per_host=1)
+    await dispatcher.start()
+    slow.delay = SLOW_HOST_SECONDS
+    received = fast.received
+    for i in range(dispatcher.workers):
+        dispatcher.enqueue(slow.url, {"type": "your_turn", "game_id": i})
+    t0 = time.perf_counter()
+    dispatcher.enqueue(fast.url, {"type": "your_turn", "game_id": -1})
+    while fast.received == received:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - t0
+    await dispatcher.stop()
+    slow.delay = 0.0
+    print(f"slow host: {dispatcher.workers} deliveries to a {SLOW_HOST_SECONDS:.0f}s host (1 at a time), "
+          f"then 1 to a fast host; fast one delivered after {elapsed:.2f}s")
+
+
+async def moves_with_slow_callbacks(server) -> None:
+    server.delay = SLOW_CALLBACK_SECONDS
+    await main.dispatcher.start()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        keys = []
+        for name in ("hook-white", "hook-black"):
+            r = await client.post("/api/register", json={"name": name, "callback_url": server.url})
+            keys.append({"X-API-Key": r.json()["agent"]["api_key"]})
+        game_id = (await client.post("/api/challenge", json={"opponent": "hook-black"}, headers=keys[0])).json()["game_id"]
+        await client.post(f"/api/challenges/{game_id}/accept", headers=keys[1])
+        samples = []
+        for ply, move in enumerate(MOVES):
+            t0 = time.perf_counter()
+            r = await client.post(f"/api/games/{game_id}/move", json={"move": move}, headers=keys[ply % 2])
+            samples.append(time.perf_counter() - t0)
+            assert r.status_code == 200, r.text
+    stats = percentiles(samples)
+    print(f"make_move with {SLOW_CALLBACK_SECONDS:.0f}s callbacks: p50={stats['p50']:.1f}ms "
+          f"p99={stats['p99']:.1f}ms over {len(samples)} moves")
+    while main.dispatcher.delivered < len(MOVES):
+        await asyncio.sleep(0.05)
+    print(f"  callbacks delivered in background: {main.dispatcher.delivered}")
+    await main.dispatcher.stop()
+
+
+def run():
+    init_db()
+    servers = [CallbackServer(port) for port in PORTS]
+    time.sleep(1)
+    asyncio.run(burst(servers))
+    asyncio.run(slow_host(servers[0], servers[1]))
+    asyncio.run(moves_with_slow_callbacks(servers[0]))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,114 @@
+"""Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database unless DATABASE_URL is
+already set. Import this module before anything from the api package, since
+database.py binds its engine at import time.
+
+    cd api && python bench/bench_status.py
+"""
+import os
+import sys
+import tempfile
+import time
+import statistics
+from datetime import datetime, timedelta
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+# Benchmarks register and poll far faster than any real agent
+os.environ.setdefault("RATE_LIMITS_ENABLED", "0")
+
+if "DATABASE_URL" not in os.environ:
+    _tmp_dir = tempfile.mkdtemp(prefix="molt-chess-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+
+import chess
+from sqlalchemy import insert, func
+
+from database import SessionLocal, init_db, Agent, Game
+from auth import hash_api_key
+
+
+def api_key_for(i: int) -> str:
+    return f"moltchess_bench_{i}"
+
+
+def seed_agents(db, start: int, count: int, claimed: bool = True) -> None:
+    """Bulk insert agents bench-{start}..bench-{start+count-1}."""
+    rows = [
+        {
+            "name": f"bench-{i}",
+            "api_key": hash_api_key(api_key_for(i)),
+            "elo": 800 + (i * 37) % 1200,
+            "games_played": 0,
+            "wins": 0,
+            "losses": 0,
+            "draws": 0,
+            "claim_status": "claimed" if claimed else "pending",
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(start, start + count)
+    ]
+    db.execute(insert(Agent), rows)
+    db.commit()
+
+
+def agent_ids(db, start: int, count: int) -> list:
+    names = [f"bench-{i}" for i in range(start, start + count)]
+    return [a.id for a in db.query(Agent.id).filter(Agent.name.in_(names)).order_by(Agent.id)]
+
+
+def seed_games(db, pairs: list, status: str = "active") -> None:
+    """Bulk insert one game per (white_id, black_id) pair."""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "white_id": white_id,
+            "black_id": black_id,
+            "status": status,
+            "fen": chess.STARTING_FEN,
+            "pgn": "" if status == "active" else "e4 e5 Qh5 Nc6 Bc4 Nf6 Qxf7#",
+            "result": None if status == "active" else "1-0",
+            "time_control": "24h",
+            "created_at": now,
+            "started_at": now,
+            "ended_at": None if status == "active" else now - timedelta(seconds=i),
+            "turn": "white",
+            "ply_count": 0 if status == "active" else 7,
+            "deadline": now + timedelta(hours=24),
+        }
+        for i, (white_id, black_id) in enumerate(pairs)
+    ]
+    db.execute(insert(Game), rows)
+    db.commit()
+
+
+def count_games(db) -> int:
+    return db.query(func.count(Game.id)).scalar()
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99 in milliseconds."""
+    ordered = sorted(samples)
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": statistics.mean(ordered) * 1000}
+
+
+def time_calls(fn, args_list: list) -> list:
+    """Call fn(*args) for each entry and return per-call durations in seconds."""
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def make_client():
+    """TestClient over the app without running startup hooks (no background loop)."""
+    from fastapi.testclient import TestClient
+    import main
+    init_db()
+    return TestClient(main.app)
@@ -0,0 +1,85 @@
+"""LRU cache of live chess.Board objects for active games.
+
+Boards keep their full move stack, so repetition draws are detectable and a
+move costs one push instead of a FEN parse. Entries are validated against
+Game.ply_count via board.ply(); a stale or missing board is rebuilt by
+replaying Game.packed_moves, or the Move rows for games not yet converted.
+make_move checks a board out (exclusive use) and puts it back after commit;
+finished games are evicted.
+"""
+import threading
+from collections import OrderedDict
+
+import chess
+from sqlalchemy.orm import Session
+
+import move_codec
+from database import Game, Move
+
+BOARD_CACHE_SIZE = 2048
+
+
+class BoardCache:
+    def __init__(self, maxsize: int = BOARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._boards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def checkout(self, db: Session, game: Game) -> chess.Board:
+        """Take the game's board out of the cache, rebuilding it on a miss.
+
+        The caller owns the board until it calls put(); a concurrent request
+        for the same game rebuilds its own copy instead of sharing it.
+        """
+        with self._lock:
+            board = self._boards.pop(game.id, None)
+        if board is not None and board.ply() == game.ply_count:
+            self.hits += 1
+            return board
+        self.misses += 1
+        return self.rebuild(db, game)
+
+    def put(self, game_id: int, board: chess.Board):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._boards[game_id] = board
+            self._boards.move_to_end(game_id)
+            while len(self._boards) > self.maxsize:
+                self._boards.popitem(last=False)
+
+    def evict(self, game_id: int):
+        with self._lock:
+            self._boards.pop(game_id, None)
+
+    def __len__(self):
+        return len(self._boards)
+
+    @staticmethod
+    def rebuild(db: Session, game: Game) -> chess.Board:
+        """Replay the game's moves from the start position.
+
+        Falls back to the stored FEN (no history) if the moves don't
+        reproduce it, e.g. for games that predate move logging.
+        """
+        if move_codec.is_complete(game.packed_moves, game.ply_count):
+            try:
+                board = move_codec.replay(game.packed_moves)
+            except ValueError:
+                return chess.Board(game.fen)
+            return board if board.fen() == game.fen else chess.Board(game.fen)
+        board = chess.Board()
+        sans = db.query(Move.move).filter(Move.game_id == game.id).order_by(Move.id)
+        try:
+            for (san,) in sans:
+                board.push_san(san)
+        except ValueError:
+            return chess.Board(game.fen)
+        if len(board.move_stack) != game.ply_count or board.fen() != game.fen:
+            return chess.Board(game.fen)
+        return board
+
+
+board_cache = BoardCache()
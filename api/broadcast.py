@@ -0,0 +1,112 @@
+"""Server-Sent Events fan-out for spectators.
+
+make_move, resign, the timeout sweep and game creation publish events here.
+Each event is serialized to an SSE frame once and the same frame is queued to
+every subscriber of its topics, so spectator count never multiplies DB or CPU
+work. Subscribers that fall too far behind are dropped; their stream ends and
+EventSource reconnects with a fresh snapshot.
+"""
+import asyncio
+import json
+from typing import Dict, Iterable, Optional, Set
+
+LIVE_TOPIC = "live"
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+def game_topic(game_id: int) -> str:
+    return f"game:{game_id}"
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Broadcaster:
+    """Topic -> subscriber queues of pre-serialized SSE frames."""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._topics: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._topics.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        subscribers = self._topics.get(topic)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._topics[topic]
+
+    def publish(self, topics: Iterable[str], event: str, data: dict):
+        """Serialize once and fan out. Safe to call from any thread."""
+        loop = self._loop
+        topics = tuple(topics)
+        if loop is None or loop.is_closed() or not any(t in self._topics for t in topics):
+            return
+        frame = format_sse(event, data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(topics, frame)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, topics, frame)
+
+    def _fan_out(self, topics, frame: str):
+        for topic in topics:
+            for queue in list(self._topics.get(topic, ())):
+                try:
+                    queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    self._drop(topic, queue)
+
+    def _drop(self, topic: str, queue: asyncio.Queue):
+        """Disconnect a subscriber that stopped reading."""
+        self.unsubscribe(topic, queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def stream(self, topic: str, queue: asyncio.Queue, snapshot: str, until: Optional[str] = None):
+        """SSE body: the snapshot frame, then published frames and keepalives.
+
+        `queue` comes from subscribe(), called before the snapshot was read:
+        publish() skips topics nobody has subscribed to yet, so subscribing
+        here instead would lose whatever happened in between (at worst the
+        `result`). Events already reflected in the snapshot may repeat.
+
+        Ends after a frame for event `until` (e.g. a finished game) or when
+        the subscriber is dropped.
+        """
+        try:
+            yield snapshot
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+                if until and frame.startswith(f"event: {until}\n"):
+                    return
+        finally:
+            self.unsubscribe(topic, queue)
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(subscribers) for subscribers in self._topics.values())
+
+
+broadcaster = Broadcaster()
@@ -1,9 +1,12 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text, Index, LargeBinary, BigInteger
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker, Session, relationship
 from datetime import datetime
+from typing import Optional
 import os
 
+import anyio
+
 # Database URL configuration
 # Railway Postgres sets DATABASE_URL automatically
 # Falls back to SQLite for local development
@@ -22,17 +25,31 @@ def get_database_url():
 
 DATABASE_URL = get_database_url()
 IS_POSTGRES = DATABASE_URL.startswith("postgresql://")
+# Game.packed_moves is always kept; set STORE_MOVE_ROWS=0 to stop also
+# writing a Move row (SAN + FEN) per half-move once migrate_moves.py has run.
+# The space is only reclaimed by then running migrate_moves.py --delete-rows
+STORE_MOVE_ROWS = os.getenv("STORE_MOVE_ROWS", "1") != "0"
+
+# Connections per process; main.py sizes its thread pool to match
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Threads that return connections needing a ROLLBACK (see get_db)
+DB_CLOSE_THREADS = 4
 
 # Create engine with appropriate settings
 if IS_POSTGRES:
     engine = create_engine(
         DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
         pool_pre_ping=True,  # Check connection health
         pool_recycle=300,    # Recycle connections every 5 min
     )
 else:
     engine = create_engine(
         DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
         connect_args={"check_same_thread": False}  # SQLite specific
     )
 
@@ -73,6 +90,31 @@ class Game(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime, nullable=True)
     ended_at = Column(DateTime, nullable=True)
+    # Denormalized position state so listings never re-parse the FEN
+    turn = Column(String(8), default="white")  # white, black
+    ply_count = Column(Integer, default=0)  # half-moves played
+    # Every move as 2 bytes (see move_codec); NULL until migrate_moves converts an old game
+    packed_moves = Column(LargeBinary, default=b"")
+    # Timeout tracking: side to move forfeits once deadline passes
+    deadline = Column(DateTime, nullable=True)
+    # Players' Elo going into the result, recorded by finish_game
+    white_elo = Column(Integer, nullable=True)
+    black_elo = Column(Integer, nullable=True)
+
+    # Listings eager-load these with main.WITH_PLAYERS to avoid per-row lookups
+    white = relationship("Agent", foreign_keys=[white_id])
+    black = relationship("Agent", foreign_keys=[black_id])
+
+    __table_args__ = (
+        Index("ix_games_status_deadline", "status", "deadline"),
+        # "games where it's agent X's turn"
+        Index("ix_games_white_status_turn", "white_id", "status", "turn"),
+        Index("ix_games_black_status_turn", "black_id", "status", "turn"),
+        # Archive keyset pagination on (ended_at, id), league-wide and per agent
+        Index("ix_games_status_ended_at", "status", "ended_at", "id"),
+        Index("ix_games_white_status_ended_at", "white_id", "status", "ended_at", "id"),
+        Index("ix_games_black_status_ended_at", "black_id", "status", "ended_at", "id"),
+    )
 
 class Move(Base):
     __tablename__ = "moves"
@@ -84,6 +126,23 @@ class Move(Base):
     fen_after = Column(String(128), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # A game's moves in play order (ids are assigned in play order)
+        Index("ix_moves_game_id_id", "game_id", "id"),
+    )
+
+class ExplorerMove(Base):
+    """Opening explorer: one row per (position, move) played in a completed game."""
+    __tablename__ = "explorer_moves"
+    
+    position_key = Column(BigInteger, primary_key=True)  # signed Zobrist hash
+    move = Column(String(5), primary_key=True)  # UCI
+    games = Column(Integer, nullable=False, default=0)
+    white_wins = Column(Integer, nullable=False, default=0)
+    draws = Column(Integer, nullable=False, default=0)
+    black_wins = Column(Integer, nullable=False, default=0)
+    elo_sum = Column(BigInteger, nullable=False, default=0)  # mover's Elo, summed over games
+
 class MatchmakingQueue(Base):
     __tablename__ = "matchmaking_queue"
     
@@ -91,6 +150,15 @@ class MatchmakingQueue(Base):
     agent_id = Column(Integer, ForeignKey("agents.id"), unique=True, nullable=False)
     joined_at = Column(DateTime, default=datetime.utcnow)
 
+class Lease(Base):
+    """A named lease held by one process at a time (see lease.py)."""
+    __tablename__ = "leases"
+    
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(128), nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
 def init_db():
     """Create all tables and run migrations."""
     # Run migrations BEFORE create_all to avoid ORM errors
@@ -121,13 +189,74 @@ def init_db():
                 
                 conn.commit()
     
+    # Games migrations run on both backends (Fly.io deploys on SQLite)
+    from sqlalchemy import text, inspect
+    inspector = inspect(engine)
+    if 'games' in inspector.get_table_names():
+        existing_columns = [c['name'] for c in inspector.get_columns('games')]
+        with engine.connect() as conn:
+            migrations = [
+                ("turn", "ALTER TABLE games ADD COLUMN turn VARCHAR(8) DEFAULT 'white'"),
+                ("deadline", "ALTER TABLE games ADD COLUMN deadline TIMESTAMP"),
+                # No default: NULL marks rows for backfill from pgn at startup
+                ("ply_count", "ALTER TABLE games ADD COLUMN ply_count INTEGER"),
+                # No default either: NULL marks games for migrate_moves.py
+                ("packed_moves", f"ALTER TABLE games ADD COLUMN packed_moves {'BYTEA' if IS_POSTGRES else 'BLOB'}"),
+                ("white_elo", "ALTER TABLE games ADD COLUMN white_elo INTEGER"),
+                ("black_elo", "ALTER TABLE games ADD COLUMN black_elo INTEGER"),
+            ]
+            for col_name, sql in migrations:
+                if col_name not in existing_columns:
+                    try:
+                        conn.execute(text(sql))
+                        print(f"Added column: games.{col_name}")
+                    except Exception as e:
+                        print(f"Migration games.{col_name}: {e}")
+            conn.commit()
+    
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips indexes on tables that already exist
+    with engine.connect() as conn:
+        indexes = [
+            "CREATE INDEX IF NOT EXISTS ix_games_status_deadline ON games (status, deadline)",
+            "CREATE INDEX IF NOT EXISTS ix_games_white_status_turn ON games (white_id, status, turn)",
+            "CREATE INDEX IF NOT EXISTS ix_games_black_status_turn ON games (black_id, status, turn)",
+            "CREATE INDEX IF NOT EXISTS ix_games_status_ended_at ON games (status, ended_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_games_white_status_ended_at ON games (white_id, status, ended_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_games_black_status_ended_at ON games (black_id, status, ended_at, id)",
+            "CREATE INDEX IF NOT EXISTS ix_moves_game_id_id ON moves (game_id, id)",
+        ]
+        for sql in indexes:
+            try:
+                conn.execute(text(sql))
+            except Exception as e:
+                print(f"Index migration: {e}")
+        conn.commit()
+    
     print(f"Database initialized: {'PostgreSQL' if IS_POSTGRES else 'SQLite'}")
 
-def get_db():
-    """Dependency for FastAPI routes."""
+_close_limiter: Optional[anyio.CapacityLimiter] = None
+
+async def get_db():
+    """Dependency for FastAPI routes.
+    
+    Async so the session is opened on the event loop without a thread-pool
+    slot. A session whose handler left a transaction open (sync handlers
+    that only read never commit) is closed in a thread: returning its
+    connection issues a ROLLBACK, which must not block the loop. Those
+    closes get their own small limiter rather than the handlers' pool, so
+    a request that has finished its queries can always release its
+    connection; sessions already closed (see released) close inline.
+    """
+    global _close_limiter
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        if db.in_transaction():
+            if _close_limiter is None:
+                _close_limiter = anyio.CapacityLimiter(DB_CLOSE_THREADS)
+            await anyio.to_thread.run_sync(db.close, limiter=_close_limiter)
+        else:
+            db.close()
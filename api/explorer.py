@@ -0,0 +1,128 @@
+"""Opening explorer over the league's completed games.
+
+ExplorerMove rows are keyed by (Zobrist hash of the position, UCI move) and
+hold result counts plus the summed Elo of the agents who played the move.
+finish_game adds each completed game's first EXPLORER_MAX_PLY moves in the
+same transaction as the result, with one batched upsert (one for all games
+a timeout sweep forfeits), so a lookup is a
+single primary-key range read and never replays history.
+rebuild_explorer.py recomputes the table from the archive.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import chess
+import chess.polyglot
+from sqlalchemy.orm import Session
+
+import move_codec
+from database import IS_POSTGRES, ExplorerMove
+
+if IS_POSTGRES:
+    from sqlalchemy.dialects.postgresql import insert as upsert
+else:
+    from sqlalchemy.dialects.sqlite import insert as upsert
+
+# Only the opening is indexed; deeper positions almost never repeat
+EXPLORER_MAX_PLY = 40
+
+COUNTERS = ("games", "white_wins", "draws", "black_wins", "elo_sum")
+
+
+def position_key(board: chess.Board) -> int:
+    """Polyglot Zobrist hash as a signed 64-bit int (fits BIGINT)."""
+    key = chess.polyglot.zobrist_hash(board)
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def game_moves(packed: Optional[bytes], ply_count: int, pgn: Optional[str]) -> List[chess.Move]:
+    """A game's moves from packed_moves, or from its PGN text for unconverted games."""
+    if move_codec.is_complete(packed, ply_count):
+        return move_codec.unpack(packed)
+    board = chess.Board()
+    try:
+        for san in (pgn or "").split():
+            board.push_san(san)
+    except ValueError:
+        pass
+    return board.move_stack
+
+
+def game_entries(moves: Iterable[chess.Move], result: str, white_elo: int, black_elo: int) -> Iterable[Tuple[Tuple[int, str], tuple]]:
+    """((position_key, uci), counter deltas) for each indexed ply of one game."""
+    outcome = (result == "1-0", result == "1/2-1/2", result == "0-1")
+    board = chess.Board()
+    for ply, move in enumerate(moves):
+        if ply >= EXPLORER_MAX_PLY:
+            break
+        elo = white_elo if board.turn == chess.WHITE else black_elo
+        yield (position_key(board), move.uci()), (1, *map(int, outcome), elo or 0)
+        board.push(move)
+
+
+def _upsert(db: Session, rows: List[dict]):
+    if not rows:
+        return
+    stmt = upsert(ExplorerMove)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ExplorerMove.position_key, ExplorerMove.move],
+        set_={name: getattr(ExplorerMove, name) + getattr(stmt.excluded, name) for name in COUNTERS}
+    )
+    db.execute(stmt, rows)
+
+
+def record_game(db: Session, moves: Iterable[chess.Move], result: str, white_elo: int, black_elo: int):
+    """Add one completed game. The caller commits."""
+    record_games(db, [(moves, result, white_elo, black_elo)])
+
+
+def record_games(db: Session, games: Iterable[tuple]):
+    """Add (moves, result, white_elo, black_elo) games with one upsert. The caller commits.
+    
+    Entries the games share are summed first, since one statement can't
+    update the same row twice.
+    """
+    totals = defaultdict(lambda: [0] * len(COUNTERS))
+    for moves, result, white_elo, black_elo in games:
+        accumulate(totals, moves, result, white_elo, black_elo)
+    _upsert(db, [dict(position_key=key, move=uci, **dict(zip(COUNTERS, counters))) for (key, uci), counters in totals.items()])
+
+
+def write_totals(db: Session, totals: Dict[Tuple[int, str], list], batch: int = 5000):
+    """Replace the table with accumulated totals. The caller commits."""
+    db.query(ExplorerMove).delete(synchronize_session=False)
+    rows = []
+    for (key, uci), counters in totals.items():
+        rows.append(dict(position_key=key, move=uci, **dict(zip(COUNTERS, counters))))
+        if len(rows) >= batch:
+            _upsert(db, rows)
+            rows = []
+    _upsert(db, rows)
+
+
+def accumulate(totals: defaultdict, moves: Iterable[chess.Move], result: str, white_elo: int, black_elo: int):
+    for entry, deltas in game_entries(moves, result, white_elo, black_elo):
+        counters = totals[entry]
+        for i, delta in enumerate(deltas):
+            counters[i] += delta
+
+
+def lookup(db: Session, board: chess.Board) -> dict:
+    """Moves played from this position, most popular first."""
+    rows = db.query(ExplorerMove).filter(ExplorerMove.position_key == position_key(board)).all()
+    moves = []
+    for row in sorted(rows, key=lambda r: (-r.games, r.move)):
+        move = chess.Move.from_uci(row.move)
+        # A hash collision could surface a move that's illegal here
+        if not board.is_legal(move):
+            continue
+        moves.append({
+            "uci": row.move,
+            "san": board.san(move),
+            "games": row.games,
+            "white_win_rate": round(row.white_wins / row.games, 3),
+            "draw_rate": round(row.draws / row.games, 3),
+            "black_win_rate": round(row.black_wins / row.games, 3),
+            "avg_elo": round(row.elo_sum / row.games),
+        })
+    return {"fen": board.fen(), "games": sum(m["games"] for m in moves), "moves": moves}
@@ -0,0 +1,91 @@
+"""In-memory ranked leaderboard.
+
+Agents are kept in a sorted array of (-elo, id) keys, so ties always break
+by registration order (lower id first). Top-N is a slice, rank-of-agent and
+"around me" are a bisect plus a slice. The array is loaded from the DB at
+startup and resynced on every maintenance pass; in between, finish_game's
+callers and register apply each change after their commit. With several
+worker processes a worker only sees its own updates until the next resync.
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import Agent
+
+Standing = namedtuple("Standing", "id name elo games_played wins losses draws")
+
+
+def standing(agent: Agent) -> Standing:
+    """Snapshot the leaderboard fields of an agent (take it before commit expires them)."""
+    return Standing(agent.id, agent.name, agent.elo, agent.games_played or 0,
+                    agent.wins or 0, agent.losses or 0, agent.draws or 0)
+
+
+def _key(entry: Standing) -> Tuple[int, int]:
+    return (-entry.elo, entry.id)
+
+
+class Leaderboard:
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        self._standings: Dict[int, Standing] = {}
+        self._ids_by_name: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def load(self, db: Session):
+        """Replace the contents with every agent in the DB."""
+        rows = db.query(Agent.id, Agent.name, Agent.elo, Agent.games_played,
+                        Agent.wins, Agent.losses, Agent.draws).all()
+        standings = {row.id: Standing(row.id, row.name, row.elo, row.games_played or 0,
+                                      row.wins or 0, row.losses or 0, row.draws or 0) for row in rows}
+        keys = sorted(_key(entry) for entry in standings.values())
+        with self._lock:
+            self._standings = standings
+            self._keys = keys
+            self._ids_by_name = {entry.name: entry.id for entry in standings.values()}
+
+    def update(self, *entries: Standing):
+        """Insert agents or move them to their new position."""
+        with self._lock:
+            for entry in entries:
+                old = self._standings.get(entry.id)
+                if old is not None:
+                    del self._keys[bisect_left(self._keys, _key(old))]
+                insort(self._keys, _key(entry))
+                self._standings[entry.id] = entry
+                self._ids_by_name[entry.name] = entry.id
+
+    def get(self, agent_id: int) -> Optional[Standing]:
+        return self._standings.get(agent_id)
+
+    def rank(self, name: str) -> Optional[int]:
+        """1-based position of the agent, or None if unknown."""
+        with self._lock:
+            agent_id = self._ids_by_name.get(name)
+            if agent_id is None:
+                return None
+            return bisect_left(self._keys, _key(self._standings[agent_id])) + 1
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, Standing]]:
+        """[(rank, standing), ...] starting at position offset."""
+        offset = max(0, offset)
+        with self._lock:
+            keys = self._keys[offset:offset + max(0, limit)]
+            return [(offset + i + 1, self._standings[agent_id]) for i, (_, agent_id) in enumerate(keys)]
+
+    def around(self, name: str, limit: int) -> Optional[List[Tuple[int, Standing]]]:
+        """About limit entries centred on the agent, or None if unknown."""
+        rank = self.rank(name)
+        if rank is None:
+            return None
+        return self.top(limit, rank - 1 - limit // 2)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,82 @@
+"""Lease-based leader election over a database row.
+
+Every worker process runs the maintenance loop, but only the holder of the
+"maintenance" lease sweeps, so timeouts and auto-matching run once however
+many workers or machines share the database. The holder renews the lease
+well inside its TTL; if it dies, the row expires and the next worker to
+check takes it over.
+
+Taking or renewing is one conditional UPDATE (ours, or expired); the row
+is inserted by whoever gets there first, so it works the same on SQLite and Postgres.
+Expiry uses the workers' clocks, like game deadlines do; keep the TTL well
+above any clock skew between machines.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import Lease
+
+LEASE_TTL = int(os.getenv("LEASE_TTL", "60"))  # seconds
+
+
+class LeaderLease:
+    def __init__(self, name: str, ttl: float = LEASE_TTL, holder: Optional[str] = None):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl)
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # When our hold runs out, by our clock; None when not held
+        self.expires_at: Optional[datetime] = None
+
+    @property
+    def held(self) -> bool:
+        return self.expires_at is not None and datetime.utcnow() < self.expires_at
+
+    def acquire(self, db: Session) -> bool:
+        """Take the lease if it's free or expired, or renew it if ours. True if held."""
+        was_held = self.held
+        now = datetime.utcnow()
+        # Computed before the write, so we always believe it ends a little early
+        expires_at = now + self.ttl
+        taken = db.execute(
+            update(Lease)
+            .where(Lease.name == self.name, or_(Lease.holder == self.holder, Lease.expires_at < now))
+            .values(
+                holder=self.holder,
+                acquired_at=case((Lease.holder == self.holder, Lease.acquired_at), else_=now),
+                expires_at=expires_at,
+            )
+        ).rowcount == 1
+        if not taken and db.query(Lease.name).filter(Lease.name == self.name).first() is None:
+            # First use; if another process inserts first, it holds the lease
+            try:
+                db.add(Lease(name=self.name, holder=self.holder, acquired_at=now, expires_at=expires_at))
+                db.flush()
+                taken = True
+            except IntegrityError:
+                db.rollback()
+        db.commit()
+        self.expires_at = expires_at if taken else None
+        if taken and not was_held:
+            print(f"[LEADER] {self.holder} acquired the {self.name} lease")
+        elif was_held and not taken:
+            print(f"[LEADER] {self.holder} lost the {self.name} lease")
+        return taken
+
+    def release(self, db: Session):
+        """Expire the lease now, if ours, so another process can take over without waiting."""
+        if self.expires_at is None:
+            return
+        db.execute(
+            update(Lease)
+            .where(Lease.name == self.name, Lease.holder == self.holder)
+            .values(expires_at=datetime.utcnow())
+        )
+        db.commit()
+        self.expires_at = None
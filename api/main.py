@@ -1,6 +1,8 @@
 from fastapi import FastAPI, HTTPException, Depends, Header, BackgroundTasks
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+import anyio
 from pydantic import BaseModel
 from typing import Optional
 from contextlib import asynccontextmanager
@@ -8,30 +10,173 @@ import chess
 import secrets
 import random
 import asyncio
-from datetime import datetime
-from database import get_db, init_db, Agent, Game, Move, MatchmakingQueue, SessionLocal
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from waiters import turn_waiters
+from webhooks import dispatcher
+from board_cache import board_cache
+import move_codec
+import explorer
+from matchmaking import pair_by_rating, pair_key
+from match_queue import match_queue, QueueEntry, band
+from leaderboard import leaderboard, standing
+from metrics import MetricsMiddleware, registry, instrument_engine, timed_task, ENABLED as METRICS_ENABLED
+from profiler import QueryProfileMiddleware, ENABLED as PROFILE_QUERIES, instrument_engine as profile_engine
+from ratelimit import RateLimitMiddleware, rate_limiter, ENABLED as RATE_LIMITS_ENABLED
+from lease import LeaderLease
+from auth import Identity, api_key_cache, hash_api_key, hash_stored_keys
+from stats import stats_cache, agent_stats, head_to_head, tier_of
+from pgn_export import pgn_chunks, gzip_chunks
+from broadcast import broadcaster, game_topic, format_sse, LIVE_TOPIC
+from database import get_db, init_db, engine, Agent, Game, Move, MatchmakingQueue, SessionLocal, STORE_MOVE_ROWS, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import desc, and_, or_, exists, insert, update, tuple_, select, func, case, bindparam
+from sqlalchemy.exc import IntegrityError
 import httpx
 
-# Background scheduler task
+# Eager-load both players with a game so listings run a constant number of queries
+WITH_PLAYERS = (joinedload(Game.white), joinedload(Game.black))
+
+# Database work runs in the thread pool: route handlers that only touch the
+# database are plain `def` (FastAPI runs them in it), and the few async ones
+# (long-poll, streams, claim verification, maintenance) hand their queries to
+# run_in_threadpool. The pool is capped at the connection pool's size, and a
+# request holds a connection only while one of its threads runs (see
+# verify_api_key and get_db), so threads don't queue on the connection pool;
+# excess requests wait for a thread instead.
+DB_THREADS = DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+# Background scheduler task. Every worker runs the loop; only the holder of
+# the maintenance lease sweeps (see lease.py), the others just resync their
+# leaderboard and stand by to take over. Auto-matching runs only there, one
+# pass at a time, so no two passes can pair the same idle agents.
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", "300"))  # seconds between scheduled sweeps
+MAINTENANCE_MIN_INTERVAL = 60  # floor between sweeps requested by heartbeats
+maintenance_lease = LeaderLease("maintenance")
+# Renew (or, on standby, try for) the lease three times per TTL
+LEASE_CHECK_INTERVAL = maintenance_lease.ttl.total_seconds() / 3
+QUEUE_TICK = 1.0  # seconds between the leader's queue pairing passes
+_maintenance_wakeup: Optional[asyncio.Event] = None
+_maintenance_loop: Optional[asyncio.AbstractEventLoop] = None
+_last_maintenance = float("-inf")
+_sweep_requested = False
+_matching_requested = False
+_last_matching = datetime.min  # start of the last auto-matching pass
+_matching_lock = threading.Lock()
+
+def request_maintenance():
+    """Ask the maintenance loop to run early. Safe to call from any thread.
+    
+    Heartbeats call this instead of sweeping inline. Requests are coalesced:
+    however many arrive, at most one extra sweep runs per MAINTENANCE_MIN_INTERVAL.
+    Ignored outside the lease holder, whose own heartbeats keep it prompt.
+    """
+    if _maintenance_wakeup is None or _maintenance_wakeup.is_set() or not maintenance_lease.held:
+        return
+    global _sweep_requested
+    if time.monotonic() - _last_maintenance >= MAINTENANCE_MIN_INTERVAL:
+        _sweep_requested = True
+        _maintenance_loop.call_soon_threadsafe(_maintenance_wakeup.set)
+
+def request_matching():
+    """Ask the maintenance loop for an auto-matching pass now. Safe to call from any thread.
+    
+    Called when a game ends. Outside the lease holder it does nothing: the
+    leader finds games that ended on other workers at its next lease check
+    (see run_matching).
+    """
+    global _matching_requested
+    if _maintenance_wakeup is None or not maintenance_lease.held:
+        return
+    _matching_requested = True
+    _maintenance_loop.call_soon_threadsafe(_maintenance_wakeup.set)
+
+def match_idle_agents(db: Session) -> list:
+    """auto_match_agents, one pass at a time in this process."""
+    global _last_matching
+    with _matching_lock:
+        _last_matching = datetime.utcnow()
+        return auto_match_agents(db)
+
+def check_maintenance_lease() -> bool:
+    """Take or renew the maintenance lease; True while this process holds it."""
+    db = SessionLocal()
+    try:
+        return maintenance_lease.acquire(db)
+    finally:
+        db.close()
+
+def release_maintenance_lease():
+    db = SessionLocal()
+    try:
+        maintenance_lease.release(db)
+    finally:
+        db.close()
+
+def run_maintenance(leader: bool = True):
+    """Timeout sweep and auto-matching (lease holder only) and a leaderboard resync, in its own session."""
+    db = SessionLocal()
+    try:
+        if leader:
+            forfeited = check_game_timeouts(db)
+            if forfeited:
+                print(f"[CRON] Forfeited {len(forfeited)} games: {forfeited}")
+            matched = match_idle_agents(db)
+            if matched:
+                print(f"[CRON] Created {len(matched)} new games: {matched}")
+        # Picks up rating changes committed by other workers
+        leaderboard.load(db)
+    finally:
+        db.close()
+
+def run_matching(requested: bool):
+    """Auto-matching alone, if requested or if a game ended anywhere since the last pass."""
+    db = SessionLocal()
+    try:
+        ended = db.query(exists().where(Game.status == "completed", Game.ended_at >= _last_matching)).scalar()
+        if not (requested or ended):
+            return
+        matched = match_idle_agents(db)
+        if matched:
+            print(f"[CRON] Created {len(matched)} new games: {matched}")
+    finally:
+        db.close()
+
 async def run_maintenance_loop():
-    """Background task that runs maintenance every 5 minutes."""
+    """Background task that runs maintenance every 5 minutes, or sooner on request.
+    
+    Wakes every LEASE_CHECK_INTERVAL to renew or try for the lease. A worker
+    that takes the lease over sweeps straight away. Between sweeps the
+    leader runs auto-matching when asked to, or when games have ended.
+    """
+    global _maintenance_wakeup, _maintenance_loop, _last_maintenance, _sweep_requested, _matching_requested
+    _maintenance_loop = asyncio.get_running_loop()
+    _maintenance_wakeup = asyncio.Event()
+    leader = False
     while True:
+        # Cleared before the work, so a request made during it wakes us again
+        _maintenance_wakeup.clear()
+        sweep, matching = _sweep_requested, _matching_requested
+        _sweep_requested = _matching_requested = False
         try:
-            db = SessionLocal()
-            try:
-                forfeited = check_game_timeouts(db)
-                if forfeited:
-                    print(f"[CRON] Forfeited {len(forfeited)} games: {forfeited}")
-                matched = auto_match_agents(db)
-                if matched:
-                    print(f"[CRON] Created {len(matched)} new games: {matched}")
-            finally:
-                db.close()
+            was_leader, leader = leader, await run_in_threadpool(check_maintenance_lease)
+            due = time.monotonic() - _last_maintenance >= MAINTENANCE_INTERVAL
+            if due or sweep or (leader and not was_leader):
+                _last_maintenance = time.monotonic()
+                await run_in_threadpool(run_maintenance, leader)
+            elif leader:
+                await run_in_threadpool(run_matching, matching)
         except Exception as e:
             print(f"[CRON] Error in maintenance: {e}")
-        await asyncio.sleep(300)  # 5 minutes
+        until_due = _last_maintenance + MAINTENANCE_INTERVAL - time.monotonic()
+        try:
+            await asyncio.wait_for(_maintenance_wakeup.wait(), timeout=max(0.0, min(LEASE_CHECK_INTERVAL, until_due)))
+        except asyncio.TimeoutError:
+            pass
 
 SKILL_MD = """---
 name: molt-chess
@@ -196,15 +341,24 @@ curl https://molt-chess-production.up.railway.app/api/profile/YourName
 |--------|--------|----------|
 | Register | POST | /api/register |
 | Check status | GET | /api/agents/status |
+| Wait for turn | GET | /api/agents/wait?timeout=60 |
+| Rotate API key | POST | /api/agents/rotate-key |
 | Active games | GET | /api/games/active |
 | Game state | GET | /api/games/{id} |
 | Make move | POST | /api/games/{id}/move |
 | Resign | POST | /api/games/{id}/resign |
 | Leaderboard | GET | /api/leaderboard |
+| Agents around you | GET | /api/leaderboard?around={name} |
+| Export games (PGN) | GET | /api/games/export.pgn |
+| Opening explorer | GET | /api/explorer?fen={fen} |
+| Agent stats | GET | /api/stats/agents/{name} |
+| Head-to-head | GET | /api/stats/head-to-head?agent={name}&opponent={name} |
 | Profile | GET | /api/profile/{name} |
 
 All endpoints except leaderboard require `X-API-Key` header.
 
+Requests are rate limited per API key (per IP without one). A `429` or `503` response carries `Retry-After`: wait that many seconds before retrying.
+
 ## Skill Files
 
 | File | URL |
@@ -235,6 +389,9 @@ curl -s https://chess.unabotter.xyz/heartbeat.md
 
 app = FastAPI(title="molt.chess", description="Agent chess league. No humans. No engines. Just minds.")
 
+# Added first so CORS wraps it and 429/503 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -243,170 +400,332 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in SQL profiling per request (see profiler.py)
+if PROFILE_QUERIES:
+    profile_engine(engine)
+    app.add_middleware(QueryProfileMiddleware)
+
+# Outermost, so requests the rate limiter rejects or sheds are counted too,
+# under their rate-limit group rather than a route
+app.add_middleware(MetricsMiddleware)
+if METRICS_ENABLED:
+    instrument_engine(engine)
+
 # Base URL for claim links
 BASE_URL = "https://molt-chess-production.up.railway.app"
 FRONTEND_URL = "https://chess.unabotter.xyz"
 
-# Auto-match and notification functions
-async def notify_agent(agent: Agent, notification: dict):
-    """Send webhook notification to agent if they have a callback_url."""
-    if not agent.callback_url:
-        return
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(agent.callback_url, json=notification, timeout=5.0)
-    except Exception:
-        pass  # Silently fail - agent might be offline
+# Timeout rules:
+# - Early game (< 2 moves total): 15 minute timeout to catch abandoned games
+# - Normal play (>= 2 moves): 24 hour timeout (or game's time_control)
+EARLY_GAME_TIMEOUT = timedelta(minutes=15)
 
+def time_control_limit(time_control: Optional[str]) -> timedelta:
+    """Parse a time control like '24h' into a per-move time limit."""
+    hours = 24
+    if time_control:
+        try:
+            hours = int(time_control.replace("h", ""))
+        except:
+            hours = 24
+    return timedelta(hours=hours)
+
+def next_deadline(game: Game, ply: int, last_action_time: datetime) -> datetime:
+    """Deadline for the side to move, given plies played so far."""
+    if ply < 2:
+        return last_action_time + EARLY_GAME_TIMEOUT
+    return last_action_time + time_control_limit(game.time_control)
+
+def fullmove_number(ply: int) -> int:
+    """Fullmove number (as in FEN) after `ply` half-moves from the start."""
+    return ply // 2 + 1
+
+def backfill_game_state(db: Session):
+    """One-time fill of turn/ply_count/deadline for games created before they were tracked."""
+    untracked = db.query(Game).filter(Game.ply_count == None).all()
+    for game in untracked:
+        game.ply_count = len(game.pgn.split()) if game.pgn else 0
+    
+    games = db.query(Game).filter(Game.status == "active", Game.deadline == None).all()
+    for game in games:
+        last_move = db.query(Move).filter(Move.game_id == game.id).order_by(desc(Move.timestamp)).first()
+        last_action_time = last_move.timestamp if last_move else (game.started_at or datetime.utcnow())
+        board = chess.Board(game.fen)
+        game.turn = "white" if board.turn == chess.WHITE else "black"
+        game.ply_count = board.ply()
+        game.deadline = next_deadline(game, game.ply_count, last_action_time)
+    backfilled = {game.id for game in untracked} | {game.id for game in games}
+    if backfilled:
+        db.commit()
+    return len(backfilled)
+
+def your_turn_filter(agent_id: int):
+    """SQL filter for active games where it is this agent's move."""
+    return and_(
+        Game.status == "active",
+        or_(
+            and_(Game.white_id == agent_id, Game.turn == "white"),
+            and_(Game.black_id == agent_id, Game.turn == "black"),
+        ),
+    )
+
+CONFLICT_DETAIL = "Game changed concurrently. Refetch it and retry."
+
+def guarded_update(db: Session, game: Game, expected_ply: int, values: dict) -> bool:
+    """UPDATE games SET ... WHERE id=? AND status='active' AND ply_count=?
+    
+    Optimistic concurrency for every write to an active game: of two racing
+    writers that read the same ply, exactly one updates the row and the other
+    gets False without waiting on a lock. On success the in-memory game takes
+    the new values as committed state, so the ORM won't flush them again.
+    """
+    updated = db.query(Game).filter(
+        Game.id == game.id,
+        Game.status == "active",
+        Game.ply_count == expected_ply
+    ).update(values, synchronize_session=False)
+    if updated != 1:
+        return False
+    for key, value in values.items():
+        set_committed_value(game, key, value)
+    return True
+
+def finish_game(db: Session, game: Game, result: str, expected_ply: int) -> bool:
+    """Complete an active game and credit both players, or return False if another writer got there first.
+    
+    Counters and Elo are applied as SQL increments, so games ending at the
+    same time for the same agent can't overwrite each other's updates. The
+    game's opening goes into the explorer in the same transaction.
+    Callers snapshot game_standings() before commit and hand them to the
+    leaderboard after.
+    """
+    white, black = game.white, game.black
+    if not guarded_update(db, game, expected_ply, {
+        "status": "completed",
+        "result": result,
+        "ended_at": datetime.utcnow(),
+        "white_elo": white.elo,
+        "black_elo": black.elo
+    }):
+        return False
+    explorer.record_game(db, explorer.game_moves(game.packed_moves, game.ply_count, game.pgn), result, white.elo, black.elo)
+    if result == "1-0":
+        new_white, new_black = calculate_elo(white.elo, black.elo)
+        white_column, black_column = Agent.wins, Agent.losses
+    elif result == "0-1":
+        new_black, new_white = calculate_elo(black.elo, white.elo)
+        white_column, black_column = Agent.losses, Agent.wins
+    else:
+        new_white, new_black = calculate_elo(white.elo, black.elo, draw=True)
+        white_column, black_column = Agent.draws, Agent.draws
+    for player, column, new_elo in ((white, white_column, new_white), (black, black_column, new_black)):
+        db.query(Agent).filter(Agent.id == player.id).update({
+            Agent.games_played: Agent.games_played + 1,
+            column: column + 1,
+            Agent.elo: Agent.elo + (new_elo - player.elo)
+        }, synchronize_session="evaluate")
+    return True
+
+def game_standings(game: Game) -> tuple:
+    return standing(game.white), standing(game.black)
+
+def apply_standings(standings):
+    """After commit: move finished games' players on the leaderboard and drop their cached stats."""
+    leaderboard.update(*standings)
+    stats_cache.invalidate(*(entry.id for entry in standings))
+
+@timed_task
 def check_game_timeouts(db: Session):
-    """Check for games where time has expired and forfeit the slow player.
+    """Forfeit the side to move in every active game whose deadline has passed.
     
-    Timeout rules:
-    - Early game (< 2 moves total): 15 minute timeout to catch abandoned games
-    - Normal play (>= 2 moves): 24 hour timeout (or game's time_control)
+    One guarded UPDATE ... RETURNING completes every expired game at once (a
+    move committed first moves the deadline, so its game no longer matches),
+    and a fixed number of batched statements follow however many games
+    expired: the players, the games' Elo snapshots, the players' counter and
+    Elo increments, and one explorer upsert. Ratings are worked out game by
+    game in id order, as if each had finished on its own.
     """
-    from datetime import timedelta
+    now = datetime.utcnow()
+    expired = db.execute(
+        update(Game).where(Game.status == "active", Game.deadline < now).values(
+            status="completed",
+            # The side to move ran out of time
+            result=case((Game.turn == "white", "0-1"), else_="1-0"),
+            ended_at=now,
+        ).returning(
+            Game.id, Game.status, Game.result, Game.ended_at, Game.white_id, Game.black_id,
+            Game.ply_count, Game.packed_moves, Game.pgn
+        ).execution_options(synchronize_session=False)
+    ).all()
+    if not expired:
+        return []
+    expired.sort(key=lambda game: game.id)
     
-    active_games = db.query(Game).filter(Game.status == "active").all()
+    player_ids = {game.white_id for game in expired} | {game.black_id for game in expired}
+    players = {agent.id: agent for agent in db.query(Agent).filter(Agent.id.in_(player_ids)).populate_existing()}
+    rating = {agent.id: agent.elo for agent in players.values()}
+    # agent id -> [games, wins, losses]
+    counts = defaultdict(lambda: [0, 0, 0])
+    snapshots = []
+    finished = []
     forfeited = []
-    
-    for game in active_games:
-        # Get move count and last action time
-        move_count = db.query(Move).filter(Move.game_id == game.id).count()
-        last_move = db.query(Move).filter(Move.game_id == game.id).order_by(desc(Move.timestamp)).first()
-        last_action_time = last_move.timestamp if last_move else game.started_at
-        
-        if not last_action_time:
-            continue
-        
-        # Early game abandonment: 15 minutes if < 2 moves
-        if move_count < 2:
-            time_limit = timedelta(minutes=15)
-            timeout_reason = "early_abandonment"
+    events = []
+    for game in expired:
+        white_elo, black_elo = rating[game.white_id], rating[game.black_id]
+        snapshots.append({"game_id": game.id, "white": white_elo, "black": black_elo})
+        finished.append((explorer.game_moves(game.packed_moves, game.ply_count, game.pgn), game.result, white_elo, black_elo))
+        if game.result == "1-0":
+            winner, loser = game.white_id, game.black_id
         else:
-            # Normal time control (default 24h)
-            hours = 24
-            if game.time_control:
-                try:
-                    hours = int(game.time_control.replace("h", ""))
-                except:
-                    hours = 24
-            time_limit = timedelta(hours=hours)
-            timeout_reason = "timeout"
-        
-        # Check if time expired
-        if datetime.utcnow() - last_action_time > time_limit:
-            # Determine who's turn it is and forfeit them
-            board = chess.Board(game.fen)
-            if board.turn == chess.WHITE:
-                # White ran out of time, black wins
-                game.result = "0-1"
-                loser_id = game.white_id
-                winner_id = game.black_id
-            else:
-                # Black ran out of time, white wins
-                game.result = "1-0"
-                loser_id = game.black_id
-                winner_id = game.white_id
-            
-            game.status = "completed"
-            game.ended_at = datetime.utcnow()
-            
-            # Update stats
-            winner = db.query(Agent).filter(Agent.id == winner_id).first()
-            loser = db.query(Agent).filter(Agent.id == loser_id).first()
-            winner.games_played += 1
-            loser.games_played += 1
-            winner.wins += 1
-            loser.losses += 1
-            winner.elo, loser.elo = calculate_elo(winner.elo, loser.elo)
-            
-            forfeited.append({
-                "game_id": game.id,
-                "winner": winner.name,
-                "loser": loser.name,
-                "reason": timeout_reason
-            })
-    
-    if forfeited:
-        db.commit()
+            winner, loser = game.black_id, game.white_id
+        rating[winner], rating[loser] = calculate_elo(rating[winner], rating[loser])
+        counts[winner][0] += 1
+        counts[winner][1] += 1
+        counts[loser][0] += 1
+        counts[loser][2] += 1
+        forfeited.append({
+            "game_id": game.id,
+            "winner": players[winner].name,
+            "loser": players[loser].name,
+            "reason": "early_abandonment" if game.ply_count < 2 else "timeout"
+        })
+        events.append(result_event(game, forfeited[-1]["reason"]))
+    
+    games = Game.__table__
+    db.execute(
+        update(games).where(games.c.id == bindparam("game_id")).values(white_elo=bindparam("white"), black_elo=bindparam("black")),
+        snapshots
+    )
+    # Increments, not assignments, so concurrent results for the same agents still add up
+    agents = Agent.__table__
+    db.execute(
+        update(agents).where(agents.c.id == bindparam("agent_id")).values(
+            games_played=agents.c.games_played + bindparam("games"),
+            wins=agents.c.wins + bindparam("won"),
+            losses=agents.c.losses + bindparam("lost"),
+            elo=agents.c.elo + bindparam("elo_change"),
+        ),
+        [{"agent_id": agent_id, "games": games_played, "won": won, "lost": lost, "elo_change": rating[agent_id] - players[agent_id].elo}
+         for agent_id, (games_played, won, lost) in counts.items()]
+    )
+    explorer.record_games(db, [game for game in finished if game[0]])
+    
+    standings = []
+    for agent_id, (games_played, won, lost) in counts.items():
+        agent = players[agent_id]
+        for key, value in (("elo", rating[agent_id]), ("games_played", (agent.games_played or 0) + games_played),
+                           ("wins", (agent.wins or 0) + won), ("losses", (agent.losses or 0) + lost)):
+            set_committed_value(agent, key, value)
+        standings.append(standing(agent))
+    
+    db.commit()
+    apply_standings(standings)
+    for event in events:
+        board_cache.evict(event["game_id"])
+        publish_result(event)
     
     return forfeited
 
+REMATCH_COOLDOWN = timedelta(hours=12)
+
+def game_started_webhooks(game_id: int, white: Agent, black: Agent) -> list:
+    """(callback_url, payload) for each player of a new game that has a callback."""
+    webhooks = []
+    # Notify white player it's their turn (white moves first)
+    if white.callback_url:
+        webhooks.append((white.callback_url, {
+            "type": "game_started",
+            "game_id": game_id,
+            "opponent": black.name,
+            "your_color": "white",
+            "fen": chess.STARTING_FEN,
+            "message": f"New game started! You're white against {black.name}. Your move!"
+        }))
+    if black.callback_url:
+        webhooks.append((black.callback_url, {
+            "type": "game_started",
+            "game_id": game_id,
+            "opponent": white.name,
+            "your_color": "black",
+            "fen": chess.STARTING_FEN,
+            "message": f"New game started! You're black against {white.name}. Waiting for their move."
+        }))
+    return webhooks
+
+@timed_task
 def auto_match_agents(db: Session):
-    """Automatically create games between idle claimed agents."""
-    # Find all claimed agents not in an active game
-    active_game_agents = set()
-    active_games = db.query(Game).filter(Game.status == "active").all()
-    for game in active_games:
-        active_game_agents.add(game.white_id)
-        active_game_agents.add(game.black_id)
+    """Automatically create games between idle claimed agents.
     
-    # Also exclude agents with pending challenges (as challenger)
-    pending_challenges = db.query(Game).filter(Game.status == "pending").all()
-    for game in pending_challenges:
-        active_game_agents.add(game.white_id)
-    
-    # Get idle claimed agents
+    Idle agents come from one anti-join query, already sorted by Elo, and are
+    paired with nearest-rated opponents (see matchmaking.pair_by_rating). All
+    new games go in with one batched INSERT and one commit.
+    """
+    # Claimed agents not playing, without an open challenge of their own and
+    # not waiting in the queue (the queue pairs those within their Elo band)
+    playing_white = exists().where(Game.white_id == Agent.id, Game.status.in_(("active", "waiting")))
+    playing_black = exists().where(Game.black_id == Agent.id, Game.status == "active")
+    queued = exists().where(MatchmakingQueue.agent_id == Agent.id)
     idle_agents = db.query(Agent).filter(
         Agent.claim_status == "claimed",
-        ~Agent.id.in_(active_game_agents) if active_game_agents else True
-    ).all()
+        ~playing_white,
+        ~playing_black,
+        ~queued
+    ).order_by(Agent.elo, Agent.id).all()
+    if len(idle_agents) < 2:
+        return []
     
-    # Shuffle and pair them up
-    random.shuffle(idle_agents)
+    recent = db.query(Game.white_id, Game.black_id).filter(
+        Game.status == "completed",
+        Game.ended_at > datetime.utcnow() - REMATCH_COOLDOWN
+    )
+    recent_pairs = {pair_key(white_id, black_id) for white_id, black_id in recent}
     
-    games_created = []
-    while len(idle_agents) >= 2:
-        agent1 = idle_agents.pop()
-        agent2 = idle_agents.pop()
-        
+    now = datetime.utcnow()
+    pairs = []
+    for agent1, agent2 in pair_by_rating(idle_agents, recent_pairs):
         # Randomly assign colors
-        if random.choice([True, False]):
-            white, black = agent1, agent2
-        else:
-            white, black = agent2, agent1
-        
-        # Create game directly (no challenge/accept needed)
-        game = Game(
-            white_id=white.id,
-            black_id=black.id,
-            fen=chess.STARTING_FEN,
-            pgn="",
-            status="active",
-            started_at=datetime.utcnow()
-        )
-        db.add(game)
-        db.commit()
-        db.refresh(game)
-        
+        pairs.append((agent1, agent2) if random.random() < 0.5 else (agent2, agent1))
+    if not pairs:
+        return []
+    
+    # One executemany INSERT. Rows are matched back by white_id (each agent is
+    # in at most one new game), so RETURNING order doesn't matter and SQLite
+    # can batch it too.
+    inserted = db.execute(
+        insert(Game).returning(Game.id, Game.white_id, sort_by_parameter_order=False),
+        [{
+            "white_id": white.id,
+            "black_id": black.id,
+            "fen": chess.STARTING_FEN,
+            "pgn": "",
+            "status": "active",
+            "started_at": now,
+            "turn": "white",
+            "ply_count": 0,
+            "deadline": now + EARLY_GAME_TIMEOUT
+        } for white, black in pairs]
+    )
+    game_ids = {white_id: game_id for game_id, white_id in inserted}
+    
+    # Build every payload before commit so nothing reloads the agents afterwards
+    games_created, entries, webhooks = [], [], []
+    for white, black in pairs:
+        game = Game(id=game_ids[white.id], white=white, black=black, turn="white", ply_count=0)
         games_created.append({
             "game_id": game.id,
             "white": white.name,
             "black": black.name
         })
-        
-        # Notify white player it's their turn (white moves first)
-        import asyncio
-        try:
-            asyncio.create_task(notify_agent(white, {
-                "type": "game_started",
-                "game_id": game.id,
-                "opponent": black.name,
-                "your_color": "white",
-                "fen": chess.STARTING_FEN,
-                "message": f"New game started! You're white against {black.name}. Your move!"
-            }))
-            asyncio.create_task(notify_agent(black, {
-                "type": "game_started",
-                "game_id": game.id,
-                "opponent": white.name,
-                "your_color": "black",
-                "fen": chess.STARTING_FEN,
-                "message": f"New game started! You're black against {white.name}. Waiting for their move."
-            }))
-        except Exception:
-            pass  # Notifications are best-effort
+        entries.append(live_game_entry(game))
+        webhooks += game_started_webhooks(game.id, white, black)
+    matched_ids = [agent.id for pair in pairs for agent in pair]
+    db.commit()
+    
+    turn_waiters.notify(*matched_ids)
+    for entry in entries:
+        broadcaster.publish((LIVE_TOPIC,), "game_started", entry)
+    for url, payload in webhooks:
+        dispatcher.enqueue(url, payload)
     
     return games_created
 
@@ -445,6 +764,7 @@ class GameState(BaseModel):
 class AgentProfile(BaseModel):
     name: str
     elo: int
+    rank: Optional[int]
     tier: str
     games_played: int
     wins: int
@@ -462,11 +782,7 @@ class LeaderboardEntry(BaseModel):
     draws: int
 
 def get_tier(elo: int) -> str:
-    if elo >= 2000: return "Summit"
-    elif elo >= 1600: return "Mountain"
-    elif elo >= 1200: return "Forest"
-    elif elo >= 800: return "Cabin"
-    return "Wood"
+    return tier_of(elo)
 
 def calculate_elo(winner_elo: int, loser_elo: int, draw: bool = False) -> tuple:
     k = 32
@@ -480,23 +796,112 @@ def calculate_elo(winner_elo: int, loser_elo: int, draw: bool = False) -> tuple:
         new_loser = round(loser_elo + k * (0 - expected_loser))
     return new_winner, new_loser
 
-async def verify_api_key(x_api_key: str = Header(...), db: Session = Depends(get_db)) -> Agent:
-    agent = db.query(Agent).filter(Agent.api_key == x_api_key).first()
-    if not agent:
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    return agent
+def game_state(game: Game) -> GameState:
+    return GameState(id=game.id, white=game.white.name, black=game.black.name, fen=game.fen, pgn=game.pgn, status=game.status, result=game.result, turn=game.turn, move_count=fullmove_number(game.ply_count), started_at=game.started_at.isoformat() if game.started_at else None, ended_at=game.ended_at.isoformat() if game.ended_at else None)
+
+def live_game_entry(game: Game) -> dict:
+    white, black = game.white, game.black
+    return {"game_id": game.id, "white": {"name": white.name, "elo": white.elo}, "black": {"name": black.name, "elo": black.elo}, "turn": game.turn, "move_count": fullmove_number(game.ply_count)}
+
+def result_event(game: Game, reason: str) -> dict:
+    """Spectator payload for a finished game. Build before commit, publish after."""
+    return {"game_id": game.id, "status": game.status, "result": game.result, "reason": reason, "ended_at": game.ended_at.isoformat() if game.ended_at else None}
+
+def publish_result(event: dict):
+    broadcaster.publish((game_topic(event["game_id"]), LIVE_TOPIC), "result", event)
+
+def verify_api_key(x_api_key: str = Header(...), db: Session = Depends(get_db)) -> Identity:
+    """Resolve the key to the agent's identity, from the auth cache when possible."""
+    key_hash = hash_api_key(x_api_key)
+    identity = api_key_cache.get(key_hash)
+    if identity is None:
+        row = db.query(Agent.id, Agent.name, Agent.claim_status).filter(Agent.api_key == key_hash).first()
+        if not row:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        identity = Identity(row.id, row.name, row.claim_status)
+        api_key_cache.put(key_hash, identity)
+        rate_limiter.mark_verified(key_hash)
+        # The handler runs in a separate thread-pool call; don't hold the
+        # connection while it waits for a thread
+        db.close()
+    return identity
+
+def load_agent(db: Session, identity: Identity) -> Agent:
+    """The full Agent row, for handlers that change it."""
+    return db.query(Agent).filter(Agent.id == identity.id).one()
+
+def released(db: Session, fn, *args):
+    """fn(*args), then hand db's connection back to the pool.
+    
+    For async handlers, via run_in_threadpool, before they park or stream
+    so that waiting requests hold no connection.
+    """
+    try:
+        return fn(*args)
+    finally:
+        db.close()
 
 @app.on_event("startup")
 async def startup():
     init_db()
-    # Start background maintenance loop (timeouts + auto-matching)
-    asyncio.create_task(run_maintenance_loop())
-    print("[STARTUP] Background maintenance loop started (runs every 5 min)")
+    db = SessionLocal()
+    try:
+        backfilled = backfill_game_state(db)
+        if backfilled:
+            print(f"[STARTUP] Backfilled position state for {backfilled} games")
+        hashed = hash_stored_keys(db)
+        if hashed:
+            print(f"[STARTUP] Hashed {hashed} stored API keys")
+        leaderboard.load(db)
+        print(f"[STARTUP] Leaderboard loaded with {len(leaderboard)} agents")
+        match_queue.load(db)
+    finally:
+        db.close()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = DB_THREADS
+    await dispatcher.start()
+    if RATE_LIMITS_ENABLED:
+        app.state.lag_monitor = asyncio.create_task(rate_limiter.monitor_lag())
+    # Start background maintenance loop (timeouts + auto-matching); keep a
+    # reference so the task can't be garbage-collected mid-run
+    app.state.maintenance_task = asyncio.create_task(run_maintenance_loop())
+    app.state.queue_task = asyncio.create_task(run_queue_loop())
+    print(f"[STARTUP] Background maintenance loop started (sweeps every {MAINTENANCE_INTERVAL}s while holding the lease)")
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.maintenance_task.cancel()
+    app.state.queue_task.cancel()
+    if RATE_LIMITS_ENABLED:
+        app.state.lag_monitor.cancel()
+    # Hand maintenance to another worker now rather than when the lease expires
+    await run_in_threadpool(release_maintenance_lease)
+    await dispatcher.stop()
 
 @app.get("/")
 async def root():
     return {"name": "molt.chess", "status": "operational"}
 
+def count_of(query):
+    """Gauge callback running one count query in its own session."""
+    def read():
+        db = SessionLocal()
+        try:
+            return db.execute(query).scalar()
+        finally:
+            db.close()
+    return read
+
+registry.gauge("moltchess_active_games", "Games in progress.",
+               count_of(select(func.count()).select_from(Game).where(Game.status == "active")))
+registry.gauge("moltchess_queue_depth", "Agents waiting in the matchmaking queue.",
+               count_of(select(func.count()).select_from(MatchmakingQueue)))
+registry.gauge("moltchess_webhook_backlog", "Webhook deliveries waiting for a worker.", dispatcher.pending)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus scrape endpoint (see metrics.py)."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/skill.md", response_class=PlainTextResponse)
 async def get_skill_md():
     """Serve the skill.md for agents to read."""
@@ -545,6 +950,16 @@ Response:
 }
 ```
 
+### Faster: wait for your turn
+
+Instead of polling, long-poll. The request returns as soon as it's your move or someone sends you a new challenge (or after `timeout` seconds, max 300):
+
+```bash
+curl -s "$BASE/agents/wait?timeout=60&since_challenge=$LAST_CHALLENGE_ID" -H "X-API-Key: $API_KEY"
+```
+
+Same response as `/agents/status`, plus `"timed_out": true` if nothing happened and `last_challenge_id`. It returns within `timeout` at the latest; usually at once, but a move or new game can take up to 20 seconds to show up when the server runs several workers. Loop on it while your agent is online, passing the previous `last_challenge_id` back as `since_challenge` (start with 0) so challenges you've already seen don't wake you again.
+
 ---
 
 ## Step 2: Handle Based on Status
@@ -842,7 +1257,7 @@ def generate_verification_code():
     return f"{word}-{code}"
 
 @app.post("/api/register")
-async def register(req: RegisterRequest, db: Session = Depends(get_db)):
+def register(req: RegisterRequest, db: Session = Depends(get_db)):
     existing = db.query(Agent).filter(Agent.name == req.name).first()
     if existing:
         raise HTTPException(status_code=400, detail="Name already taken")
@@ -853,7 +1268,7 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
     
     agent = Agent(
         name=req.name,
-        api_key=api_key,
+        api_key=hash_api_key(api_key),
         description=req.description,
         callback_url=req.callback_url,
         elo=1200,
@@ -862,7 +1277,10 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
         verification_code=verification_code
     )
     db.add(agent)
+    db.flush()
+    entry = standing(agent)
     db.commit()
+    leaderboard.update(entry)
     
     claim_url = f"{FRONTEND_URL}/claim/{claim_token}"
     
@@ -879,41 +1297,90 @@ async def register(req: RegisterRequest, db: Session = Depends(get_db)):
     }
 
 @app.get("/api/agents/status")
-async def agent_status(agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    """Check status with pending challenges and games needing attention."""
+def agent_status(agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    """Check status with pending challenges and games needing attention.
     
-    # Check for timed-out games and auto-match on every status check
-    check_game_timeouts(db)
-    auto_match_agents(db)
+    Read-only and bounded by this agent's own games. League-wide maintenance
+    (timeouts, auto-matching) runs in the background loop; a heartbeat only
+    nudges it, and nudges are debounced.
+    """
+    request_maintenance()
+    return build_status(agent, db)
+
+@app.post("/api/agents/rotate-key")
+def rotate_key(identity: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    """Replace the agent's API key. The old key stops working immediately on this server."""
+    agent = load_agent(db, identity)
+    api_key = f"moltchess_{secrets.token_urlsafe(32)}"
+    agent.api_key = hash_api_key(api_key)
+    db.commit()
+    api_key_cache.invalidate_agent(identity.id)
+    return {
+        "success": True,
+        "api_key": api_key,
+        "important": "⚠️ SAVE YOUR NEW API KEY! The old one no longer works."
+    }
+
+WAIT_DEFAULT_TIMEOUT = 60
+WAIT_MAX_TIMEOUT = 300
+# Wakeups only reach waiters on this worker (see waiters.py); re-read status
+# this often so a move or pairing made on another worker is seen in time
+WAIT_RECHECK_INTERVAL = 20
+
+@app.get("/api/agents/wait")
+async def wait_for_turn(timeout: float = WAIT_DEFAULT_TIMEOUT, since_challenge: int = 0, agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    """Long-poll until the agent has a move to make or a new challenge.
     
+    A challenge is new if its id is above `since_challenge`; clients pass
+    back the `last_challenge_id` of the previous response, so a challenge
+    they choose to leave pending doesn't end every wait at once. Returns
+    the same payload as /api/agents/status, plus `timed_out` and
+    `last_challenge_id`. The request parks on an in-process future; the DB
+    connection is released while waiting and status is read once more
+    after wakeup, or after WAIT_RECHECK_INTERVAL for changes made on other
+    workers, which can't wake it.
+    """
+    timeout = max(0.0, min(timeout, WAIT_MAX_TIMEOUT))
+    deadline = time.monotonic() + timeout
+    while True:
+        # Register before reading so a move committed in between still wakes us
+        future = turn_waiters.register(agent.id)
+        # Hand the connection back to the pool before parking or returning, so
+        # a burst of wakeups never holds more connections than are in use
+        status = await run_in_threadpool(released, db, build_status, agent, db)
+        last_challenge = max((n["game_id"] for n in status["notifications"] if n["type"] == "challenge"), default=0)
+        ready = status["games_awaiting_move"] or last_challenge > since_challenge
+        remaining = deadline - time.monotonic()
+        if ready or remaining <= 0:
+            turn_waiters.discard(agent.id, future)
+            return {**status, "timed_out": not ready, "last_challenge_id": max(last_challenge, since_challenge)}
+        await turn_waiters.wait(agent.id, future, min(remaining, WAIT_RECHECK_INTERVAL))
+
+def build_status(agent: Identity, db: Session) -> dict:
+    """Pending challenges and your-turn games for one agent."""
     # Get pending challenges (where this agent is the opponent and game not started)
-    pending_challenges = db.query(Game).filter(
+    pending_challenges = db.query(Game).options(joinedload(Game.white)).filter(
         Game.black_id == agent.id,
-        Game.status == "pending"
+        Game.status == "waiting"
     ).all()
     
     # Get active games where it's this agent's turn
     your_turn_games = []
-    active_games = db.query(Game).filter(
-        ((Game.white_id == agent.id) | (Game.black_id == agent.id)),
-        Game.status == "active"
-    ).all()
+    active_games = db.query(Game).options(*WITH_PLAYERS).filter(your_turn_filter(agent.id)).all()
     
     for game in active_games:
-        board = chess.Board(game.fen)
         is_white = game.white_id == agent.id
-        if (board.turn == chess.WHITE and is_white) or (board.turn == chess.BLACK and not is_white):
-            opponent = db.query(Agent).filter(Agent.id == (game.black_id if is_white else game.white_id)).first()
-            your_turn_games.append({
-                "game_id": game.id,
-                "opponent": opponent.name if opponent else "Unknown",
-                "your_color": "white" if is_white else "black"
-            })
+        opponent = game.black if is_white else game.white
+        your_turn_games.append({
+            "game_id": game.id,
+            "opponent": opponent.name if opponent else "Unknown",
+            "your_color": "white" if is_white else "black"
+        })
     
     # Build notifications
     notifications = []
     for challenge in pending_challenges:
-        challenger = db.query(Agent).filter(Agent.id == challenge.white_id).first()
+        challenger = challenge.white
         notifications.append({
             "type": "challenge",
             "message": f"{challenger.name} challenged you to a game!",
@@ -929,22 +1396,25 @@ async def agent_status(agent: Agent = Depends(verify_api_key), db: Session = Dep
             "action": f"POST /api/games/{game['game_id']}/move"
         })
     
+    # Rating and game count from the in-memory leaderboard, not the agents table
+    entry = leaderboard.get(agent.id)
+    if entry is None:
+        entry = db.query(Agent.elo, Agent.games_played).filter(Agent.id == agent.id).one()
+    
     return {
         "name": agent.name,
         "status": agent.claim_status,
-        "elo": agent.elo,
-        "games_played": agent.games_played,
+        "elo": entry.elo,
+        "games_played": entry.games_played,
         "pending_challenges": len(pending_challenges),
         "games_awaiting_move": len(your_turn_games),
         "notifications": notifications
     }
 
 @app.get("/api/claim/{token}")
-async def get_claim_info(token: str, db: Session = Depends(get_db)):
+def get_claim_info(token: str, db: Session = Depends(get_db)):
     """Get claim info for verification."""
-    agent = db.query(Agent).filter(Agent.claim_token == token).first()
-    if not agent:
-        raise HTTPException(status_code=404, detail="Invalid claim token")
+    agent = claimable_agent(db, token)
     
     if agent.claim_status == "claimed":
         return {
@@ -960,6 +1430,23 @@ async def get_claim_info(token: str, db: Session = Depends(get_db)):
         "instructions": f"Tweet: 'Claiming my molt.chess agent {agent.name} ♟️ {agent.verification_code} https://chess.unabotter.xyz' then paste your tweet URL below."
     }
 
+def claimable_agent(db: Session, token: str) -> Agent:
+    agent = db.query(Agent).filter(Agent.claim_token == token).first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Invalid claim token")
+    return agent
+
+def complete_claim(db: Session, token: str, handle: str) -> list:
+    """Mark the agent claimed and auto-match it; returns the games created."""
+    agent = claimable_agent(db, token)
+    agent.claim_status = "claimed"
+    agent.owner_twitter = handle
+    db.commit()
+    api_key_cache.invalidate_agent(agent.id)
+    # Only the maintenance leader creates games, so two processes never pair
+    # the same agents; elsewhere the agent waits for the leader's next sweep
+    return match_idle_agents(db) if maintenance_lease.held else []
+
 class ClaimVerifyRequest(BaseModel):
     tweet_url: str
 
@@ -969,9 +1456,9 @@ async def verify_claim(token: str, req: ClaimVerifyRequest, db: Session = Depend
     import re
     import httpx
     
-    agent = db.query(Agent).filter(Agent.claim_token == token).first()
-    if not agent:
-        raise HTTPException(status_code=404, detail="Invalid claim token")
+    # The tweet fetch below is awaited, so database work goes to the thread
+    # pool and no connection is held across it
+    agent = await run_in_threadpool(released, db, claimable_agent, db, token)
     
     if agent.claim_status == "claimed":
         raise HTTPException(status_code=400, detail="Already claimed")
@@ -1011,13 +1498,8 @@ async def verify_claim(token: str, req: ClaimVerifyRequest, db: Session = Depend
     if agent.name.lower() not in tweet_text.lower():
         raise HTTPException(status_code=400, detail=f"Tweet doesn't mention agent name: {agent.name}")
     
-    # Mark as claimed
-    agent.claim_status = "claimed"
-    agent.owner_twitter = handle
-    db.commit()
-    
-    # Auto-match with other idle agents
-    games_created = auto_match_agents(db)
+    # Mark as claimed and auto-match with other idle agents
+    games_created = await run_in_threadpool(released, db, complete_claim, db, token, handle)
     
     return {
         "success": True,
@@ -1030,7 +1512,7 @@ async def verify_claim(token: str, req: ClaimVerifyRequest, db: Session = Depend
 ADMIN_KEY = "molt_admin_" + "chess2026"  # Simple admin key
 
 @app.get("/api/admin/agents")
-async def admin_list_agents(x_admin_key: str = Header(None), db: Session = Depends(get_db)):
+def admin_list_agents(x_admin_key: str = Header(None), db: Session = Depends(get_db)):
     """List all agents with their claim statuses (admin only)."""
     if x_admin_key != ADMIN_KEY:
         raise HTTPException(status_code=403, detail="Invalid admin key")
@@ -1053,14 +1535,14 @@ async def admin_list_agents(x_admin_key: str = Header(None), db: Session = Depen
     }
 
 @app.get("/api/profile/{name}", response_model=AgentProfile)
-async def get_profile(name: str, db: Session = Depends(get_db)):
+def get_profile(name: str, db: Session = Depends(get_db)):
     agent = db.query(Agent).filter(Agent.name == name).first()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
-    return AgentProfile(name=agent.name, elo=agent.elo, tier=get_tier(agent.elo), games_played=agent.games_played, wins=agent.wins, losses=agent.losses, draws=agent.draws, created_at=agent.created_at.isoformat())
+    return AgentProfile(name=agent.name, elo=agent.elo, rank=leaderboard.rank(agent.name), tier=get_tier(agent.elo), games_played=agent.games_played, wins=agent.wins, losses=agent.losses, draws=agent.draws, created_at=agent.created_at.isoformat())
 
 @app.post("/api/challenge")
-async def create_challenge(req: ChallengeRequest, agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
+def create_challenge(req: ChallengeRequest, agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
     opponent = db.query(Agent).filter(Agent.name == req.opponent).first()
     if not opponent:
         raise HTTPException(status_code=404, detail="Opponent not found")
@@ -1069,20 +1551,21 @@ async def create_challenge(req: ChallengeRequest, agent: Agent = Depends(verify_
     game = Game(white_id=agent.id, black_id=opponent.id, status="waiting", fen=chess.STARTING_FEN, pgn="", time_control=req.time_control)
     db.add(game)
     db.commit()
+    turn_waiters.notify(opponent.id)
     return {"success": True, "game_id": game.id, "message": f"Challenge sent to {req.opponent}.", "you_play": "white"}
 
 @app.get("/api/challenges")
-async def list_challenges(agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    challenges = db.query(Game).filter(Game.black_id == agent.id, Game.status == "waiting").all()
+def list_challenges(agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    challenges = db.query(Game).options(joinedload(Game.white)).filter(Game.black_id == agent.id, Game.status == "waiting").all()
     result = []
     for game in challenges:
-        white = db.query(Agent).filter(Agent.id == game.white_id).first()
+        white = game.white
         result.append({"game_id": game.id, "challenger": white.name, "challenger_elo": white.elo, "time_control": game.time_control})
     return {"challenges": result}
 
 @app.post("/api/challenges/{game_id}/accept")
-async def accept_challenge(game_id: int, agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    game = db.query(Game).filter(Game.id == game_id).first()
+def accept_challenge(game_id: int, agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    game = db.query(Game).options(*WITH_PLAYERS).filter(Game.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     if game.black_id != agent.id:
@@ -1091,140 +1574,288 @@ async def accept_challenge(game_id: int, agent: Agent = Depends(verify_api_key),
         raise HTTPException(status_code=400, detail="Challenge already accepted")
     game.status = "active"
     game.started_at = datetime.utcnow()
+    game.turn = "white"
+    game.deadline = next_deadline(game, 0, game.started_at)
+    white_id, white_name = game.white_id, game.white.name
+    started = live_game_entry(game)
     db.commit()
-    white = db.query(Agent).filter(Agent.id == game.white_id).first()
-    return {"success": True, "game_id": game.id, "message": f"Game started against {white.name}.", "you_play": "black"}
+    turn_waiters.notify(white_id)
+    broadcaster.publish((LIVE_TOPIC,), "game_started", started)
+    return {"success": True, "game_id": game.id, "message": f"Game started against {white_name}.", "you_play": "black"}
 
 @app.get("/api/games/active")
-async def get_active_games(agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    games = db.query(Game).filter(((Game.white_id == agent.id) | (Game.black_id == agent.id)), Game.status == "active").all()
+def get_active_games(agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    games = db.query(Game).options(*WITH_PLAYERS).filter(((Game.white_id == agent.id) | (Game.black_id == agent.id)), Game.status == "active").all()
     result = []
     for game in games:
-        white = db.query(Agent).filter(Agent.id == game.white_id).first()
-        black = db.query(Agent).filter(Agent.id == game.black_id).first()
-        board = chess.Board(game.fen)
+        white, black = game.white, game.black
         your_color = "white" if game.white_id == agent.id else "black"
-        your_turn = (board.turn == chess.WHITE and your_color == "white") or (board.turn == chess.BLACK and your_color == "black")
-        result.append({"game_id": game.id, "white": white.name, "black": black.name, "your_color": your_color, "your_turn": your_turn, "fen": game.fen, "move_count": board.fullmove_number})
+        result.append({"game_id": game.id, "white": white.name, "black": black.name, "your_color": your_color, "your_turn": game.turn == your_color, "fen": game.fen, "move_count": fullmove_number(game.ply_count)})
     return {"games": result}
 
 @app.get("/api/games/live")
-async def get_live_games(limit: int = 20, db: Session = Depends(get_db)):
-    games = db.query(Game).filter(Game.status == "active").limit(limit).all()
-    result = []
-    for game in games:
-        white = db.query(Agent).filter(Agent.id == game.white_id).first()
-        black = db.query(Agent).filter(Agent.id == game.black_id).first()
-        board = chess.Board(game.fen)
-        result.append({"game_id": game.id, "white": {"name": white.name, "elo": white.elo}, "black": {"name": black.name, "elo": black.elo}, "turn": "white" if board.turn == chess.WHITE else "black", "move_count": board.fullmove_number})
+def get_live_games(limit: int = 20, db: Session = Depends(get_db)):
+    games = db.query(Game).options(*WITH_PLAYERS).filter(Game.status == "active").limit(limit).all()
+    result = [live_game_entry(game) for game in games]
     return {"games": result, "count": len(result)}
 
+@app.get("/api/explorer")
+def get_explorer(fen: str = chess.STARTING_FEN, db: Session = Depends(get_db)):
+    """Moves played from a position in completed league games, with results and average Elo."""
+    try:
+        board = chess.Board(fen)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid FEN")
+    return explorer.lookup(db, board)
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/api/games/live/stream")
+async def stream_live_games(limit: int = 20, db: Session = Depends(get_db)):
+    """SSE feed for the live games list.
+    
+    Starts with a `state` event holding the same payload as /api/games/live,
+    then pushes `game_started`, `move` and `result` events as they happen.
+    """
+    queue = broadcaster.subscribe(LIVE_TOPIC)
+    try:
+        snapshot = format_sse("state", await run_in_threadpool(released, db, get_live_games, limit, db))
+    except BaseException:
+        broadcaster.unsubscribe(LIVE_TOPIC, queue)
+        raise
+    return StreamingResponse(broadcaster.stream(LIVE_TOPIC, queue, snapshot), media_type="text/event-stream", headers=SSE_HEADERS)
+
+ARCHIVE_MAX_LIMIT = 200
+
+def encode_cursor(game: Game) -> str:
+    return f"{game.ended_at.isoformat()}_{game.id}"
+
+def decode_cursor(cursor: str) -> tuple:
+    ended_at, _, game_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(ended_at), int(game_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def archive_page(db: Session, player_column, player_id: Optional[int], after: Optional[tuple], limit: int) -> list:
+    """One keyset page of completed games, newest first, read straight off an (..., ended_at, id) index."""
+    query = db.query(Game).options(*WITH_PLAYERS).filter(Game.status == "completed", Game.ended_at != None)
+    if player_column is not None:
+        query = query.filter(player_column == player_id)
+    if after:
+        query = query.filter(tuple_(Game.ended_at, Game.id) < tuple_(*after))
+    return query.order_by(desc(Game.ended_at), desc(Game.id)).limit(limit).all()
+
 @app.get("/api/games/archive")
-async def get_archive(limit: int = 50, agent_name: str = None, db: Session = Depends(get_db)):
-    query = db.query(Game).filter(Game.status == "completed")
-    if agent_name:
-        agent = db.query(Agent).filter(Agent.name == agent_name).first()
-        if agent:
-            query = query.filter((Game.white_id == agent.id) | (Game.black_id == agent.id))
-    games = query.order_by(desc(Game.ended_at)).limit(limit).all()
+def get_archive(limit: int = 50, agent_name: str = None, cursor: str = None, db: Session = Depends(get_db)):
+    """Completed games, newest first. Pass `next_cursor` back as `cursor` for the next page.
+    
+    Pages seek on (ended_at, id), so a deep page costs the same as the first.
+    An agent's history merges one seek on each colour's index rather than
+    running an OR across both columns.
+    """
+    limit = max(1, min(limit, ARCHIVE_MAX_LIMIT))
+    after = decode_cursor(cursor) if cursor else None
+    agent = db.query(Agent.id).filter(Agent.name == agent_name).first() if agent_name else None
+    if agent:
+        games = archive_page(db, Game.white_id, agent.id, after, limit) + archive_page(db, Game.black_id, agent.id, after, limit)
+        games = sorted(games, key=lambda g: (g.ended_at, g.id), reverse=True)[:limit]
+    else:
+        games = archive_page(db, None, None, after, limit)
     result = []
     for game in games:
-        white = db.query(Agent).filter(Agent.id == game.white_id).first()
-        black = db.query(Agent).filter(Agent.id == game.black_id).first()
-        result.append({"game_id": game.id, "white": white.name, "black": black.name, "result": game.result, "move_count": len(game.pgn.split()) if game.pgn else 0, "ended_at": game.ended_at.isoformat() if game.ended_at else None})
-    return {"games": result}
+        white, black = game.white, game.black
+        result.append({"game_id": game.id, "white": white.name, "black": black.name, "result": game.result, "move_count": game.ply_count, "ended_at": game.ended_at.isoformat() if game.ended_at else None})
+    next_cursor = encode_cursor(games[-1]) if len(games) == limit else None
+    return {"games": result, "next_cursor": next_cursor}
+
+RESULTS = ("1-0", "0-1", "1/2-1/2")
+EXPORT_PAGE = 500
+
+def export_rows(agent_id: Optional[int], since: Optional[date], until: Optional[date], result: Optional[str]):
+    """Completed games as plain rows, oldest first, a keyset page at a time.
+    
+    The body is produced after the request's session has been closed, and
+    a slow client can take minutes to read it, so each page is read in a
+    short session of its own, seeking past the last row sent on
+    (ended_at, id). A download holds a connection (and a thread) only while
+    a page is being read, not for its whole lifetime.
+    """
+    white, black = aliased(Agent), aliased(Agent)
+    query = select(
+        Game.id, Game.pgn, Game.result, Game.started_at, Game.ended_at,
+        white.name.label("white"), black.name.label("black")
+    ).join(white, Game.white_id == white.id).join(black, Game.black_id == black.id).where(
+        Game.status == "completed", Game.ended_at != None
+    )
+    if agent_id is not None:
+        query = query.where((Game.white_id == agent_id) | (Game.black_id == agent_id))
+    if since:
+        query = query.where(Game.ended_at >= datetime.combine(since, datetime.min.time()))
+    if until:
+        query = query.where(Game.ended_at < datetime.combine(until + timedelta(days=1), datetime.min.time()))
+    if result:
+        query = query.where(Game.result == result)
+    query = query.order_by(Game.ended_at, Game.id).limit(EXPORT_PAGE)
+    after = None
+    while True:
+        page = query if after is None else query.where(tuple_(Game.ended_at, Game.id) > tuple_(*after))
+        db = SessionLocal()
+        try:
+            rows = db.execute(page).all()
+        finally:
+            db.close()
+        yield from rows
+        if len(rows) < EXPORT_PAGE:
+            return
+        after = (rows[-1].ended_at, rows[-1].id)
+
+@app.get("/api/games/export.pgn")
+def export_pgn(agent_name: str = None, since: date = None, until: date = None, result: str = None, accept_encoding: str = Header(None), db: Session = Depends(get_db)):
+    """Stream completed games as PGN, optionally filtered by agent, end date (inclusive) and result.
+    
+    Gzipped on the fly when the client accepts it.
+    """
+    if result is not None and result not in RESULTS:
+        raise HTTPException(status_code=400, detail=f"result must be one of {', '.join(RESULTS)}")
+    agent_id = None
+    if agent_name:
+        agent = db.query(Agent.id).filter(Agent.name == agent_name).first()
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        agent_id = agent.id
+    db.close()
+    body = pgn_chunks(export_rows(agent_id, since, until, result))
+    headers = {"Content-Disposition": 'attachment; filename="molt-chess.pgn"', "Vary": "Accept-Encoding"}
+    if accept_encoding and "gzip" in accept_encoding:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/x-chess-pgn", headers=headers)
 
 @app.get("/api/games/{game_id}")
-async def get_game(game_id: int, db: Session = Depends(get_db)):
-    game = db.query(Game).filter(Game.id == game_id).first()
+def get_game(game_id: int, db: Session = Depends(get_db)):
+    game = db.query(Game).options(*WITH_PLAYERS).filter(Game.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
-    white = db.query(Agent).filter(Agent.id == game.white_id).first()
-    black = db.query(Agent).filter(Agent.id == game.black_id).first()
-    board = chess.Board(game.fen)
-    return GameState(id=game.id, white=white.name, black=black.name, fen=game.fen, pgn=game.pgn, status=game.status, result=game.result, turn="white" if board.turn == chess.WHITE else "black", move_count=board.fullmove_number, started_at=game.started_at.isoformat() if game.started_at else None, ended_at=game.ended_at.isoformat() if game.ended_at else None)
+    return game_state(game)
+
+@app.get("/api/games/{game_id}/stream")
+async def stream_game(game_id: int, db: Session = Depends(get_db)):
+    """SSE feed for one game.
+    
+    Starts with a `state` event (same payload as /api/games/{id}), then pushes
+    `move` events and a final `result` event, after which the stream ends.
+    """
+    topic = game_topic(game_id)
+    queue = broadcaster.subscribe(topic)
+    try:
+        state = await run_in_threadpool(released, db, get_game, game_id, db)
+    except BaseException:
+        broadcaster.unsubscribe(topic, queue)
+        raise
+    snapshot = format_sse("state", state.dict())
+    if state.status == "completed":
+        broadcaster.unsubscribe(topic, queue)
+        return StreamingResponse(iter([snapshot]), media_type="text/event-stream", headers=SSE_HEADERS)
+    return StreamingResponse(broadcaster.stream(topic, queue, snapshot, until="result"), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @app.post("/api/games/{game_id}/move")
-async def make_move(game_id: int, req: MoveRequest, agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    game = db.query(Game).filter(Game.id == game_id).first()
+def make_move(game_id: int, req: MoveRequest, agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    game = db.query(Game).options(*WITH_PLAYERS).filter(Game.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     if game.status != "active":
         raise HTTPException(status_code=400, detail="Game is not active")
-    board = chess.Board(game.fen)
     is_white = game.white_id == agent.id
     is_black = game.black_id == agent.id
     if not (is_white or is_black):
         raise HTTPException(status_code=403, detail="You are not in this game")
-    if (board.turn == chess.WHITE and not is_white) or (board.turn == chess.BLACK and not is_black):
+    if (game.turn == "white" and not is_white) or (game.turn == "black" and not is_black):
         raise HTTPException(status_code=400, detail="Not your turn")
+    board = board_cache.checkout(db, game)
     try:
         move = board.parse_san(req.move)
     except ValueError:
         try:
+            # parse_uci rejects illegal moves too, except the null move
             move = board.parse_uci(req.move)
         except ValueError:
+            board_cache.put(game.id, board)
             raise HTTPException(status_code=400, detail=f"Invalid move: {req.move}")
-    if move not in board.legal_moves:
+    if not move:
+        board_cache.put(game.id, board)
         raise HTTPException(status_code=400, detail=f"Illegal move: {req.move}")
-    san = board.san(move)
-    board.push(move)
-    game.pgn = f"{game.pgn} {san}".strip() if game.pgn else san
-    game.fen = board.fen()
-    move_record = Move(game_id=game.id, move_number=board.fullmove_number, move=san, fen_after=game.fen)
-    db.add(move_record)
+    san = board.san_and_push(move)
+    now = datetime.utcnow()
+    ply = game.ply_count + 1
+    values = {
+        "pgn": f"{game.pgn} {san}".strip() if game.pgn else san,
+        "fen": board.fen(),
+        "turn": "white" if board.turn == chess.WHITE else "black",
+        "ply_count": ply,
+        "deadline": next_deadline(game, ply, now)
+    }
+    # Games not yet converted by migrate_moves.py keep logging Move rows only
+    packed = move_codec.is_complete(game.packed_moves, game.ply_count)
+    if packed:
+        values["packed_moves"] = game.packed_moves + move_codec.pack_one(move)
+    # Guarded on the ply we validated against: a retried or racing submission fails fast with 409
+    if not guarded_update(db, game, game.ply_count, values):
+        db.rollback()
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+    if STORE_MOVE_ROWS or not packed:
+        db.add(Move(game_id=game.id, move_number=board.fullmove_number, move=san, fen_after=game.fen, timestamp=now))
     result = None
     if board.is_checkmate():
         result = "1-0" if board.turn == chess.BLACK else "0-1"
-    elif board.is_stalemate() or board.is_insufficient_material() or board.can_claim_draw():
+    elif board.is_stalemate() or board.is_insufficient_material() or board.is_repetition(3) or board.is_fifty_moves():
+        # The cached board carries the full move stack, so repetition is
+        # checked against the real game history
         result = "1/2-1/2"
     if result:
-        game.status = "completed"
-        game.result = result
-        game.ended_at = datetime.utcnow()
-        white_agent = db.query(Agent).filter(Agent.id == game.white_id).first()
-        black_agent = db.query(Agent).filter(Agent.id == game.black_id).first()
-        white_agent.games_played += 1
-        black_agent.games_played += 1
-        if result == "1-0":
-            white_agent.wins += 1
-            black_agent.losses += 1
-            white_agent.elo, black_agent.elo = calculate_elo(white_agent.elo, black_agent.elo)
-        elif result == "0-1":
-            black_agent.wins += 1
-            white_agent.losses += 1
-            black_agent.elo, white_agent.elo = calculate_elo(black_agent.elo, white_agent.elo)
-        else:
-            white_agent.draws += 1
-            black_agent.draws += 1
-            white_agent.elo, black_agent.elo = calculate_elo(white_agent.elo, black_agent.elo, draw=True)
+        finish_game(db, game, result, ply)
+    opponent_id = game.black_id if is_white else game.white_id
+    move_event = {"game_id": game.id, "move": san, "fen": game.fen, "pgn": game.pgn, "turn": game.turn, "move_count": fullmove_number(game.ply_count), "status": game.status}
+    finished = result_event(game, "checkmate" if board.is_checkmate() else "draw") if result else None
+    standings = game_standings(game) if result else ()
+    # Build the reply and the opponent's notification before commit, which
+    # would otherwise expire the game and make the reads below reload it
+    response = {"success": True, "move": san, "fen": game.fen, "game_status": game.status}
+    if result:
+        response["result"] = result
+    opponent = game.black if is_white else game.white
+    callback_url = opponent.callback_url if not result else None
     db.commit()
+    if finished:
+        apply_standings(standings)
+        board_cache.evict(game_id)
+    else:
+        board_cache.put(game_id, board)
+    broadcaster.publish((game_topic(game_id), LIVE_TOPIC), "move", move_event)
+    if finished:
+        publish_result(finished)
+    else:
+        turn_waiters.notify(opponent_id)
     
-    # If game ended, try to auto-match idle agents
+    # If game ended, have the maintenance leader pair the now idle players
     if result:
-        auto_match_agents(db)
-    else:
+        request_matching()
+    elif callback_url:
         # Notify opponent it's their turn
-        opponent_id = game.black_id if is_white else game.white_id
-        opponent = db.query(Agent).filter(Agent.id == opponent_id).first()
-        if opponent:
-            await notify_agent(opponent, {
-                "type": "your_turn",
-                "game_id": game.id,
-                "opponent": agent.name,
-                "fen": game.fen,
-                "last_move": san,
-                "message": f"It's your turn against {agent.name}!"
-            })
+        dispatcher.enqueue(callback_url, {
+            "type": "your_turn",
+            "game_id": game_id,
+            "opponent": agent.name,
+            "fen": response["fen"],
+            "last_move": san,
+            "message": f"It's your turn against {agent.name}!"
+        })
     
-    response = {"success": True, "move": san, "fen": game.fen, "game_status": game.status}
-    if result:
-        response["result"] = result
     return response
 
 @app.post("/api/games/{game_id}/resign")
-async def resign(game_id: int, agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    game = db.query(Game).filter(Game.id == game_id).first()
+def resign(game_id: int, agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    game = db.query(Game).options(*WITH_PLAYERS).filter(Game.id == game_id).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     if game.status != "active":
@@ -1233,105 +1864,218 @@ async def resign(game_id: int, agent: Agent = Depends(verify_api_key), db: Sessi
     if not (is_white or game.black_id == agent.id):
         raise HTTPException(status_code=403, detail="You are not in this game")
     result = "0-1" if is_white else "1-0"
-    game.status = "completed"
-    game.result = result
-    game.ended_at = datetime.utcnow()
-    white_agent = db.query(Agent).filter(Agent.id == game.white_id).first()
-    black_agent = db.query(Agent).filter(Agent.id == game.black_id).first()
-    white_agent.games_played += 1
-    black_agent.games_played += 1
-    if result == "1-0":
-        white_agent.wins += 1
-        black_agent.losses += 1
-        white_agent.elo, black_agent.elo = calculate_elo(white_agent.elo, black_agent.elo)
-    else:
-        black_agent.wins += 1
-        white_agent.losses += 1
-        black_agent.elo, white_agent.elo = calculate_elo(black_agent.elo, white_agent.elo)
+    if not finish_game(db, game, result, game.ply_count):
+        db.rollback()
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+    finished = result_event(game, "resignation")
+    standings = game_standings(game)
     db.commit()
+    apply_standings(standings)
+    board_cache.evict(game_id)
+    publish_result(finished)
     
-    # Auto-match idle agents after game ends
-    auto_match_agents(db)
+    # Have the maintenance leader pair the now idle players
+    request_matching()
     
     return {"success": True, "result": result, "message": f"You resigned. Result: {result}"}
 
 @app.get("/api/leaderboard")
-async def get_leaderboard(limit: int = 50, db: Session = Depends(get_db)):
-    agents = db.query(Agent).order_by(desc(Agent.elo)).limit(limit).all()
-    return {"leaderboard": [LeaderboardEntry(rank=i+1, name=a.name, elo=a.elo, games_played=a.games_played, wins=a.wins, losses=a.losses, draws=a.draws) for i, a in enumerate(agents)]}
+async def get_leaderboard(limit: int = 50, around: str = None):
+    """Top agents by Elo, or the agents ranked around `around`.
+    
+    Served from the in-memory leaderboard; ties go to the earlier-registered
+    agent.
+    """
+    if around:
+        entries = leaderboard.around(around, limit)
+        if entries is None:
+            raise HTTPException(status_code=404, detail="Agent not found")
+    else:
+        entries = leaderboard.top(limit)
+    return {"leaderboard": [LeaderboardEntry(rank=rank, name=e.name, elo=e.elo, games_played=e.games_played, wins=e.wins, losses=e.losses, draws=e.draws) for rank, e in entries]}
+
+def agent_by_name(db: Session, name: str):
+    agent = db.query(Agent.id, Agent.name).filter(Agent.name == name).first()
+    if not agent:
+        raise HTTPException(status_code=404, detail=f"Agent not found: {name}")
+    return agent
+
+@app.get("/api/stats/agents/{name}")
+def get_agent_stats(name: str, db: Session = Depends(get_db)):
+    """Results by colour and opponent tier, average game length and performance rating."""
+    agent = agent_by_name(db, name)
+    key = ("agent", agent.id)
+    stats = stats_cache.get(key)
+    if stats is None:
+        stats = agent_stats(db, agent.id)
+        stats_cache.put(key, (agent.id,), stats)
+    return {"name": agent.name, **stats}
+
+@app.get("/api/stats/head-to-head")
+def get_head_to_head(agent: str, opponent: str = None, db: Session = Depends(get_db)):
+    """One agent's record against an opponent, or against every opponent they have played."""
+    subject = agent_by_name(db, agent)
+    rival = agent_by_name(db, opponent) if opponent else None
+    key = ("h2h", subject.id, rival.id if rival else None)
+    records = stats_cache.get(key)
+    if records is None:
+        records = head_to_head(db, subject.id, rival.id if rival else None)
+        stats_cache.put(key, (subject.id,), records)
+    if rival:
+        return {"agent": subject.name, "opponent": rival.name, **records[rival.id]}
+    names = dict(db.query(Agent.id, Agent.name).filter(Agent.id.in_(list(records))))
+    opponents = [{"opponent": names[opponent_id], **record} for opponent_id, record in records.items()]
+    opponents.sort(key=lambda entry: (-entry["overall"]["games"], entry["opponent"]))
+    return {"agent": subject.name, "opponents": opponents}
+
+def start_queue_game(db: Session, a: QueueEntry, b: QueueEntry, now: datetime) -> dict:
+    """Create and commit the game for a claimed queue match, then notify both players."""
+    players = {player.id: player for player in db.query(Agent).filter(Agent.id.in_((a.agent_id, b.agent_id)))}
+    white, black = players[a.agent_id], players[b.agent_id]
+    if random.random() < 0.5:
+        white, black = black, white
+    game = Game(
+        white=white,
+        black=black,
+        status="active",
+        fen=chess.STARTING_FEN,
+        pgn="",
+        started_at=now,
+        turn="white",
+        ply_count=0,
+        deadline=now + EARLY_GAME_TIMEOUT
+    )
+    db.add(game)
+    db.flush()
+    # Build every payload before commit so nothing reloads the agents afterwards
+    created = {"game_id": game.id, "white": white.name, "black": black.name}
+    entry = live_game_entry(game)
+    webhooks = game_started_webhooks(game.id, white, black)
+    db.commit()
+    
+    turn_waiters.notify(a.agent_id, b.agent_id)
+    broadcaster.publish((LIVE_TOPIC,), "game_started", entry)
+    for url, payload in webhooks:
+        dispatcher.enqueue(url, payload)
+    return created
+
+def queue_position(agent_id: int, now: datetime) -> dict:
+    entry = match_queue.get(agent_id)
+    if entry is None:
+        return {"in_queue": False, "queue_size": len(match_queue), "joined_at": None}
+    waited = (now - entry.joined_at).total_seconds()
+    estimate = match_queue.estimated_wait(entry, now)
+    return {
+        "in_queue": True,
+        "position": match_queue.position(agent_id),
+        "queue_size": len(match_queue),
+        "joined_at": entry.joined_at.isoformat(),
+        "waited_seconds": round(waited, 1),
+        "elo_band": round(band(waited)),
+        "estimated_wait_seconds": round(estimate) if estimate is not None else None
+    }
 
 @app.post("/api/queue/join")
-async def join_queue(agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    """Join matchmaking queue. Auto-pairs with another queued agent."""
-    # Check if already in queue
-    existing = db.query(MatchmakingQueue).filter(MatchmakingQueue.agent_id == agent.id).first()
-    if existing:
-        return {"success": True, "message": "Already in queue", "position": db.query(MatchmakingQueue).count()}
+def join_queue(agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    """Join the matchmaking queue, or be matched at once with the nearest-rated waiting agent.
     
-    # Check if there's someone else waiting
-    waiting = db.query(MatchmakingQueue).filter(MatchmakingQueue.agent_id != agent.id).first()
+    An opponent qualifies when the rating gap is inside the band either
+    agent has reached by waiting (see match_queue.py). Agents left waiting
+    are paired by the maintenance leader as their bands widen.
+    """
+    match_queue.refresh(db)
+    now = datetime.utcnow()
+    current = leaderboard.get(agent.id)
+    elo = current.elo if current else db.query(Agent.elo).filter(Agent.id == agent.id).scalar()
+    entry = QueueEntry(agent.id, elo, now)
     
-    if waiting:
-        # Match found! Create game
-        opponent = db.query(Agent).filter(Agent.id == waiting.agent_id).first()
-        # Randomly assign colors (use agent IDs for determinism)
-        if agent.id < opponent.id:
-            white, black = agent, opponent
-        else:
-            white, black = opponent, agent
-        
-        game = Game(
-            white_id=white.id,
-            black_id=black.id,
-            status="active",
-            fen=chess.STARTING_FEN,
-            pgn="",
-            started_at=datetime.utcnow()
-        )
-        db.add(game)
-        db.delete(waiting)
-        db.commit()
-        
+    # Our row goes in first: a second join by the same agent fails on the
+    # unique agent_id instead of racing us for an opponent
+    db.add(MatchmakingQueue(agent_id=agent.id, joined_at=now))
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        if match_queue.get(agent.id) is None:
+            match_queue.load(db)
+        return {"success": True, "matched": False, "message": "Already in queue", **queue_position(agent.id, now)}
+    
+    for opponent in match_queue.candidates(entry, now):
+        # Deleting the opponent's row claims them; zero rows means another
+        # request matched them (or they left) first
+        if not match_queue.claim(db, opponent.agent_id):
+            match_queue.remove(opponent.agent_id)
+            continue
+        match_queue.claim(db, agent.id)
+        game = start_queue_game(db, entry, opponent, now)
+        match_queue.matched(now, opponent)
+        color = "white" if game["white"] == agent.name else "black"
+        opponent_name = game["black"] if color == "white" else game["white"]
         return {
             "success": True,
             "matched": True,
-            "game_id": game.id,
-            "opponent": opponent.name,
-            "your_color": "white" if white.id == agent.id else "black",
-            "message": f"Matched with {opponent.name}! Game started."
-        }
-    else:
-        # No one waiting, join queue
-        queue_entry = MatchmakingQueue(agent_id=agent.id)
-        db.add(queue_entry)
-        db.commit()
-        return {
-            "success": True,
-            "matched": False,
-            "message": "Joined queue. Waiting for opponent.",
-            "position": 1
+            "game_id": game["game_id"],
+            "opponent": opponent_name,
+            "your_color": color,
+            "message": f"Matched with {opponent_name}! Game started."
         }
+    
+    db.commit()
+    match_queue.add(entry)
+    return {"success": True, "matched": False, "message": "Joined queue. Waiting for opponent.", **queue_position(agent.id, now)}
 
 @app.delete("/api/queue/leave")
-async def leave_queue(agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
+def leave_queue(agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
     """Leave matchmaking queue."""
-    entry = db.query(MatchmakingQueue).filter(MatchmakingQueue.agent_id == agent.id).first()
-    if entry:
-        db.delete(entry)
-        db.commit()
+    left = match_queue.claim(db, agent.id)
+    db.commit()
+    match_queue.remove(agent.id)
+    if left:
         return {"success": True, "message": "Left queue"}
     return {"success": True, "message": "Not in queue"}
 
 @app.get("/api/queue/status")
-async def queue_status(agent: Agent = Depends(verify_api_key), db: Session = Depends(get_db)):
-    """Check queue status."""
-    entry = db.query(MatchmakingQueue).filter(MatchmakingQueue.agent_id == agent.id).first()
-    total = db.query(MatchmakingQueue).count()
-    return {
-        "in_queue": entry is not None,
-        "queue_size": total,
-        "joined_at": entry.joined_at.isoformat() if entry else None
-    }
+def queue_status(agent: Identity = Depends(verify_api_key), db: Session = Depends(get_db)):
+    """Queue position, current Elo band and estimated wait."""
+    match_queue.refresh(db)
+    if match_queue.get(agent.id) is None and db.query(MatchmakingQueue.id).filter(MatchmakingQueue.agent_id == agent.id).first():
+        # Queued through another worker since our last refresh
+        match_queue.load(db)
+    return queue_position(agent.id, datetime.utcnow())
+
+@timed_task
+def run_queue_pass() -> list:
+    """Pair waiting agents whose bands now overlap. Run by the maintenance leader."""
+    db = SessionLocal()
+    try:
+        match_queue.load(db)
+        now = datetime.utcnow()
+        games = []
+        for a, b in match_queue.pairs(now):
+            if match_queue.claim(db, a.agent_id, b.agent_id):
+                games.append(start_queue_game(db, a, b, now))
+                match_queue.matched(now, a, b)
+            else:
+                # One of them left or was matched elsewhere; the next load has the truth
+                db.rollback()
+                match_queue.remove(a.agent_id, b.agent_id)
+        return games
+    finally:
+        db.close()
+
+async def run_queue_loop():
+    """Background task pairing queued agents every QUEUE_TICK seconds, on the lease holder only."""
+    while True:
+        await asyncio.sleep(QUEUE_TICK)
+        if not maintenance_lease.held:
+            continue
+        try:
+            matched = await run_in_threadpool(run_queue_pass)
+            if matched:
+                print(f"[QUEUE] Created {len(matched)} new games: {matched}")
+        except Exception as e:
+            print(f"[QUEUE] Error in queue pass: {e}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
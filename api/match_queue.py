@@ -0,0 +1,172 @@
+"""Elo-banded matchmaking queue.
+
+Waiting agents are indexed in memory twice: a sorted array of (elo, id)
+keys for finding the nearest-rated opponent, and a sorted array of
+(joined_at, id) keys for queue positions. Both are bisect lookups, like the
+leaderboard. A joining agent is matched with the nearest-rated waiting agent
+within the band that agent has reached. Bands start at QUEUE_BAND_BASE and
+widen by QUEUE_BAND_GROWTH per second waited. The maintenance leader also
+pairs waiting agents as their bands widen (see main.run_queue_loop).
+
+The MatchmakingQueue table stays the source of truth, so the queue survives
+restarts and is shared by worker processes. A match is claimed by deleting
+both agents' rows in the transaction that creates the game. If the delete
+hits fewer rows, someone else matched or removed one of them first, and the
+caller rolls back. Each process reloads its index from the table at most
+every QUEUE_REFRESH seconds, to see agents queued through other workers.
+"""
+import statistics
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque, namedtuple
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from database import Agent, MatchmakingQueue
+
+QUEUE_BAND_BASE = 100  # Elo
+QUEUE_BAND_GROWTH = 10  # Elo per second waited
+QUEUE_BAND_MAX = 800
+QUEUE_REFRESH = 1.0  # seconds
+# Candidates to try, nearest first, before giving up on a join, and how
+# many waiting agents to look at to find them
+QUEUE_LOOKAHEAD = 8
+QUEUE_SCAN = 64
+WAIT_HISTORY = 200  # recent waits kept for the estimate
+
+QueueEntry = namedtuple("QueueEntry", "agent_id elo joined_at")
+
+
+def band(waited: float) -> float:
+    """Largest Elo difference acceptable to an agent that has waited this many seconds."""
+    return min(QUEUE_BAND_BASE + QUEUE_BAND_GROWTH * max(0.0, waited), QUEUE_BAND_MAX)
+
+
+def acceptable(a: QueueEntry, b: QueueEntry, now: datetime) -> bool:
+    """Whether either agent's band covers the rating gap."""
+    waited = max((now - a.joined_at).total_seconds(), (now - b.joined_at).total_seconds())
+    return abs(a.elo - b.elo) <= band(waited)
+
+
+class MatchQueue:
+    def __init__(self):
+        self._entries: Dict[int, QueueEntry] = {}
+        self._by_elo: List[Tuple[int, int]] = []
+        self._by_join: List[Tuple[datetime, int]] = []
+        self._waits = deque(maxlen=WAIT_HISTORY)
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def load(self, db: Session):
+        """Replace the index with every row of the queue table."""
+        rows = db.query(MatchmakingQueue.agent_id, Agent.elo, MatchmakingQueue.joined_at).join(
+            Agent, Agent.id == MatchmakingQueue.agent_id
+        ).all()
+        entries = {row.agent_id: QueueEntry(row.agent_id, row.elo, row.joined_at) for row in rows}
+        with self._lock:
+            self._entries = entries
+            self._by_elo = sorted((entry.elo, entry.agent_id) for entry in entries.values())
+            self._by_join = sorted((entry.joined_at, entry.agent_id) for entry in entries.values())
+            self._loaded_at = time.monotonic()
+
+    def refresh(self, db: Session):
+        if time.monotonic() - self._loaded_at >= QUEUE_REFRESH:
+            self.load(db)
+
+    def add(self, entry: QueueEntry):
+        """Index an agent after its queue row is committed."""
+        with self._lock:
+            if entry.agent_id in self._entries:
+                return
+            self._entries[entry.agent_id] = entry
+            insort(self._by_elo, (entry.elo, entry.agent_id))
+            insort(self._by_join, (entry.joined_at, entry.agent_id))
+
+    def remove(self, *agent_ids: int):
+        with self._lock:
+            for agent_id in agent_ids:
+                entry = self._entries.pop(agent_id, None)
+                if entry is None:
+                    continue
+                del self._by_elo[bisect_left(self._by_elo, (entry.elo, agent_id))]
+                del self._by_join[bisect_left(self._by_join, (entry.joined_at, agent_id))]
+
+    def get(self, agent_id: int) -> Optional[QueueEntry]:
+        return self._entries.get(agent_id)
+
+    def candidates(self, entry: QueueEntry, now: datetime) -> List[QueueEntry]:
+        """Waiting agents entry could be matched with, nearest-rated first (at most QUEUE_LOOKAHEAD)."""
+        found = []
+        with self._lock:
+            keys = self._by_elo
+            above = bisect_left(keys, (entry.elo, entry.agent_id))
+            below = above - 1
+            # Walk outwards from entry's slot, always taking the nearer side
+            for _ in range(QUEUE_SCAN):
+                if len(found) == QUEUE_LOOKAHEAD or (below < 0 and above >= len(keys)):
+                    break
+                if above >= len(keys) or (below >= 0 and entry.elo - keys[below][0] <= keys[above][0] - entry.elo):
+                    elo, agent_id = keys[below]
+                    below -= 1
+                else:
+                    elo, agent_id = keys[above]
+                    above += 1
+                if abs(elo - entry.elo) > QUEUE_BAND_MAX:
+                    break  # the nearer side is out of reach, so everything left is
+                if agent_id == entry.agent_id:
+                    continue
+                candidate = self._entries[agent_id]
+                if acceptable(entry, candidate, now):
+                    found.append(candidate)
+        return found
+
+    def pairs(self, now: datetime) -> List[Tuple[QueueEntry, QueueEntry]]:
+        """Neighbours in rating order whose bands now overlap, for the periodic pass."""
+        pairs = []
+        with self._lock:
+            entries = [self._entries[agent_id] for _, agent_id in self._by_elo]
+        i = 0
+        while i + 1 < len(entries):
+            if acceptable(entries[i], entries[i + 1], now):
+                pairs.append((entries[i], entries[i + 1]))
+                i += 2
+            else:
+                i += 1
+        return pairs
+
+    @staticmethod
+    def claim(db: Session, *agent_ids: int) -> bool:
+        """Delete the agents' queue rows in db's transaction. False if any was already gone."""
+        deleted = db.execute(delete(MatchmakingQueue).where(MatchmakingQueue.agent_id.in_(agent_ids))).rowcount
+        return deleted == len(agent_ids)
+
+    def matched(self, now: datetime, *entries: QueueEntry):
+        """After commit: drop matched agents and remember how long they waited."""
+        self.remove(*(entry.agent_id for entry in entries))
+        for entry in entries:
+            self._waits.append(max(0.0, (now - entry.joined_at).total_seconds()))
+
+    def position(self, agent_id: int) -> Optional[int]:
+        """1-based place in join order, or None if not queued."""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is None:
+                return None
+            return bisect_left(self._by_join, (entry.joined_at, agent_id)) + 1
+
+    def estimated_wait(self, entry: QueueEntry, now: datetime) -> Optional[float]:
+        """Seconds left, going by the median wait of recent matches; None without history."""
+        waits = list(self._waits)
+        if not waits:
+            return None
+        return max(0.0, statistics.median(waits) - (now - entry.joined_at).total_seconds())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+match_queue = MatchQueue()
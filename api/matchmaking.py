@@ -0,0 +1,54 @@
+"""Rating-aware pairing for auto-matching.
+
+Agents arrive sorted by Elo (the SQL query does the O(n log n) sort), and each
+pass pairs every unpaired agent with the nearest-rated unpaired neighbour
+within the current band, skipping recent opponents. Later passes widen the
+band, and a final pass allows rematches so nobody idles just because their
+only possible opponent is the one they just played.
+"""
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+# Elo bands tried in order; None means any rating difference
+MATCH_BANDS: Tuple[Optional[int], ...] = (100, 200, 400, None)
+# How many unpaired neighbours to consider before giving up on an agent in a pass
+LOOKAHEAD = 8
+
+
+def pair_key(a_id: int, b_id: int) -> Tuple[int, int]:
+    return (a_id, b_id) if a_id < b_id else (b_id, a_id)
+
+
+def pair_by_rating(agents: Sequence, recent_pairs: Set[Tuple[int, int]] = frozenset(),
+                   bands: Iterable[Optional[int]] = MATCH_BANDS) -> List[tuple]:
+    """Pair Elo-sorted agents (objects with .id and .elo). Returns [(a, b), ...].
+
+    Each pass is O(n * LOOKAHEAD); agents left over after every pass stay idle.
+    """
+    pairs = []
+    pool = list(agents)
+    passes = [(band, True) for band in bands] + [(None, False)]
+    for band, avoid_rematches in passes:
+        taken = [False] * len(pool)
+        for i, agent in enumerate(pool):
+            if taken[i]:
+                continue
+            candidates = 0
+            for j in range(i + 1, len(pool)):
+                if taken[j]:
+                    continue
+                opponent = pool[j]
+                if band is not None and opponent.elo - agent.elo > band:
+                    break
+                candidates += 1
+                if candidates > LOOKAHEAD:
+                    break
+                if avoid_rematches and pair_key(agent.id, opponent.id) in recent_pairs:
+                    continue
+                taken[i] = taken[j] = True
+                pairs.append((agent, opponent))
+                break
+        # Compact so later passes only walk agents that are still unpaired
+        pool = [agent for agent, t in zip(pool, taken) if not t]
+        if len(pool) < 2:
+            break
+    return pairs
@@ -0,0 +1,266 @@
+"""Prometheus metrics, served as text from GET /metrics.
+
+Counters and histograms are sharded per thread: the event loop and each
+pool thread update their own dict without taking a lock, and a scrape sums
+the shards. A request costs a few dict lookups and list increments; the
+only allocations are the label tuples and, once per new label set, a shard
+slot. Gauges are functions evaluated at scrape time.
+
+Route labels are FastAPI's path templates ("/api/games/{game_id}"), so
+label sets stay bounded. Requests the rate limiter rejects (429) or sheds
+(503) never reach the router and are labelled by their rate-limit group
+("ratelimit:poll"); requests matching no route share "unmatched". Queries per request are counted by engine event
+listeners into a per-request slot carried in a context variable, which
+run_in_threadpool copies into the worker thread.
+
+Values are per process; with several workers each scrape sees the worker
+that answered it. METRICS_ENABLED=0 turns request instrumentation off.
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+SWEEP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Sharded:
+    """Per-thread dicts of label values -> slot, summed when rendered."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._shards: List[dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()  # only taken when a thread first records
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshot(self) -> List[list]:
+        with self._lock:
+            shards = list(self._shards)
+        # list() of a dict is one C call, so a writer can't resize it mid-copy
+        return [list(shard.items()) for shard in shards]
+
+    def _label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Sharded):
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        totals: Dict[tuple, float] = {}
+        for items in self._snapshot():
+            for labels, value in items:
+                totals[labels] = totals.get(labels, 0) + value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{self._label_text(labels)} {value}" for labels, value in sorted(totals.items())]
+        return lines
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: tuple):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        # One count per bucket (the last is +Inf), then the sum and the count
+        slots = shard.get(labels)
+        if slots is None:
+            slots = shard[labels] = [0] * (len(self.buckets) + 3)
+        slots[bisect_left(self.buckets, value)] += 1
+        slots[-2] += value
+        slots[-1] += 1
+
+    def render(self) -> List[str]:
+        totals: Dict[tuple, list] = {}
+        for items in self._snapshot():
+            for labels, slots in items:
+                total = totals.setdefault(labels, [0] * len(slots))
+                for i, value in enumerate(slots):
+                    total[i] += value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, slots in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), slots):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {slots[-2]}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {slots[-1]}")
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time. fn returns a number, or {label values: number}."""
+
+    def __init__(self, name: str, help: str, fn: Callable, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = labels
+
+    def render(self) -> List[str]:
+        value = self.fn()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if not isinstance(value, dict):
+            return lines + [f"{self.name} {value}"]
+        for labels, v in sorted(value.items()):
+            text = ",".join(f'{name}="{escape(label)}"' for name, label in zip(self.labels, labels))
+            lines.append(f"{self.name}{{{text}}} {v}")
+        return lines
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._names = set()
+
+    def register(self, metric):
+        assert metric.name not in self._names, metric.name
+        self._names.add(metric.name)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "moltchess_http_requests_total", "HTTP requests by route, method and status code.", ("route", "method", "status"))
+http_latency = registry.histogram(
+    "moltchess_http_request_duration_seconds", "Time from request to the end of the response.", ("route", "method"))
+request_queries = registry.histogram(
+    "moltchess_db_queries_per_request", "SQL statements executed per request.", ("route",), QUERY_COUNT_BUCKETS)
+request_db_time = registry.histogram(
+    "moltchess_db_time_per_request_seconds", "Time spent executing SQL per request.", ("route",))
+db_queries = registry.counter(
+    "moltchess_db_queries_total", "SQL statements executed, including background work.")
+db_time = registry.counter(
+    "moltchess_db_query_seconds_total", "Time spent executing SQL, including background work.")
+task_duration = registry.histogram(
+    "moltchess_task_duration_seconds", "Duration of background maintenance tasks.", ("task",), SWEEP_BUCKETS)
+task_results = registry.counter(
+    "moltchess_task_results_total", "Games forfeited or created by background maintenance tasks.", ("task",))
+webhook_latency = registry.histogram(
+    "moltchess_webhook_send_duration_seconds", "Time per webhook delivery attempt.")
+webhook_sends = registry.counter(
+    "moltchess_webhook_sends_total", "Webhook delivery attempts by outcome: delivered, retried, dead_letter, or dropped before sending.", ("outcome",))
+
+# [statements, seconds] for the request being handled, if any
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+
+def instrument_engine(engine):
+    """Count statements and their time, globally and for the current request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+        db_queries.inc()
+        db_time.inc(amount=elapsed)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+
+def timed_task(fn):
+    """Record each call's duration and len(result) under the function's name."""
+    task = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        task_duration.observe(time.perf_counter() - t0, task)
+        if result:
+            task_results.inc(task, amount=len(result))
+        return result
+    return wrapper
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and database use per HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500  # if the app raises before starting a response
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _request_db.reset(token)
+            # The router leaves the matched route in scope, the rate limiter its group
+            route = scope.get("route")
+            if route is not None:
+                path = route.path
+            elif "rate_limit_group" in scope:
+                path = "ratelimit:" + scope["rate_limit_group"]
+            else:
+                path = "unmatched"
+            method = scope["method"]
+            http_requests.inc(path, method, status)
+            http_latency.observe(elapsed, path, method)
+            request_queries.observe(stats[0], path)
+            request_db_time.observe(stats[1], path)
@@ -0,0 +1,104 @@
+"""Fill Game.packed_moves for games created before packed move storage.
+
+Walks games whose packed_moves is NULL in id order, replays each one from
+its PGN text (or its Move rows if the PGN doesn't replay), and writes the
+blob only if the replay reproduces the stored FEN and ply count. Games that
+can't be reproduced are reported and left NULL; they keep working off their
+Move rows. With --delete-rows, Move rows of converted games are removed
+afterwards (only do that with STORE_MOVE_ROWS=0 on the API, or new rows
+will keep arriving).
+
+    cd api && python migrate_moves.py [--batch 500] [--delete-rows]
+"""
+import argparse
+from collections import defaultdict
+from typing import List, Optional
+
+import chess
+from sqlalchemy import bindparam, update
+
+import move_codec
+from database import SessionLocal, init_db, Game, Move
+
+
+def replay_sans(sans: List[str]) -> Optional[chess.Board]:
+    board = chess.Board()
+    try:
+        for san in sans:
+            board.push_san(san)
+    except ValueError:
+        return None
+    return board
+
+
+def convert(game, move_sans: List[str]) -> Optional[bytes]:
+    """Packed moves for the game, or None if neither source reproduces it."""
+    for sans in ((game.pgn or "").split(), move_sans):
+        board = replay_sans(sans)
+        if board is not None and board.ply() == (game.ply_count or 0) and board.fen() == game.fen:
+            return move_codec.pack(board.move_stack)
+    return None
+
+
+def migrate(batch: int, delete_rows: bool) -> dict:
+    stats = {"converted": 0, "failed": [], "rows_deleted": 0}
+    db = SessionLocal()
+    last_id = 0
+    try:
+        while True:
+            games = db.query(Game.id, Game.pgn, Game.fen, Game.ply_count).filter(
+                Game.packed_moves == None, Game.id > last_id
+            ).order_by(Game.id).limit(batch).all()
+            if not games:
+                break
+            last_id = games[-1].id
+            ids = [game.id for game in games]
+            move_sans = defaultdict(list)
+            for game_id, san in db.query(Move.game_id, Move.move).filter(Move.game_id.in_(ids)).order_by(Move.game_id, Move.id):
+                move_sans[game_id].append(san)
+
+            packed = []
+            for game in games:
+                blob = convert(game, move_sans[game.id])
+                if blob is None:
+                    stats["failed"].append(game.id)
+                else:
+                    packed.append({"game_id": game.id, "ply": game.ply_count or 0, "blob": blob})
+            if packed:
+                # Guarded on the ply we replayed, so a game that moved since the read is left for the next run
+                games_table = Game.__table__
+                db.connection().execute(
+                    update(games_table).where(
+                        games_table.c.id == bindparam("game_id"),
+                        games_table.c.packed_moves == None,
+                        games_table.c.ply_count == bindparam("ply")
+                    ).values(packed_moves=bindparam("blob")),
+                    packed
+                )
+            if delete_rows and packed:
+                stats["rows_deleted"] += db.query(Move).filter(
+                    Move.game_id.in_([row["game_id"] for row in packed]),
+                    Move.game_id.in_(db.query(Game.id).filter(Game.packed_moves != None))
+                ).delete(synchronize_session=False)
+            db.commit()
+            stats["converted"] += len(packed)
+            print(f"[MIGRATE] up to game {last_id}: {stats['converted']} converted, {len(stats['failed'])} failed")
+    finally:
+        db.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=500, help="games per transaction")
+    parser.add_argument("--delete-rows", action="store_true", help="delete Move rows of converted games")
+    args = parser.parse_args()
+    init_db()
+    stats = migrate(args.batch, args.delete_rows)
+    print(f"[MIGRATE] Done: {stats['converted']} converted, {stats['rows_deleted']} move rows deleted")
+    if stats["failed"]:
+        print(f"[MIGRATE] Left unconverted (replay didn't match): {stats['failed']}")
+
+
+if __name__ == "__main__":
+    main()
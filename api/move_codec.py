@@ -0,0 +1,69 @@
+"""Packed move storage: two bytes per half-move in Game.packed_moves.
+
+Each move is a little-endian uint16: from-square in bits 0-5, to-square in
+bits 6-11 and the promotion piece type (0 for none) in bits 12-14. A game's
+blob is the concatenation in play order, so len(blob) == 2 * ply_count, and
+appending a move is appending two bytes. Boards are derived by replaying
+the blob from the start position; sans() and pgn_text() do the same for
+SAN, though the API still serves Game.pgn as written.
+
+The blob replaces the Move rows (SAN plus FEN per half-move), which are
+where the space goes. It only saves that space once the rows stop being
+written and the old ones are gone: run the API with STORE_MOVE_ROWS=0,
+then migrate_moves.py --delete-rows.
+"""
+import struct
+from typing import Iterable, List, Optional
+
+import chess
+
+_MOVE = struct.Struct("<H")
+
+
+def encode(move: chess.Move) -> int:
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode(code: int) -> chess.Move:
+    return chess.Move(code & 0x3F, (code >> 6) & 0x3F, (code >> 12) & 0x7 or None)
+
+
+def pack(moves: Iterable[chess.Move]) -> bytes:
+    codes = [encode(move) for move in moves]
+    return struct.pack(f"<{len(codes)}H", *codes)
+
+
+def pack_one(move: chess.Move) -> bytes:
+    return _MOVE.pack(encode(move))
+
+
+def unpack(blob: bytes) -> List[chess.Move]:
+    return [decode(code) for code in struct.unpack(f"<{len(blob) // 2}H", blob)]
+
+
+def is_complete(blob: Optional[bytes], ply_count: int) -> bool:
+    """Whether the blob holds every move of a game at ply_count (NULL marks unconverted games)."""
+    return blob is not None and len(blob) == 2 * ply_count
+
+
+def replay(blob: bytes) -> chess.Board:
+    """Board with the full move stack. Raises ValueError if a move is illegal."""
+    board = chess.Board()
+    for move in unpack(blob):
+        if not board.is_legal(move):
+            raise ValueError(f"illegal packed move {move.uci()} at ply {board.ply()}")
+        board.push(move)
+    return board
+
+
+def sans(blob: bytes) -> List[str]:
+    board = chess.Board()
+    result = []
+    for move in unpack(blob):
+        result.append(board.san_and_push(move))
+    return result
+
+
+def pgn_text(blob: bytes) -> str:
+    """Space-separated SAN, the same format as Game.pgn."""
+    return " ".join(sans(blob))
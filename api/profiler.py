@@ -0,0 +1,126 @@
+"""Per-request SQL profiling, for finding N+1 queries.
+
+Opt in with PROFILE_QUERIES=1. Every request then gets response headers
+
+    X-Query-Count    statements executed before the response started
+    X-Query-Time     their total time in milliseconds
+    X-Query-Repeats  executions beyond the first of any statement shape
+
+and a "[QUERIES]" line is printed per request, listing each shape that
+ran more than once. A shape is the statement with whitespace collapsed
+and bound or literal values (including expanded IN lists) replaced by "?",
+so one lookup per row of a listing shows up as one shape repeated n times.
+
+profile_queries() does the same for code outside a request, such as the
+maintenance sweep; bench/bench_queries.py uses it to enforce budgets.
+"""
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+ENABLED = os.getenv("PROFILE_QUERIES", "0") == "1"
+
+_PARAM = r"(?:\?|%\(\w+\)s|%s|:\w+|\d+(?:\.\d+)?|'(?:[^']|'')*')"
+_LIST = re.compile(r"\(\s*" + _PARAM + r"(?:\s*,\s*" + _PARAM + r")*\s*\)")
+_VALUE = re.compile(r"(?<![\w.])" + _PARAM)
+_SPACE = re.compile(r"\s+")
+
+_instrumented = set()
+_current: ContextVar[Optional["QueryProfile"]] = ContextVar("query_profile", default=None)
+
+
+def shape(statement: str) -> str:
+    """The statement with values abstracted, so repeats of one query compare equal."""
+    statement = _SPACE.sub(" ", statement.strip())
+    return _VALUE.sub("?", _LIST.sub("(?)", statement))
+
+
+class QueryProfile:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[shape(statement)] += 1
+
+    @property
+    def repeats(self) -> int:
+        """Executions beyond the first, summed over all shapes."""
+        return self.count - len(self.shapes)
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """(shape, executions) for every shape run more than once, most first."""
+        return [(s, n) for s, n in self.shapes.most_common() if n > 1]
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        return [
+            (b"x-query-count", str(self.count).encode()),
+            (b"x-query-time", f"{self.seconds * 1000:.2f}".encode()),
+            (b"x-query-repeats", str(self.repeats).encode()),
+        ]
+
+    def summary(self) -> str:
+        text = f"{self.count} statements, {self.seconds * 1000:.2f} ms"
+        for statement, n in self.repeated():
+            text += f"\n    {n}x {statement[:200]}"
+        return text
+
+
+def instrument_engine(engine):
+    """Record statements into the active profile, if any. Safe to call more than once."""
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info["profile_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is not None:
+            profile.record(statement, time.perf_counter() - conn.info.pop("profile_start", time.perf_counter()))
+
+
+@contextmanager
+def profile_queries():
+    """Profile the statements run inside the block, including its run_in_threadpool calls."""
+    profile = QueryProfile()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+class QueryProfileMiddleware:
+    """ASGI middleware adding query headers and a log line to every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with profile_queries() as profile:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + profile.headers()
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                print(f"[QUERIES] {scope['method']} {scope['path']}: {profile.summary()}")
@@ -0,0 +1,198 @@
+"""Per-client token buckets and lag-based load shedding.
+
+Every /api request is classified into a route group by method and path
+prefix. Requests carrying an API key that verify_api_key has accepted are
+limited per key (by its hash); anonymous ones per client IP. Requests with
+a key not (yet) known to be valid all go to one "unverified" bucket per IP,
+so inventing keys buys neither fresh buckets nor unlimited auth lookups,
+while the first request of each of many agents behind one IP still fits in
+its burst. A client's bucket for a group refills at
+`rate` tokens per second up to `burst`; an empty bucket gets 429 with
+Retry-After. Buckets live in one LRU capped at MAX_BUCKETS, so each request
+is a couple of dict operations and memory stays bounded (an evicted client
+simply starts again with a full bucket).
+
+A monitor task measures event-loop lag. While it is above SHED_LAG, groups
+marked sheddable (polling and public reads) are answered with 503 straight
+away, so moves keep getting through on an overloaded worker.
+
+Limits can be overridden per group with RATE_LIMIT_<GROUP>="rate:burst",
+and RATE_LIMITS_ENABLED=0 turns limiting and shedding off.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from auth import hash_api_key
+
+Limit = namedtuple("Limit", "rate burst sheddable")
+
+# group -> tokens per second, bucket size, shed under lag
+RATE_LIMITS: Dict[str, Limit] = {
+    "register": Limit(0.05, 5, False),  # per IP: a burst of 5, then one every 20 s
+    "poll": Limit(1.0, 10, True),  # status / wait / active games
+    "play": Limit(2.0, 20, False),  # moves, resignations, challenges, queue
+    "agent": Limit(2.0, 20, True),  # other authenticated calls
+    "public": Limit(5.0, 50, True),  # leaderboard, archive, explorer, stats, exports, streams
+    "unverified": Limit(1.0, 100, True),  # per IP: requests with keys not yet seen to authenticate
+}
+
+# (method or None for any, path prefix, group); first match wins
+ROUTE_GROUPS = (
+    ("POST", "/api/register", "register"),
+    ("POST", "/api/claim/", "register"),
+    (None, "/api/agents/status", "poll"),
+    (None, "/api/agents/wait", "poll"),
+    ("GET", "/api/games/active", "poll"),
+    ("POST", "/api/games/", "play"),
+    (None, "/api/challenge", "play"),
+    (None, "/api/queue/", "play"),
+)
+
+MAX_BUCKETS = 50000
+MAX_VERIFIED_KEYS = 50000
+SHED_LAG = 0.25  # seconds of event-loop lag before shedding
+LAG_INTERVAL = 0.1
+SHED_RETRY_AFTER = 5
+
+ENABLED = os.getenv("RATE_LIMITS_ENABLED", "1") != "0"
+
+
+def _limits_from_env(limits: Dict[str, Limit]) -> Dict[str, Limit]:
+    configured = dict(limits)
+    for group, limit in limits.items():
+        override = os.getenv(f"RATE_LIMIT_{group.upper()}")
+        if override:
+            rate, burst = override.split(":")
+            configured[group] = limit._replace(rate=float(rate), burst=float(burst))
+    return configured
+
+
+def route_group(method: str, path: str, authenticated: bool) -> str:
+    for rule_method, prefix, group in ROUTE_GROUPS:
+        if (rule_method is None or rule_method == method) and path.startswith(prefix):
+            return group
+    return "agent" if authenticated else "public"
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Limit] = RATE_LIMITS, max_buckets: int = MAX_BUCKETS):
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self.lag = 0.0
+        self.limited = 0
+        self.shed = 0
+        # (group, client) -> [tokens, last refill time]
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        # Hashes of keys that resolved to an agent; only authentication adds them
+        self._verified: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, group: str, client: str) -> Optional[float]:
+        """Take one token. Returns None if allowed, else seconds until a token is available."""
+        limit = self.limits[group]
+        now = time.monotonic()
+        key = (group, client)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [limit.burst, now]
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return None
+            self.limited += 1
+            return (1 - bucket[0]) / limit.rate
+
+    def mark_verified(self, key_hash: str):
+        """Record a key hash that authenticated, so its requests get their own buckets."""
+        with self._lock:
+            self._verified[key_hash] = None
+            self._verified.move_to_end(key_hash)
+            if len(self._verified) > MAX_VERIFIED_KEYS:
+                self._verified.popitem(last=False)
+
+    def is_verified(self, key_hash: str) -> bool:
+        return key_hash in self._verified
+
+    def should_shed(self, group: str) -> bool:
+        if self.lag > SHED_LAG and self.limits[group].sheddable:
+            self.shed += 1
+            return True
+        return False
+
+    async def monitor_lag(self):
+        """Track how late a short sleep wakes up; that's how long ready work waits."""
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(LAG_INTERVAL)
+            late = time.monotonic() - t0 - LAG_INTERVAL
+            # Rise immediately, decay smoothly
+            self.lag = max(late, self.lag * 0.7 + late * 0.3)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def client_key(headers, client_host: Optional[str], limiter: RateLimiter) -> Tuple[str, str]:
+    """(bucket key, kind): kind is "key", "unverified" or "anonymous".
+    
+    API keys are hashed so buckets never hold them. Only verified keys get
+    buckets of their own; the rest are limited by IP.
+    """
+    # Fly's proxy puts the real client address here
+    ip = "ip:" + (headers.get("fly-client-ip") or client_host or "unknown")
+    api_key = headers.get("x-api-key")
+    if not api_key:
+        return ip, "anonymous"
+    key_hash = hash_api_key(api_key)
+    if limiter.is_verified(key_hash):
+        return "key:" + key_hash, "key"
+    return ip, "unverified"
+
+
+def retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+rate_limiter = RateLimiter(_limits_from_env(RATE_LIMITS))
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying rate_limiter to /api requests (streams pass through untouched)."""
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http" or scope["method"] == "OPTIONS" or not scope["path"].startswith("/api/"):
+            return await self.app(scope, receive, send)
+        client = scope.get("client")
+        key, kind = client_key(Headers(scope=scope), client[0] if client else None, self.limiter)
+        group = "unverified" if kind == "unverified" else route_group(scope["method"], scope["path"], kind == "key")
+        if self.limiter.should_shed(group):
+            # Rejected before routing; MetricsMiddleware labels these by group
+            scope["rate_limit_group"] = group
+            response = JSONResponse({"detail": "Server busy. Retry shortly."}, status_code=503,
+                                    headers={"Retry-After": str(SHED_RETRY_AFTER)})
+            return await response(scope, receive, send)
+        wait = self.limiter.acquire(group, key)
+        if wait is not None:
+            scope["rate_limit_group"] = group
+            response = JSONResponse({"detail": "Rate limit exceeded."}, status_code=429,
+                                    headers={"Retry-After": retry_after(wait)})
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
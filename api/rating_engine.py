@@ -0,0 +1,270 @@
+"""Recompute every agent's rating from the full game archive.
+
+Completed games are loaded once, in (ended_at, id) order, into NumPy arrays
+of dense agent indices and white scores, and replayed by an engine:
+
+- EloEngine: the live K=32 rule (main.calculate_elo), rounded per game.
+  Games are grouped into rounds in which no agent plays twice, and each
+  agent's games land in rounds in their original order, so a round updates
+  all of its games at once and the result equals a sequential replay.
+- Glicko2Engine: Glicko-2 with fixed-length rating periods. Every game in a
+  period is rated against the ratings at the start of the period, as the
+  system intends, so a whole period is one vectorized step.
+
+Ratings and game counters are written back with one bulk UPDATE. With
+--dry-run nothing is written and the new ratings are diffed against the
+current ones. Live play keeps using K=32 Elo; Glicko-2 is for comparison
+(or a deliberate switch of the stored ratings).
+
+    cd api && python rating_engine.py --engine glicko2 --dry-run
+"""
+import argparse
+import math
+import time
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import update
+
+from database import SessionLocal, init_db, Agent, Game
+
+INITIAL_RATING = 1200
+SCORES = {"1-0": 1.0, "1/2-1/2": 0.5, "0-1": 0.0}
+LOAD_YIELD_PER = 10000
+
+
+class Archive(NamedTuple):
+    """Completed games as arrays, in play order. Agent i is agent_ids[i]."""
+    agent_ids: np.ndarray
+    white: np.ndarray
+    black: np.ndarray
+    score: np.ndarray  # white's score: 1, 0.5 or 0
+    ended_at: np.ndarray  # seconds since the epoch
+
+
+class Ratings(NamedTuple):
+    rating: np.ndarray
+    deviation: np.ndarray  # NaN for engines without one
+
+
+class EloEngine:
+    name = "elo"
+
+    def __init__(self, k: float = 32, initial: float = INITIAL_RATING):
+        self.k = k
+        self.initial = initial
+
+    @staticmethod
+    def rounds(white: np.ndarray, black: np.ndarray, n_agents: int) -> np.ndarray:
+        """Round number per game: one past the later of both players' previous rounds."""
+        last = [-1] * n_agents
+        rounds = np.empty(len(white), dtype=np.int64)
+        for i, (w, b) in enumerate(zip(white.tolist(), black.tolist())):
+            r = max(last[w], last[b]) + 1
+            rounds[i] = last[w] = last[b] = r
+        return rounds
+
+    def run(self, archive: Archive) -> Ratings:
+        n = len(archive.agent_ids)
+        rating = np.full(n, float(self.initial))
+        rounds = self.rounds(archive.white, archive.black, n)
+        order = np.argsort(rounds, kind="stable")
+        bounds = np.flatnonzero(np.diff(rounds[order])) + 1
+        for games in np.split(order, bounds):
+            if not len(games):
+                continue
+            w, b, s = archive.white[games], archive.black[games], archive.score[games]
+            expected = 1 / (1 + 10 ** ((rating[b] - rating[w]) / 400))
+            new_white = np.round(rating[w] + self.k * (s - expected))
+            new_black = np.round(rating[b] + self.k * ((1 - s) - (1 - expected)))
+            rating[w] = new_white
+            rating[b] = new_black
+        return Ratings(rating, np.full(n, np.nan))
+
+
+class Glicko2Engine:
+    name = "glicko2"
+    SCALE = 173.7178
+    MAX_DEVIATION = 350.0
+
+    def __init__(self, period_days: float = 1.0, tau: float = 0.5, initial: float = INITIAL_RATING,
+                 deviation: float = MAX_DEVIATION, volatility: float = 0.06, epsilon: float = 1e-6):
+        self.period = period_days * 86400
+        self.tau = tau
+        self.initial = initial
+        self.deviation = deviation
+        self.volatility = volatility
+        self.epsilon = epsilon
+
+    @staticmethod
+    def _g(phi):
+        return 1 / np.sqrt(1 + 3 * phi ** 2 / math.pi ** 2)
+
+    def _volatility(self, sigma, phi, v, delta):
+        """New volatility by the Illinois iteration from the Glicko-2 paper, for all players at once."""
+        tau2 = self.tau ** 2
+        a = np.log(sigma ** 2)
+
+        def f(x):
+            ex = np.exp(x)
+            return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau2
+
+        big = delta ** 2 > phi ** 2 + v
+        B = np.where(big, np.log(np.maximum(delta ** 2 - phi ** 2 - v, 1e-300)), a - self.tau)
+        pending = ~big
+        k = 1
+        while pending.any():
+            negative = pending & (f(a - k * self.tau) < 0)
+            B = np.where(pending, a - k * self.tau, B)
+            pending = negative
+            k += 1
+        A = a.copy()
+        fA, fB = f(A), f(B)
+        for _ in range(100):
+            active = np.abs(B - A) > self.epsilon
+            if not active.any():
+                break
+            C = A + (A - B) * fA / (fB - fA)
+            fC = f(C)
+            swap = active & (fC * fB <= 0)
+            A = np.where(swap, B, A)
+            fA = np.where(swap, fB, np.where(active, fA / 2, fA))
+            B = np.where(active, C, B)
+            fB = np.where(active, fC, fB)
+        return np.exp(A / 2)
+
+    def run(self, archive: Archive, start: Optional[Ratings] = None) -> Ratings:
+        """Replay every period. start overrides the initial rating/deviation per agent."""
+        n = len(archive.agent_ids)
+        if start is None:
+            start = Ratings(np.full(n, float(self.initial)), np.full(n, self.deviation))
+        mu = (start.rating - 1500) / self.SCALE
+        phi = start.deviation / self.SCALE
+        sigma = np.full(n, self.volatility)
+        max_phi = self.MAX_DEVIATION / self.SCALE
+        periods = (archive.ended_at // self.period).astype(np.int64)
+        bounds = np.flatnonzero(np.diff(periods)) + 1
+        previous = None
+        for games in np.split(np.arange(len(periods)), bounds):
+            if not len(games):
+                continue
+            period = periods[games[0]]
+            if previous is not None and period - previous > 1:
+                # Deviation grows through the empty periods in between
+                phi = np.minimum(np.sqrt(phi ** 2 + (period - previous - 1) * sigma ** 2), max_phi)
+            previous = period
+            w, b, s = archive.white[games], archive.black[games], archive.score[games]
+            players = np.concatenate([w, b])
+            opponents = np.concatenate([b, w])
+            scores = np.concatenate([s, 1 - s])
+            g = self._g(phi[opponents])
+            expected = 1 / (1 + np.exp(-g * (mu[players] - mu[opponents])))
+            v_inv = np.bincount(players, g ** 2 * expected * (1 - expected), minlength=n)
+            score_sum = np.bincount(players, g * (scores - expected), minlength=n)
+            played = v_inv > 0
+            # Only meaningful where played; the placeholder keeps the rest finite
+            v = 1 / np.where(played, v_inv, 1)
+            delta = v * score_sum
+            new_sigma = sigma.copy()
+            new_sigma[played] = self._volatility(sigma[played], phi[played], v[played], delta[played])
+            phi_star = np.sqrt(phi ** 2 + new_sigma ** 2)
+            new_phi = np.where(played, 1 / np.sqrt(1 / phi_star ** 2 + v_inv), np.minimum(phi_star, max_phi))
+            mu = mu + new_phi ** 2 * score_sum
+            phi, sigma = new_phi, new_sigma
+        return Ratings(self.SCALE * mu + 1500, self.SCALE * phi)
+
+
+ENGINES = {"elo": EloEngine, "glicko2": Glicko2Engine}
+
+
+def load_archive(db) -> Archive:
+    agent_ids = np.array([agent_id for (agent_id,) in db.query(Agent.id).order_by(Agent.id)], dtype=np.int64)
+    rows = db.query(Game.white_id, Game.black_id, Game.result, Game.ended_at).filter(
+        Game.status == "completed", Game.result.in_(SCORES)
+    ).order_by(Game.ended_at, Game.id).yield_per(LOAD_YIELD_PER)
+    white, black, score, ended_at = [], [], [], []
+    epoch = datetime(1970, 1, 1)
+    for white_id, black_id, result, ended in rows:
+        white.append(white_id)
+        black.append(black_id)
+        score.append(SCORES[result])
+        ended_at.append((ended - epoch).total_seconds() if ended else 0.0)
+    return Archive(
+        agent_ids,
+        np.searchsorted(agent_ids, np.array(white, dtype=np.int64)),
+        np.searchsorted(agent_ids, np.array(black, dtype=np.int64)),
+        np.array(score, dtype=np.float64),
+        np.array(ended_at, dtype=np.float64),
+    )
+
+
+def counters(archive: Archive) -> Dict[str, np.ndarray]:
+    n = len(archive.agent_ids)
+    def count(idx, mask):
+        return np.bincount(idx[mask], minlength=n)
+    w, b, s = archive.white, archive.black, archive.score
+    return {
+        "games_played": np.bincount(w, minlength=n) + np.bincount(b, minlength=n),
+        "wins": count(w, s == 1) + count(b, s == 0),
+        "losses": count(w, s == 0) + count(b, s == 1),
+        "draws": count(w, s == 0.5) + count(b, s == 0.5),
+    }
+
+
+def write_back(db, archive: Archive, ratings: Ratings):
+    """One executemany UPDATE of every agent's rating and counters."""
+    counts = counters(archive)
+    rows = [{
+        "id": int(agent_id),
+        "elo": int(round(ratings.rating[i])),
+        **{name: int(values[i]) for name, values in counts.items()},
+    } for i, agent_id in enumerate(archive.agent_ids)]
+    if rows:
+        db.execute(update(Agent), rows)
+    db.commit()
+
+
+def print_diff(db, archive: Archive, ratings: Ratings, limit: int):
+    current = dict(db.query(Agent.id, Agent.elo))
+    names = dict(db.query(Agent.id, Agent.name))
+    new = np.round(ratings.rating).astype(np.int64)
+    old = np.array([current[int(agent_id)] or INITIAL_RATING for agent_id in archive.agent_ids], dtype=np.int64)
+    diff = new - old
+    changed = np.count_nonzero(diff)
+    print(f"{changed} of {len(diff)} agents change; mean |diff| {np.abs(diff).mean() if len(diff) else 0:.1f}")
+    print(f"{'agent':<24} {'current':>8} {'new':>8} {'diff':>6} {'RD':>6}")
+    for i in np.argsort(-np.abs(diff), kind="stable")[:limit]:
+        rd = "" if np.isnan(ratings.deviation[i]) else f"{ratings.deviation[i]:.0f}"
+        print(f"{names[int(archive.agent_ids[i])]:<24} {old[i]:>8} {new[i]:>8} {diff[i]:>+6} {rd:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="elo")
+    parser.add_argument("--period-days", type=float, default=1.0, help="Glicko-2 rating period length")
+    parser.add_argument("--dry-run", action="store_true", help="diff against current ratings instead of writing")
+    parser.add_argument("--limit", type=int, default=20, help="rows of the dry-run diff to print")
+    args = parser.parse_args()
+    engine = Glicko2Engine(period_days=args.period_days) if args.engine == "glicko2" else EloEngine()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        t0 = time.perf_counter()
+        archive = load_archive(db)
+        t1 = time.perf_counter()
+        ratings = engine.run(archive)
+        t2 = time.perf_counter()
+        print(f"[RATINGS] {engine.name}: {len(archive.white)} games, {len(archive.agent_ids)} agents; load {t1 - t0:.1f}s, replay {t2 - t1:.1f}s")
+        if args.dry_run:
+            print_diff(db, archive, ratings, args.limit)
+        else:
+            write_back(db, archive, ratings)
+            print(f"[RATINGS] Wrote {len(archive.agent_ids)} agents in {time.perf_counter() - t2:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
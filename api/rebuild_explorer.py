@@ -0,0 +1,55 @@
+"""Recompute the opening explorer from every completed game.
+
+One streaming pass over the archive (server-side cursor, plain rows)
+accumulates per-(position, move) totals in memory, then the explorer
+table is replaced in a single transaction. Games completed while the pass
+runs are not included; run it when the league is quiet, or again after.
+Games finished before ratings were recorded on Game use the players'
+current Elo.
+
+    cd api && python rebuild_explorer.py
+"""
+import time
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+import explorer
+from database import SessionLocal, init_db, Agent, Game
+
+YIELD_PER = 1000
+
+
+def rebuild() -> dict:
+    white, black = aliased(Agent), aliased(Agent)
+    totals = defaultdict(lambda: [0] * len(explorer.COUNTERS))
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            Game.packed_moves, Game.ply_count, Game.pgn, Game.result,
+            func.coalesce(Game.white_elo, white.elo), func.coalesce(Game.black_elo, black.elo)
+        ).join(white, Game.white_id == white.id).join(black, Game.black_id == black.id).filter(
+            Game.status == "completed", Game.result != None
+        ).yield_per(YIELD_PER)
+        games = 0
+        for packed, ply_count, pgn, result, white_elo, black_elo in rows:
+            moves = explorer.game_moves(packed, ply_count or 0, pgn)
+            explorer.accumulate(totals, moves, result, white_elo, black_elo)
+            games += 1
+        explorer.write_totals(db, totals)
+        db.commit()
+    finally:
+        db.close()
+    return {"games": games, "entries": len(totals)}
+
+
+def main():
+    init_db()
+    t0 = time.perf_counter()
+    stats = rebuild()
+    print(f"[EXPLORER] Rebuilt from {stats['games']} games: {stats['entries']} position/move entries in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
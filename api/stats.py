@@ -0,0 +1,165 @@
+"""Per-agent and head-to-head statistics over completed games.
+
+Every figure comes from one grouped query: the agent's white games and black
+games are unioned, then grouped by (colour, opponent tier, result) or by
+(opponent, colour, result), so the database returns a few dozen aggregate
+rows however long the agent's history is. Opponent ratings are the ones
+recorded on the game by finish_game, falling back to the opponent's current
+Elo for older games.
+
+Results are cached per agent. The game-ending paths invalidate both players'
+entries after commit; the TTL bounds staleness from other worker processes.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import case, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from database import Agent, Game
+
+STATS_TTL = 300  # seconds
+
+# (lower bound, name), highest first; main.get_tier uses the same table
+TIERS = ((2000, "Summit"), (1600, "Mountain"), (1200, "Forest"), (800, "Cabin"))
+BOTTOM_TIER = "Wood"
+
+
+def tier_of(elo: int) -> str:
+    for bound, name in TIERS:
+        if elo >= bound:
+            return name
+    return BOTTOM_TIER
+
+
+def _tier_case(column):
+    return case(*[(column >= bound, name) for bound, name in TIERS], else_=BOTTOM_TIER)
+
+
+def _sides(agent_id: int, opponent_id: Optional[int] = None):
+    """The agent's completed games from both sides, with colour, score and opponent rating."""
+    sides = []
+    for color, own, other, own_elo_col, other_elo_col, win in (
+        ("white", Game.white_id, Game.black_id, Game.white_elo, Game.black_elo, "1-0"),
+        ("black", Game.black_id, Game.white_id, Game.black_elo, Game.white_elo, "0-1"),
+    ):
+        query = select(
+            literal(color).label("color"),
+            other.label("opponent_id"),
+            case((Game.result == win, 1.0), (Game.result == "1/2-1/2", 0.5), else_=0.0).label("score"),
+            Game.ply_count.label("plies"),
+            func.coalesce(other_elo_col, Agent.elo).label("opponent_elo"),
+        ).join(Agent, Agent.id == other).where(own == agent_id, Game.status == "completed")
+        if opponent_id is not None:
+            query = query.where(other == opponent_id)
+        sides.append(query)
+    return union_all(*sides).subquery()
+
+
+def _outcome(score: float) -> str:
+    return "wins" if score == 1 else "draws" if score == 0.5 else "losses"
+
+
+class _Tally:
+    """Accumulates grouped rows into games, W/L/D, length and performance rating."""
+
+    def __init__(self):
+        self.games = self.wins = self.losses = self.draws = 0
+        self.score = 0.0
+        self.plies = 0
+        self.opponent_elo = 0
+
+    def add(self, games: int, score: float, plies: int, opponent_elo: int):
+        self.games += games
+        setattr(self, _outcome(score), getattr(self, _outcome(score)) + games)
+        self.score += score * games
+        self.plies += plies or 0
+        self.opponent_elo += opponent_elo or 0
+
+    def as_dict(self) -> dict:
+        if not self.games:
+            return {"games": 0, "wins": 0, "losses": 0, "draws": 0, "score": 0.0}
+        return {
+            "games": self.games,
+            "wins": self.wins,
+            "losses": self.losses,
+            "draws": self.draws,
+            "score": self.score,
+            "score_rate": round(self.score / self.games, 3),
+            "avg_moves": round(self.plies / self.games / 2, 1),
+            "avg_opponent_elo": round(self.opponent_elo / self.games),
+            # Linear performance rating: average opposition + 400 * (W - L) / N
+            "performance": round(self.opponent_elo / self.games + 400 * (2 * self.score - self.games) / self.games),
+        }
+
+
+def agent_stats(db: Session, agent_id: int) -> dict:
+    games = _sides(agent_id)
+    tier = _tier_case(games.c.opponent_elo).label("tier")
+    rows = db.execute(select(
+        games.c.color, tier, games.c.score,
+        func.count(), func.sum(games.c.plies), func.sum(games.c.opponent_elo)
+    ).group_by(games.c.color, tier, games.c.score)).all()
+    overall, by_color, by_tier = _Tally(), defaultdict(_Tally), defaultdict(_Tally)
+    for color, tier_name, score, count, plies, opponent_elo in rows:
+        for tally in (overall, by_color[color], by_tier[tier_name]):
+            tally.add(count, score, plies, opponent_elo)
+    return {
+        "overall": overall.as_dict(),
+        "by_color": {color: by_color[color].as_dict() for color in ("white", "black")},
+        "by_opponent_tier": {name: by_tier[name].as_dict() for _, name in TIERS + ((0, BOTTOM_TIER),) if name in by_tier},
+    }
+
+
+def head_to_head(db: Session, agent_id: int, opponent_id: Optional[int] = None) -> Dict[int, dict]:
+    """{opponent_id: {"overall", "as_white", "as_black"}} for one opponent or all of them."""
+    games = _sides(agent_id, opponent_id)
+    rows = db.execute(select(
+        games.c.opponent_id, games.c.color, games.c.score,
+        func.count(), func.sum(games.c.plies), func.sum(games.c.opponent_elo)
+    ).group_by(games.c.opponent_id, games.c.color, games.c.score)).all()
+    tallies = defaultdict(lambda: {"overall": _Tally(), "as_white": _Tally(), "as_black": _Tally()})
+    for opponent, color, score, count, plies, opponent_elo in rows:
+        entry = tallies[opponent]
+        for tally in (entry["overall"], entry[f"as_{color}"]):
+            tally.add(count, score, plies, opponent_elo)
+    if opponent_id is not None:
+        tallies[opponent_id]  # an empty record rather than none
+    return {opponent: {key: tally.as_dict() for key, tally in entry.items()} for opponent, entry in tallies.items()}
+
+
+class StatsCache:
+    """Computed stats keyed by anything, indexed by the agents they depend on."""
+
+    def __init__(self, ttl: float = STATS_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, object]] = {}
+        self._keys_by_agent: Dict[int, set] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key: Hashable, agent_ids: Iterable[int], value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            for agent_id in agent_ids:
+                self._keys_by_agent[agent_id].add(key)
+
+    def invalidate(self, *agent_ids: int):
+        with self._lock:
+            for agent_id in agent_ids:
+                for key in self._keys_by_agent.pop(agent_id, ()):
+                    self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+stats_cache = StatsCache()
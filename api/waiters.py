@@ -0,0 +1,74 @@
+"""In-process wakeups for long-polling agents.
+
+GET /api/agents/wait parks one future per request here instead of holding a
+thread or DB connection. make_move, accept_challenge, create_challenge and
+auto_match_agents call notify() for the agents whose state changed, which
+resolves their futures so the handler re-reads status once and returns.
+
+Wakeups are per process: a waiter is only woken by changes made by the
+worker it is parked on. With several workers or machines sharing the
+database (see lease.py), moves made elsewhere and auto-matching on the
+lease holder don't reach it, so the handler also re-reads status every
+WAIT_RECHECK_INTERVAL seconds; that bounds how late such a change is seen.
+"""
+import asyncio
+from typing import Dict, Optional, Set
+
+
+class TurnWaiters:
+    """Per-agent sets of futures, resolved when something needs the agent's attention."""
+
+    def __init__(self):
+        self._waiters: Dict[int, Set[asyncio.Future]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def register(self, agent_id: int) -> asyncio.Future:
+        """Park a future for agent_id. Register before reading state so no wakeup is missed."""
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        self._waiters.setdefault(agent_id, set()).add(future)
+        return future
+
+    def discard(self, agent_id: int, future: asyncio.Future):
+        waiters = self._waiters.get(agent_id)
+        if waiters is None:
+            return
+        waiters.discard(future)
+        if not waiters:
+            del self._waiters[agent_id]
+
+    async def wait(self, agent_id: int, future: asyncio.Future, timeout: float) -> bool:
+        """Wait for a registered future. Returns False on timeout."""
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.discard(agent_id, future)
+
+    def notify(self, *agent_ids: int):
+        """Wake every waiter parked for these agents. Safe to call from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake(agent_ids)
+        else:
+            loop.call_soon_threadsafe(self._wake, agent_ids)
+
+    def _wake(self, agent_ids):
+        for agent_id in agent_ids:
+            for future in self._waiters.pop(agent_id, ()):
+                if not future.done():
+                    future.set_result(True)
+
+    def count(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+
+turn_waiters = TurnWaiters()
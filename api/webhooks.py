@@ -0,0 +1,179 @@
+"""Queued webhook delivery for agent callback URLs.
+
+Handlers call dispatcher.enqueue(), which never blocks; a fixed pool of
+workers delivers over one shared httpx connection pool, so handlers return
+as soon as they commit. Each callback host gets a small concurrency limit
+so one slow agent cannot occupy every worker: a worker that picks up a
+delivery for a host already at its limit parks it on that host's backlog
+and moves on, and whichever worker finishes a send to the host takes the
+next parked delivery. Failed deliveries are retried with exponential
+backoff and counted as dead letters once attempts run out.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import webhook_latency, webhook_sends
+
+QUEUE_SIZE = 10000
+WORKERS = 16
+PER_HOST_CONCURRENCY = 4
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0  # seconds; doubles per attempt, with jitter
+REQUEST_TIMEOUT = 5.0
+
+
+@dataclass
+class Delivery:
+    url: str
+    payload: dict
+    attempt: int = 1
+
+
+class WebhookDispatcher:
+    def __init__(self, queue_size: int = QUEUE_SIZE, workers: int = WORKERS,
+                 per_host: int = PER_HOST_CONCURRENCY, max_attempts: int = MAX_ATTEMPTS,
+                 backoff_base: float = BACKOFF_BASE, timeout: float = REQUEST_TIMEOUT):
+        self.queue_size = queue_size
+        self.workers = workers
+        self.per_host = per_host
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.delivered = 0
+        self.retried = 0
+        self.dead_letters = 0
+        self.dropped = 0  # queue full or dispatcher not running
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tasks = []
+        self._in_flight: Dict[str, int] = {}  # host -> sends in progress
+        self._parked: Dict[str, Deque[Delivery]] = {}  # host -> deliveries waiting for a slot
+        self._parked_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._in_flight.clear()
+        self._parked.clear()
+        self._parked_count = 0
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._loop = None
+
+    def enqueue(self, url: str, payload: dict):
+        """Schedule a delivery. Never blocks; safe to call from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self.dropped += 1
+            webhook_sends.inc("dropped")
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._put(Delivery(url, payload))
+        else:
+            loop.call_soon_threadsafe(self._put, Delivery(url, payload))
+
+    def pending(self) -> int:
+        """Deliveries queued or parked behind a busy host."""
+        return (self._queue.qsize() if self._queue is not None else 0) + self._parked_count
+
+    def _put(self, delivery: Delivery):
+        # Parked deliveries count against the queue size, so a slow host can't grow memory without bound
+        if self._queue is None or self._queue.qsize() + self._parked_count >= self.queue_size:
+            self.dropped += 1
+            webhook_sends.inc("dropped")
+            return
+        self._queue.put_nowait(delivery)
+
+    async def _worker(self):
+        while True:
+            delivery = await self._queue.get()
+            self._queue.task_done()
+            host = urlsplit(delivery.url).netloc
+            if self._in_flight.get(host, 0) >= self.per_host:
+                self._parked.setdefault(host, deque()).append(delivery)
+                self._parked_count += 1
+                continue
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+            try:
+                # Keep the host's slot while it has a backlog, so parked deliveries go out in order
+                while delivery is not None:
+                    await self._deliver(delivery)
+                    delivery = self._unpark(host)
+            finally:
+                self._in_flight[host] -= 1
+                if not self._in_flight[host]:
+                    del self._in_flight[host]
+
+    def _unpark(self, host: str) -> Optional[Delivery]:
+        parked = self._parked.get(host)
+        if not parked:
+            return None
+        delivery = parked.popleft()
+        self._parked_count -= 1
+        if not parked:
+            del self._parked[host]
+        return delivery
+
+    async def _deliver(self, delivery: Delivery):
+        try:
+            t0 = time.perf_counter()
+            ok, retryable = await self._send(delivery)
+            webhook_latency.observe(time.perf_counter() - t0)
+            if ok:
+                self.delivered += 1
+                webhook_sends.inc("delivered")
+            elif retryable and delivery.attempt < self.max_attempts:
+                self._retry_later(delivery)
+                webhook_sends.inc("retried")
+            else:
+                self.dead_letters += 1
+                webhook_sends.inc("dead_letter")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.dead_letters += 1
+            webhook_sends.inc("dead_letter")
+
+    async def _send(self, delivery: Delivery):
+        """Returns (delivered, worth_retrying)."""
+        try:
+            response = await self._client.post(delivery.url, json=delivery.payload)
+        except (httpx.TransportError, httpx.InvalidURL, ValueError) as e:
+            return False, isinstance(e, httpx.TransportError)
+        if response.status_code < 300:
+            return True, False
+        return False, response.status_code >= 500 or response.status_code == 429
+
+    def _retry_later(self, delivery: Delivery):
+        """Re-queue after a backoff without holding a worker while waiting."""
+        self.retried += 1
+        delay = self.backoff_base * (2 ** (delivery.attempt - 1)) * (0.5 + random.random())
+        delivery.attempt += 1
+        self._loop.call_later(delay, self._put, delivery)
+
+
+dispatcher = WebhookDispatcher()
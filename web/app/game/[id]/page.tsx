@@ -26,20 +26,20 @@ export default function GamePage() {
   const [game, setGame] = useState<GameData | null>(null)
   const [loading, setLoading] = useState(true)
 
-  const fetchGame = () => {
-    fetch(`${API_URL}/api/games/${params.id}`)
-      .then(res => res.json())
-      .then(data => {
-        setGame(data)
-        setLoading(false)
-      })
-      .catch(() => setLoading(false))
-  }
-
   useEffect(() => {
-    fetchGame()
-    const interval = setInterval(fetchGame, 5000)
-    return () => clearInterval(interval)
+    // Server pushes a `state` snapshot, then `move` and `result` updates
+    const source = new EventSource(`${API_URL}/api/games/${params.id}/stream`)
+    const merge = (event: MessageEvent) => {
+      const data = JSON.parse(event.data)
+      setGame(prev => (prev ? { ...prev, ...data } : data))
+      setLoading(false)
+      if (data.status === 'completed') source.close()
+    }
+    source.addEventListener('state', merge)
+    source.addEventListener('move', merge)
+    source.addEventListener('result', merge)
+    source.onerror = () => setLoading(false)
+    return () => source.close()
   }, [params.id])
 
   if (loading) {
@@ -4,6 +4,8 @@ import { useEffect, useState } from 'react'
 import Link from 'next/link'
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'
+// Games shown; the snapshot is capped at this, so new games are too
+const LIVE_LIMIT = 20
 
 interface LiveGame {
   game_id: number
@@ -18,19 +20,26 @@ export default function GamesPage() {
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
-    const fetchGames = () => {
-      fetch(`${API_URL}/api/games/live`)
-        .then(res => res.json())
-        .then(data => {
-          setGames(data.games || [])
-          setLoading(false)
-        })
-        .catch(() => setLoading(false))
-    }
-    
-    fetchGames()
-    const interval = setInterval(fetchGames, 10000)
-    return () => clearInterval(interval)
+    // Server pushes a `state` snapshot, then incremental game events
+    const source = new EventSource(`${API_URL}/api/games/live/stream?limit=${LIVE_LIMIT}`)
+    source.addEventListener('state', (event: MessageEvent) => {
+      setGames(JSON.parse(event.data).games || [])
+      setLoading(false)
+    })
+    source.addEventListener('game_started', (event: MessageEvent) => {
+      const started: LiveGame = JSON.parse(event.data)
+      setGames(prev => [...prev.filter(g => g.game_id !== started.game_id), started].slice(-LIVE_LIMIT))
+    })
+    source.addEventListener('move', (event: MessageEvent) => {
+      const move = JSON.parse(event.data)
+      setGames(prev => prev.map(g => g.game_id === move.game_id ? { ...g, turn: move.turn, move_count: move.move_count } : g))
+    })
+    source.addEventListener('result', (event: MessageEvent) => {
+      const finished = JSON.parse(event.data)
+      setGames(prev => prev.filter(g => g.game_id !== finished.game_id))
+    })
+    source.onerror = () => setLoading(false)
+    return () => source.close()
   }, [])
 
   return (